@@ -0,0 +1,135 @@
+import tracemalloc
+
+import pytest
+from neo4j.exceptions import DriverError, Neo4jError
+
+import wikigraph.neo4j_utils as N
+import wikigraph.sparql as S
+from wikigraph.cache import query_key
+from wikigraph.config import get_settings
+
+from benchmarks.standin import StandInEndpoint, load_recordings
+
+PAGE_SIZE = 1000
+# Synthetic entities are numbered from here to stay clear of real Wikidata IDs
+FIRST_ID = 900_000_000
+
+# rows/sec and peak memory of each benchmark, reported at the end of the session
+results = {}
+
+
+def entity(index: int) -> str:
+    return f"http://www.wikidata.org/entity/Q{FIRST_ID + index}"
+
+
+def person_bindings(count: int) -> list[dict]:
+    return [
+        {
+            "person": {"type": "uri", "value": entity(i)},
+            "personLabel": {"xml:lang": "en", "type": "literal", "value": f"Person {i}"},
+            "modified": {
+                "datatype": "http://www.w3.org/2001/XMLSchema#dateTime",
+                "type": "literal",
+                "value": "2023-03-14T00:00:00Z",
+            },
+        }
+        for i in range(count)
+    ]
+
+
+def relationship_bindings(count: int) -> list[dict]:
+    return [
+        {
+            "person": {"type": "uri", "value": entity(i)},
+            "personLabel": {"xml:lang": "en", "type": "literal", "value": f"Person {i}"},
+            "related_person": {"type": "uri", "value": entity(i + 1)},
+            "related_personLabel": {"xml:lang": "en", "type": "literal", "value": f"Person {i + 1}"},
+            "relationship": {"type": "uri", "value": "http://www.wikidata.org/prop/direct/P40"},
+        }
+        for i in range(count - 1)
+    ]
+
+
+def sparql_response(bindings: list[dict]) -> dict:
+    return {"head": {"vars": list(bindings[0]) if bindings else []}, "results": {"bindings": bindings}}
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--sparql-latency",
+        type=float,
+        default=0.0,
+        help="Seconds the SPARQL stand-in waits before answering each request",
+    )
+
+
+def pytest_terminal_summary(terminalreporter):
+    if not results:
+        return
+    terminalreporter.section("rows/sec and peak memory")
+    for name, (rows_per_second, peak) in results.items():
+        terminalreporter.write_line(f"{name:<50} {rows_per_second:>14,.0f} rows/s {peak / 1024 ** 2:>10.2f} MiB")
+
+
+@pytest.fixture(scope="session")
+def persons_query() -> str:
+    return S.create_persons_keyset_query(PAGE_SIZE, strategy=S.DEFAULT_STRATEGY)
+
+
+@pytest.fixture(scope="session")
+def standin(request, persons_query):
+    """
+    The SPARQL stand-in serving the recordings in `benchmarks/recordings`,
+    with synthetic responses for benchmark queries that were not recorded
+    """
+    endpoint = StandInEndpoint(load_recordings(), latency=request.config.getoption("--sparql-latency"))
+    if query_key(persons_query) not in endpoint.recordings:
+        endpoint.add(persons_query, sparql_response(person_bindings(PAGE_SIZE)))
+    with endpoint, pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(get_settings(), "sparql_endpoint", endpoint.url)
+        yield endpoint
+
+
+@pytest.fixture(scope="session")
+def neo4j_driver():
+    settings = get_settings()
+    driver = N.get_driver(settings)
+    try:
+        driver.verify_connectivity()
+        N.ensure_schema(driver)
+    except (DriverError, Neo4jError) as e:
+        N.close_drivers()
+        pytest.skip(f"Neo4j is not available at {settings.neo4j_uri}: {e}")
+    yield driver
+    with N.open_session(driver) as session:
+        session.run(
+            "MATCH (p:Person) WHERE p.uri IN $uris DETACH DELETE p",
+            uris=[entity(i) for i in range(PAGE_SIZE)],
+        ).consume()
+    N.close_drivers()
+
+
+@pytest.fixture
+def measure(request, benchmark):
+    """
+    Benchmark `func`, recording the rows/sec it achieves and the peak memory
+    traced over one extra untimed call.
+    """
+
+    def run(func, rows: int):
+        tracemalloc.start()
+        try:
+            func()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        result = benchmark(func)
+        benchmark.extra_info["rows"] = rows
+        benchmark.extra_info["peak_memory_bytes"] = peak
+        if benchmark.stats is not None:
+            rows_per_second = rows / benchmark.stats.stats.mean
+            benchmark.extra_info["rows_per_second"] = rows_per_second
+            results[request.node.name] = (rows_per_second, peak)
+        return result
+
+    return run
@@ -0,0 +1,170 @@
+"""
+standin.py
+
+Local stand-in for the Wikidata SPARQL endpoint, replaying recorded responses
+keyed by `cache.query_key` after a configurable latency, so the crawl can be
+benchmarked without the live endpoint.
+
+Record real responses for a set of queries with
+
+    python -m benchmarks.standin record QUERY_FILE... --output benchmarks/recordings
+"""
+import argparse
+import json
+import threading
+import time
+import typing as ty
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+import wikigraph.sparql as S
+from wikigraph.cache import query_key
+
+RECORDINGS_DIR = Path(__file__).parent / "recordings"
+CONTENT_TYPE = "application/sparql-results+json"
+
+
+def load_recordings(directory: Path = RECORDINGS_DIR) -> dict[str, bytes]:
+    """Read the recorded response bodies in `directory`, by query key"""
+    recordings = {}
+    for path in sorted(Path(directory).glob("*.json")):
+        recording = json.loads(path.read_text())
+        recordings[query_key(recording["query"])] = json.dumps(recording["response"]).encode()
+    return recordings
+
+
+def save_recording(directory: Path, query: str, response: dict) -> Path:
+    """Store the full JSON `response` to `query` in `directory`, named by its query key"""
+    path = Path(directory) / f"{query_key(query)}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({"query": query, "response": response}))
+    return path
+
+
+def record(queries: ty.Iterable[str], directory: Path = RECORDINGS_DIR, endpoint: str = S.wikidata_endpoint) -> list[Path]:
+    """Run each query against the live `endpoint` and record its response"""
+    paths = []
+    for query in queries:
+        client = S.create_client(endpoint)
+        client.setQuery(query)
+        paths.append(save_recording(directory, query, client.query().convert()))
+    return paths
+
+
+class StandInEndpoint:
+    """
+    Threaded HTTP server answering SPARQL GET and POST requests with recorded
+    responses. Queries without a recording are answered with a 404.
+
+    Args:
+        recordings (dict[str, bytes]): Response bodies by query key.
+        latency (float): Seconds to wait before answering each request.
+        host (str): The interface to listen on.
+        port (int): The port to listen on, any free port if 0.
+    """
+
+    def __init__(
+        self,
+        recordings: ty.Optional[dict[str, bytes]] = None,
+        latency: float = 0.0,
+        host: str = "127.0.0.1",
+        port: int = 0
+    ):
+        self.recordings = dict(recordings or {})
+        self.latency = latency
+        self.requests = 0
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/sparql"
+
+    def add(self, query: str, response: dict) -> None:
+        """Answer `query` with the JSON `response`"""
+        self.recordings[query_key(query)] = json.dumps(response).encode()
+
+    def start(self) -> "StandInEndpoint":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "StandInEndpoint":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def _respond(self, query: ty.Optional[str]) -> tuple[int, bytes]:
+        self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if query is None:
+            return 400, b"Missing query"
+        body = self.recordings.get(query_key(query))
+        if body is None:
+            return 404, b"No recording for query"
+        return 200, body
+
+    def _handler(self) -> type[BaseHTTPRequestHandler]:
+        endpoint = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                params = parse_qs(urlparse(self.path).query)
+                self._send(*endpoint._respond(params.get("query", [None])[0]))
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode()
+                if self.headers.get("Content-Type", "").startswith("application/sparql-query"):
+                    query = body
+                else:
+                    query = parse_qs(body).get("query", [None])[0]
+                self._send(*endpoint._respond(query))
+
+            def _send(self, status: int, body: bytes):
+                self.send_response(status)
+                self.send_header("Content-Type", CONTENT_TYPE if status == 200 else "text/plain")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def main(argv: ty.Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.standin")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    record_parser = subparsers.add_parser("record", help="Record live responses to queries read from files")
+    record_parser.add_argument("queries", nargs="+", type=Path, help="Files each holding one SPARQL query")
+    record_parser.add_argument("--output", type=Path, default=RECORDINGS_DIR)
+    record_parser.add_argument("--endpoint", default=S.wikidata_endpoint)
+    serve_parser = subparsers.add_parser("serve", help="Replay recorded responses")
+    serve_parser.add_argument("--recordings", type=Path, default=RECORDINGS_DIR)
+    serve_parser.add_argument("--latency", type=float, default=0.0)
+    serve_parser.add_argument("--port", type=int, default=8890)
+    args = parser.parse_args(argv)
+
+    if args.command == "record":
+        paths = record((path.read_text() for path in args.queries), args.output, args.endpoint)
+        print(f"Recorded {len(paths)} responses to {args.output}")
+    else:
+        endpoint = StandInEndpoint(load_recordings(args.recordings), args.latency, port=args.port)
+        print(f"Serving {len(endpoint.recordings)} recordings at {endpoint.url}")
+        try:
+            endpoint._server.serve_forever()
+        except KeyboardInterrupt:
+            endpoint.stop()
+
+
+if __name__ == "__main__":
+    main()
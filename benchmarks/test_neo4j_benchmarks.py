@@ -0,0 +1,18 @@
+import wikigraph.models as M
+import wikigraph.neo4j_utils as N
+
+from benchmarks.conftest import PAGE_SIZE, person_bindings, relationship_bindings
+
+
+def test_insert_persons(neo4j_driver, measure):
+    persons = M.map_to_models(person_bindings(PAGE_SIZE), M.Person)
+    timings = measure(lambda: N.insert_persons(neo4j_driver, persons), PAGE_SIZE)
+    assert sum(timing.rows for timing in timings) == PAGE_SIZE
+
+
+def test_insert_relationships(neo4j_driver, measure):
+    persons = M.map_to_models(person_bindings(PAGE_SIZE), M.Person)
+    relationships = M.map_to_models(relationship_bindings(PAGE_SIZE), M.Relationship)
+    N.insert_persons(neo4j_driver, persons)
+    timings = measure(lambda: N.insert_relationships(neo4j_driver, relationships), len(relationships))
+    assert sum(timing.rows for timing in timings) == len(relationships)
@@ -0,0 +1,36 @@
+import pytest
+
+import wikigraph.models as M
+import wikigraph.sparql as S
+
+from benchmarks.conftest import PAGE_SIZE, person_bindings, relationship_bindings
+
+
+def test_execute_query(standin, measure, persons_query):
+    bindings = measure(lambda: S.execute_query(persons_query, use_cache=False), PAGE_SIZE)
+    assert len(bindings) == PAGE_SIZE
+
+
+def test_stream_bindings(standin, measure, persons_query):
+    bindings = measure(lambda: list(S.stream_bindings(persons_query)), PAGE_SIZE)
+    assert len(bindings) == PAGE_SIZE
+
+
+@pytest.mark.parametrize("validate", [True, False])
+def test_map_persons(measure, validate):
+    bindings = person_bindings(PAGE_SIZE)
+    persons = measure(lambda: M.map_to_models(bindings, M.Person, validate), PAGE_SIZE)
+    assert len(persons) == PAGE_SIZE
+
+
+@pytest.mark.parametrize("validate", [True, False])
+def test_map_relationships(measure, validate):
+    bindings = relationship_bindings(PAGE_SIZE)
+    relationships = measure(lambda: M.map_to_models(bindings, M.Relationship, validate), len(bindings))
+    assert len(relationships) == len(bindings)
+
+
+def test_map_to_columns(measure):
+    bindings = person_bindings(PAGE_SIZE)
+    columns = measure(lambda: M.map_to_columns(bindings, M.Person), PAGE_SIZE)
+    assert len(columns["uri"]) == PAGE_SIZE
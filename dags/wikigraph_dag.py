@@ -1,11 +1,46 @@
 from datetime import datetime, timedelta
+from typing import Optional
+
 from airflow import DAG
-from airflow.operators.python_operator import PythonOperator, BranchPythonOperator
+from airflow.operators.python_operator import PythonOperator
 from wikigraph import settings
 from wikigraph.logger import get_logger
-from wikigraph.sparql import get_persons, get_relationships
-from wikigraph.neo4j_utils import create_connection, insert_persons, insert_relationships
+from wikigraph.sparql import (
+    AdaptiveBatchSize,
+    get_attributes,
+    get_relationships,
+    iter_person_pages,
+    iter_persons_with_relationships,
+    split_relationship_types,
+)
+from wikigraph.neo4j_utils import (
+    ensure_schema,
+    get_driver,
+    insert_attributes,
+    insert_persons,
+    insert_relationships,
+    pool_metrics,
+)
 from wikigraph.config import Settings, get_settings
+from wikigraph.dedup import Deduplicator
+from wikigraph.partitioning import Partition, enumerate_partitions
+from wikigraph.staging import delete_batch, read_batch, write_batch
+from wikigraph.utils import chunked
+from wikigraph.state import (
+    DONE,
+    PENDING,
+    Checkpoint,
+    after_cursor,
+    checkpoints_high_water_mark,
+    clear_checkpoints,
+    get_high_water_mark,
+    latest_modified,
+    load_checkpoint,
+    resume_partition,
+    save_checkpoint,
+    set_high_water_mark,
+    start_or_resume,
+)
 
 
 logger = get_logger("wikigraph_dag")
@@ -28,58 +63,214 @@ dag = DAG(
     catchup=False,
 )
 
-def fetch_and_store_persons(worker_id: int, offset: int, limit: int, **kwargs):
-    persons = get_persons(offset, limit)
+checkpoint_dir = settings.checkpoint_dir / "wikigraph_dag"
+# person-to-person edges are fetched with the relationships query, attributes with their own
+person_relationship_types, attribute_types = split_relationship_types(
+    settings.relationship_types, settings.attribute_labels
+)
+
+def setup_schema():
+    """Create the database constraints and indexes before any worker writes"""
+    ensure_schema(get_driver(settings))
+
+def plan_partitions() -> list[dict]:
+    """
+    Enumerate the persons to crawl and split them into URI ranges of
+    `items_per_worker` persons, one mapped task each.
+
+    There are usually many more partitions than workers: idle workers pick up the
+    next pending partition, so a slow partition only delays its own worker.
+    If a previous run did not finish, only its unfinished partitions are crawled.
+    """
+    since = get_high_water_mark(settings.state_path) if settings.incremental else None
+    partitions = start_or_resume(
+        checkpoint_dir,
+        lambda: enumerate_partitions(settings.items_per_worker, since=since),
+        settings.query_service_lag_seconds,
+    )
+    return [{"partition": partition.dict()} for partition in partitions]
+
+def fetch_attributes(persons: list) -> list:
+    """Fetch the attribute edges (occupations, employers, places, ...) of the persons"""
     if not persons:
-        return f"stop_processing_persons_{worker_id}"
-    driver = create_connection(settings)
-    insert_persons(driver, persons)
-    kwargs["ti"].xcom_push(key=f"persons_{worker_id}_{offset}_{limit}", value=persons)
-    logger.info(f"Worker {worker_id}: Fetched and stored {len(persons)} persons")
-    return f"fetch_and_store_relationships_{worker_id}"
-
-def fetch_and_store_relationships(worker_id: int, offset: int, limit: int, **kwargs):
-    persons = kwargs["ti"].xcom_pull(key=f"persons_{worker_id}_{offset}_{limit}")
-    relationships = get_relationships(offset, limit, persons, settings.relationship_types)
-    
-    if not relationships:
-        return f"stop_processing_relationships_{worker_id}"
-
-    driver = create_connection(settings)
-    insert_relationships(driver, relationships)
-    logger.info(f"Worker {worker_id}: Fetched and stored {len(relationships)} relationships")
-    return f"fetch_and_store_persons_{worker_id}"
-
-for i in range(settings.num_workers):
-    offset = i * settings.items_per_worker
-
-    branch_fetch_and_store_persons = BranchPythonOperator(
-        task_id=f"branch_fetch_and_store_persons_{i}",
-        python_callable=fetch_and_store_persons,
-        op_args=[i, offset, settings.items_per_worker],
-        provide_context=True,
-        dag=dag,
+        return []
+    return get_attributes(
+        persons,
+        attribute_types,
+        settings.strict_validation,
+        batch_size=AdaptiveBatchSize(settings.relationship_batch_size),
+        max_workers=settings.relationship_max_workers,
     )
 
-    branch_fetch_and_store_relationships = BranchPythonOperator(
-        task_id=f"branch_fetch_and_store_relationships_{i}",
-        python_callable=fetch_and_store_relationships,
-        op_args=[i, offset, settings.items_per_worker],
-        provide_context=True,
-        dag=dag,
+def save_progress(partition: Partition, persons: list, relationships: int, done: bool = False):
+    """Checkpoint the persons of a partition whose relationships and attributes are committed"""
+    previous = load_checkpoint(checkpoint_dir, partition.index)
+    save_checkpoint(
+        checkpoint_dir,
+        Checkpoint(
+            partition=partition,
+            cursor=persons[-1].uri if persons else (previous.cursor if previous else None) or partition.after,
+            persons=(previous.persons if previous else 0) + len(persons),
+            relationships=(previous.relationships if previous else 0) + relationships,
+            latest_modified=max(
+                filter(None, [previous.latest_modified if previous else None, latest_modified(persons)]),
+                default=None,
+            ),
+            status=DONE if done else PENDING,
+        ),
     )
 
-    stop_processing_persons = PythonOperator(
-        task_id=f"stop_processing_persons_{i}",
-        python_callable=lambda: None,
-        dag=dag,
+def fetch_and_store_combined(partition: Partition) -> dict:
+    """
+    Fetch and store a partition's persons and relationships with one query per
+    page, checkpointing each page once it is committed
+    """
+    driver = get_driver(settings)
+    # related persons recur across pages and edges may be returned from both ends
+    dedup = Deduplicator()
+    persons, relationships, attributes = 0, 0, 0
+    for page_persons, page_relationships in iter_persons_with_relationships(
+        settings.items_per_worker,
+        person_relationship_types,
+        after=resume_partition(checkpoint_dir, partition).after,
+        validate=settings.strict_validation,
+        since=partition.since,
+        until=partition.until,
+    ):
+        page_relationships = list(dedup.relationships(page_relationships))
+        page_attributes = fetch_attributes(page_persons)
+        insert_persons(driver, page_persons, settings.neo4j_batch_size)
+        insert_relationships(driver, page_relationships, settings.neo4j_batch_size)
+        insert_attributes(driver, page_attributes, settings.neo4j_batch_size)
+        save_progress(partition, page_persons, len(page_relationships))
+        persons += len(page_persons)
+        relationships += len(page_relationships)
+        attributes += len(page_attributes)
+    save_progress(partition, [], 0, done=True)
+    logger.info(
+        f"Partition {partition.index}: Fetched and stored {persons} persons, "
+        f"{relationships} relationships and {attributes} attributes"
     )
+    # nothing left for the relationships task
+    return {"reference": None, "partition": partition.dict()}
+
+def fetch_and_store_persons(partition: dict, **kwargs) -> dict:
+    partition = Partition(**partition)
+    if settings.combined_queries:
+        return fetch_and_store_combined(partition)
+    persons = [
+        person
+        for page in iter_person_pages(
+            settings.items_per_worker,
+            after=resume_partition(checkpoint_dir, partition).after,
+            validate=settings.strict_validation,
+            since=partition.since,
+            until=partition.until,
+        )
+        for person in page
+    ]
+    if not persons:
+        logger.info(f"Partition {partition.index}: No persons found")
+        save_progress(partition, [], 0, done=True)
+        return {"reference": None, "partition": partition.dict()}
+
+    driver = get_driver(settings)
+    insert_persons(driver, persons, settings.neo4j_batch_size)
+    batch_name = f"{kwargs['run_id']}_persons_{partition.index}"
+    reference = write_batch(persons, settings.staging_dir, batch_name)
+    logger.info(f"Partition {partition.index}: Fetched and stored {len(persons)} persons")
+    logger.debug(f"Neo4j pool utilisation: {pool_metrics()}")
+    return {"reference": reference, "partition": partition.dict()}
 
-    stop_processing_relationships = PythonOperator(
-        task_id=f"stop_processing_relationships_{i}",
-        python_callable=lambda: None,
-        dag=dag,
+def fetch_and_store_relationships(reference: Optional[str], partition: dict, **kwargs):
+    """
+    Fetch and store the relationships and attributes of the staged persons,
+    `neo4j_batch_size` persons at a time, checkpointing each committed chunk so
+    that a retry skips the persons already done
+    """
+    if reference is None:
+        return
+    partition = Partition(**partition)
+    checkpoint = load_checkpoint(checkpoint_dir, partition.index)
+    persons = after_cursor(read_batch(reference), checkpoint.cursor if checkpoint else None)
+    driver = get_driver(settings)
+    # parent-child edges between persons of the partition are returned from both ends
+    dedup = Deduplicator()
+    relationships, attributes = 0, 0
+    for chunk in chunked(persons, settings.neo4j_batch_size):
+        chunk_relationships = []
+        if person_relationship_types:
+            chunk_relationships = get_relationships(
+                0,
+                None,
+                chunk,
+                person_relationship_types,
+                settings.strict_validation,
+                batch_size=AdaptiveBatchSize(settings.relationship_batch_size),
+                max_workers=settings.relationship_max_workers,
+            )
+        chunk_relationships = list(dedup.relationships(chunk_relationships))
+        chunk_attributes = fetch_attributes(chunk)
+        if chunk_relationships:
+            insert_relationships(driver, chunk_relationships, settings.neo4j_batch_size)
+        if chunk_attributes:
+            insert_attributes(driver, chunk_attributes, settings.neo4j_batch_size)
+        save_progress(partition, chunk, len(chunk_relationships))
+        relationships += len(chunk_relationships)
+        attributes += len(chunk_attributes)
+    save_progress(partition, [], 0, done=True)
+    # only drop the staged persons once their relationships are stored, so retries can reread them
+    delete_batch(reference)
+    logger.info(
+        f"Fetched and stored {relationships} relationships and {attributes} attributes "
+        f"for {len(persons)} persons"
     )
+    logger.debug(f"Neo4j pool utilisation: {pool_metrics()}")
+
+def record_high_water_mark():
+    """
+    Advance the incremental high-water mark to the start of the crawl once every
+    partition has finished, then clear the checkpoints so the next run plans afresh
+    """
+    marks = [checkpoints_high_water_mark(checkpoint_dir), get_high_water_mark(settings.state_path)]
+    high_water_mark = max((mark for mark in marks if mark), default=None)
+    if settings.incremental and high_water_mark is not None:
+        set_high_water_mark(settings.state_path, high_water_mark)
+    clear_checkpoints(checkpoint_dir)
+
+setup_schema_task = PythonOperator(
+    task_id="setup_schema",
+    python_callable=setup_schema,
+    dag=dag,
+)
+
+plan_partitions_task = PythonOperator(
+    task_id="plan_partitions",
+    python_callable=plan_partitions,
+    dag=dag,
+)
+
+# at most num_workers partitions run at once
+fetch_and_store_persons_task = PythonOperator.partial(
+    task_id="fetch_and_store_persons",
+    python_callable=fetch_and_store_persons,
+    max_active_tis_per_dag=settings.num_workers,
+    dag=dag,
+).expand(op_kwargs=plan_partitions_task.output)
+
+fetch_and_store_relationships_task = PythonOperator.partial(
+    task_id="fetch_and_store_relationships",
+    python_callable=fetch_and_store_relationships,
+    max_active_tis_per_dag=settings.num_workers,
+    dag=dag,
+).expand(op_kwargs=fetch_and_store_persons_task.output)
+
+record_high_water_mark_task = PythonOperator(
+    task_id="record_high_water_mark",
+    python_callable=record_high_water_mark,
+    trigger_rule="none_failed",
+    dag=dag,
+)
 
-    branch_fetch_and_store_persons >> [branch_fetch_and_store_relationships, stop_processing_persons]
-    branch_fetch_and_store_relationships >> [branch_fetch_and_store_persons, stop_processing_relationships]
+setup_schema_task >> plan_partitions_task >> fetch_and_store_persons_task
+fetch_and_store_relationships_task >> record_high_water_mark_task
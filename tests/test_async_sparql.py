@@ -0,0 +1,93 @@
+import asyncio
+from unittest.mock import MagicMock
+from urllib.parse import parse_qs
+
+import httpx
+
+import wikigraph.async_sparql as A
+import wikigraph.models as M
+import wikigraph.sparql as S
+
+
+def make_transport(requests, labels=True):
+    def handler(request):
+        query = parse_qs(request.content.decode())["query"][0]
+        requests.append(query)
+        offset = int(query.split("OFFSET ")[1].split()[0])
+        binding = {"person": {"value": f"http://www.wikidata.org/entity/Q{offset}"}}
+        if labels:
+            binding["personLabel"] = {"value": f"Person {offset}"}
+        bindings = [binding]
+        return httpx.Response(200, json={"results": {"bindings": bindings}})
+
+    return httpx.MockTransport(handler)
+
+
+async def collect(iterator):
+    return [item async for item in iterator]
+
+
+def test_fetch_persons_concurrently():
+    requests = []
+    pages = asyncio.run(
+        collect(
+            A.fetch_persons(
+                range(0, 50, 10),
+                10,
+                concurrency=2,
+                requests_per_second=100,
+                use_cache=False,
+                transport=make_transport(requests),
+            )
+        )
+    )
+    assert len(requests) == 5
+    uris = sorted(page[0].uri for page in pages)
+    assert uris == sorted(f"http://www.wikidata.org/entity/Q{offset}" for offset in range(0, 50, 10))
+
+
+def test_fetch_persons_validation_and_labels(monkeypatch):
+    from wikigraph.labels import LabelResolver
+
+    def fetch(ids, language):
+        return {id_: f"{language} {id_}" for id_ in ids}
+
+    requests = []
+    monkeypatch.setattr(S, "get_label_resolver", lambda language: LabelResolver(language, fetch))
+    strategy = S.QueryStrategy(label_source=S.LabelSource.NONE, language="de")
+    [page] = asyncio.run(
+        collect(
+            A.fetch_persons(
+                [0],
+                10,
+                validate=False,
+                strategy=strategy,
+                use_cache=False,
+                transport=make_transport(requests, labels=False),
+            )
+        )
+    )
+    assert "rdfs:label" not in requests[0]
+    # trusted bindings are loaded without validation, then labelled in the strategy's language
+    assert page == [M.Person(person="http://www.wikidata.org/entity/Q0", personLabel="de Q0")]
+
+
+def test_fetch_persons_follows_settings(monkeypatch):
+    settings = MagicMock(strict_validation=False)
+    monkeypatch.setattr(A, "get_settings", lambda: settings)
+    monkeypatch.setattr(M, "map_to_models", MagicMock(return_value=[]))
+    pages = A.fetch_persons([0], 10, use_cache=False, endpoint="http://localhost", transport=make_transport([]))
+    asyncio.run(collect(pages))
+    assert M.map_to_models.call_args.args[2] is False
+
+
+def test_token_bucket_limits_rate():
+    async def acquire_many(bucket, count):
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        for _ in range(count):
+            await bucket.acquire()
+        return loop.time() - start
+
+    elapsed = asyncio.run(acquire_many(A.TokenBucket(rate=50, capacity=1), 6))
+    assert elapsed >= 0.09
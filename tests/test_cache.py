@@ -0,0 +1,51 @@
+import time
+
+from wikigraph.cache import QueryCache, query_key
+
+
+BINDINGS = [{"person": {"type": "uri", "value": "http://www.wikidata.org/entity/Q352"}}]
+
+
+def test_query_key_ignores_whitespace():
+    assert query_key("SELECT ?x\n  WHERE { ?x ?y ?z }") == query_key("SELECT ?x WHERE { ?x ?y ?z }")
+    assert query_key("SELECT ?x WHERE { ?x ?y ?z }") != query_key("SELECT ?y WHERE { ?x ?y ?z }")
+
+
+def test_cache_roundtrip(tmp_path):
+    cache = QueryCache(tmp_path / "cache.sqlite")
+    assert cache.get("SELECT 1") is None
+    cache.set("SELECT 1", BINDINGS)
+    assert cache.get("SELECT  1") == BINDINGS
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+    assert cache.stats()["entries"] == 1
+
+
+def test_cache_ttl(tmp_path):
+    cache = QueryCache(tmp_path / "cache.sqlite", ttl=0.01)
+    cache.set("SELECT 1", BINDINGS)
+    time.sleep(0.02)
+    assert cache.get("SELECT 1") is None
+
+
+def test_cache_lru_eviction(tmp_path):
+    cache = QueryCache(tmp_path / "cache.sqlite")
+    cache.set("SELECT 0", BINDINGS)
+    entry_size = cache.stats()["bytes"]
+    cache.max_bytes = 10 * entry_size
+    for i in range(1, 10):
+        cache.set(f"SELECT {i}", BINDINGS)
+    time.sleep(0.01)
+    cache.get("SELECT 0")
+    # hits do not write until the next set
+    assert not cache._connection.in_transaction
+
+    cache.set("SELECT 10", BINDINGS)
+
+    # evicted down to 9 entries, dropping the two least recently used
+    assert cache.stats()["entries"] == 9
+    assert cache.get("SELECT 1") is None
+    assert cache.get("SELECT 2") is None
+    assert cache.get("SELECT 0") == BINDINGS
+    assert cache.get("SELECT 3") == BINDINGS
+    assert QueryCache(tmp_path / "cache.sqlite")._bytes == 9 * entry_size
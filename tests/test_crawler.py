@@ -0,0 +1,131 @@
+import multiprocessing
+from unittest.mock import MagicMock
+
+import wikigraph.crawler as Cr
+import wikigraph.models as M
+import wikigraph.neo4j_utils as N
+from wikigraph.partitioning import Partition
+
+
+def fake_fetch_partition(partition, *args):
+    persons = [
+        M.Person(person=f"http://www.wikidata.org/entity/Q{partition.index}{i}", personLabel=f"P{i}")
+        for i in range(partition.size)
+    ]
+    relationships = [
+        M.Relationship(
+            person=persons[0].uri,
+            personLabel="P0",
+            related_person=persons[-1].uri,
+            related_personLabel="P",
+            relationship="http://www.wikidata.org/prop/direct/P3373",
+        )
+    ]
+    return Cr.PartitionResult(partition=partition, persons=persons, relationships=relationships)
+
+
+def test_crawl(monkeypatch, tmp_path):
+    monkeypatch.setattr(Cr, "fetch_partition", fake_fetch_partition)
+    driver = MagicMock()
+    session = driver.session.return_value.__enter__.return_value
+    partitions = [Partition(index=i, size=3) for i in range(5)]
+
+    stats = Cr.crawl(
+        partitions,
+        driver,
+        ["P3373"],
+        fetch_workers=2,
+        write_batch_size=4,
+        queue_size=1,
+        checkpoint_dir=tmp_path,
+        mp_context=multiprocessing.get_context("fork"),
+    )
+
+    assert stats.partitions == 5
+    assert stats.persons == 15
+    assert stats.relationships == 5
+    written_persons = sum(
+        len(call.args[1]) for call in session.execute_write.call_args_list if call.args[0] is N.create_persons
+    )
+    assert written_persons == 15
+
+    from wikigraph.state import DONE, load_checkpoints
+
+    checkpoints = load_checkpoints(tmp_path)
+    assert [checkpoint.partition.index for checkpoint in checkpoints] == list(range(5))
+    assert all(checkpoint.status == DONE and checkpoint.persons == 3 for checkpoint in checkpoints)
+
+
+def _cached_query_caches():
+    from wikigraph.cache import get_query_cache
+
+    return get_query_cache.cache_info().currsize
+
+
+def test_worker_drops_inherited_caches():
+    from concurrent.futures import ProcessPoolExecutor
+
+    from wikigraph.cache import get_query_cache
+
+    get_query_cache()
+    with ProcessPoolExecutor(
+        max_workers=1, mp_context=multiprocessing.get_context("fork"), initializer=Cr._init_worker
+    ) as pool:
+        assert pool.submit(_cached_query_caches).result() == 0
+    assert _cached_query_caches() == 1
+
+
+def test_resume_mid_partition(monkeypatch, tmp_path):
+    from wikigraph.state import DONE, PENDING, Checkpoint, load_checkpoints, save_checkpoint, start_or_resume
+
+    partition = Partition(index=0, size=5)
+    save_checkpoint(tmp_path, Checkpoint(partition=partition))
+    result = fake_fetch_partition(partition)
+    result.relationships = [
+        M.Relationship(
+            person=person.uri,
+            personLabel=person.label,
+            related_person=result.persons[0].uri,
+            related_personLabel="P0",
+            relationship="http://www.wikidata.org/prop/direct/P3373",
+        )
+        for person in result.persons[1:]
+    ]
+    written = []
+
+    def insert_relationships(driver, relationships, batch_size):
+        if len(written) == 1:
+            raise RuntimeError("connection lost")
+        written.append(relationships)
+
+    monkeypatch.setattr(Cr, "insert_relationships", insert_relationships)
+    writer = Cr.BatchWriter(MagicMock(), batch_size=2, checkpoint_dir=tmp_path)
+    try:
+        writer.add(result)
+    except RuntimeError:
+        pass
+
+    [checkpoint] = load_checkpoints(tmp_path)
+    assert checkpoint.status == PENDING
+    assert checkpoint.cursor == result.persons[1].uri
+    assert checkpoint.persons == 2
+    assert checkpoint.relationships == 1
+
+    [resumed] = start_or_resume(tmp_path, lambda: [])
+    assert resumed.after == result.persons[1].uri
+
+    resumed_written = []
+    monkeypatch.setattr(
+        Cr, "insert_relationships", lambda driver, relationships, batch_size: resumed_written.extend(relationships)
+    )
+    writer = Cr.BatchWriter(MagicMock(), batch_size=2, checkpoint_dir=tmp_path)
+    writer.add(result.copy(update={
+        "partition": resumed,
+        "persons": result.persons[2:],
+        "relationships": result.relationships[1:],
+    }))
+    writer.flush()
+    [checkpoint] = load_checkpoints(tmp_path)
+    assert checkpoint.status == DONE
+    assert checkpoint.cursor == result.persons[-1].uri
+    assert [row.person_uri for row in resumed_written] == [person.uri for person in result.persons[2:]]
@@ -0,0 +1,89 @@
+from unittest.mock import MagicMock
+
+import wikigraph.crawler as Cr
+import wikigraph.models as M
+from wikigraph.dedup import BloomFilter, Deduplicator, SeenSet, canonical_edge, edge_key, property_id
+from wikigraph.partitioning import Partition
+
+
+def person(qid):
+    return M.Person(person=f"http://www.wikidata.org/entity/{qid}", personLabel=qid)
+
+
+def relationship(qid, prop, related_qid):
+    return M.Relationship(
+        person=f"http://www.wikidata.org/entity/{qid}",
+        personLabel=qid,
+        related_person=f"http://www.wikidata.org/entity/{related_qid}",
+        related_personLabel=related_qid,
+        relationship=f"http://www.wikidata.org/prop/direct/{prop}",
+    )
+
+
+def test_edge_key():
+    child = edge_key(relationship("Q1", "P40", "Q2"))
+    assert edge_key(relationship("Q2", "P22", "Q1")) == child
+    assert edge_key(relationship("Q2", "P25", "Q1")) == child
+    assert edge_key(relationship("Q1", "P22", "Q2")) != child
+    assert edge_key(relationship("Q1", "P3373", "Q2")) == edge_key(relationship("Q2", "P3373", "Q1"))
+    assert edge_key(relationship("Q1", "P26", "Q2")) == edge_key(relationship("Q2", "P26", "Q1"))
+    assert edge_key(relationship("Q1", "P106", "Q2")) != edge_key(relationship("Q2", "P106", "Q1"))
+
+
+def test_canonical_edge():
+    assert canonical_edge("wdt:P40", "Q1", "Q2") == ("P40", "Q1", "Q2", {})
+    assert canonical_edge("wdt:P22", "Q2", "Q1") == ("P40", "Q1", "Q2", {"parent": "FATHER"})
+    assert canonical_edge("wdt:P25", "Q2", "Q1") == ("P40", "Q1", "Q2", {"parent": "MOTHER"})
+    assert canonical_edge("wdt:P3373", "Q2", "Q1") == ("P3373", "Q1", "Q2", {})
+    assert canonical_edge("wdt:P26", "Q2", "Q1") == ("P26", "Q1", "Q2", {})
+    assert canonical_edge("wdt:P106", "Q2", "Q1") == ("P106", "Q2", "Q1", {})
+
+
+def test_deduplicator():
+    dedup = Deduplicator()
+    persons = list(dedup.persons([person("Q1"), person("Q2"), person("Q1")]))
+    relationships = list(dedup.relationships([
+        relationship("Q1", "P40", "Q2"),
+        relationship("Q2", "P22", "Q1"),
+        relationship("Q2", "P22", "Q1"),
+        relationship("Q1", "P40", "Q2"),
+        relationship("Q1", "P451", "Q3"),
+        relationship("Q3", "P451", "Q1"),
+    ]))
+
+    assert [p.label for p in persons] == ["Q1", "Q2"]
+    # the father statement adds the parent's role to the child edge
+    assert [property_id(r.relationship) for r in relationships] == ["P40", "P22", "P451"]
+    assert dedup.stats.duplicate_persons == 1
+    assert dedup.stats.duplicate_relationships == 3
+    assert list(dedup.persons([person("Q2")])) == []
+
+
+def test_bloom_seen_set():
+    bloom = BloomFilter(1000, 0.01)
+    for i in range(1000):
+        bloom.add(f"Q{i}")
+    assert all(f"Q{i}" in bloom for i in range(1000))
+    false_positives = sum(f"X{i}" in bloom for i in range(10000))
+    assert false_positives < 300
+
+    seen = SeenSet(bloom_capacity=100)
+    assert seen.add(("parent", "Q1", "Q2"))
+    assert not seen.add(("parent", "Q1", "Q2"))
+
+
+def test_batch_writer_drops_duplicates():
+    driver = MagicMock()
+    writer = Cr.BatchWriter(driver, batch_size=100)
+    for index in range(2):
+        writer.add(Cr.PartitionResult(
+            partition=Partition(index=index, size=2),
+            persons=[person("Q1"), person(f"Q{index + 2}")],
+            relationships=[relationship("Q1", "P40", "Q2"), relationship("Q2", "P22", "Q1")],
+        ))
+    writer.flush()
+
+    assert writer.stats.persons == 3
+    # the P40 edge and the father statement adding its role, once each
+    assert writer.stats.relationships == 2
+    assert writer.dedup.stats.duplicate_relationships == 2
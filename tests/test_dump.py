@@ -0,0 +1,70 @@
+import csv
+import gzip
+import json
+
+import pytest
+
+import wikigraph.dump as D
+
+
+def claim(target, rank="normal"):
+    return {"mainsnak": {"datavalue": {"type": "wikibase-entityid", "value": {"id": target}}}, "rank": rank}
+
+
+def entity(qid, label=None, human=True, member=False, **edges):
+    claims = {"P31": [claim("Q5" if human else "Q43229")]}
+    if member:
+        claims["P102"] = [claim("Q7320")]
+    for property_id, targets in edges.items():
+        claims[property_id] = [claim(target) for target in targets]
+    labels = {"en": {"language": "en", "value": label}} if label else {}
+    return {"id": qid, "labels": labels, "claims": claims, "modified": "2023-03-14T00:00:00Z"}
+
+
+def test_claim_targets_truthy():
+    claims = {
+        "P102": [claim("Q7320", "deprecated")],
+        "P31": [claim("Q5", "preferred"), claim("Q15632617"), claim("Q95074", "preferred")],
+        "P40": [claim("Q2"), claim("Q3", "deprecated")],
+    }
+    assert D.claim_targets({"claims": claims}, "P102") == []
+    assert D.claim_targets({"claims": claims}, "P31") == ["Q5", "Q95074"]
+    assert D.claim_targets({"claims": claims}, "P40") == ["Q2"]
+
+
+@pytest.fixture
+def dump_path(tmp_path):
+    entities = [
+        entity("Q1", "Member One", member=True, P40=["Q2", "Q3"], P108=["Q4"], P22=["Q5"]),
+        entity("Q2", "Child"),
+        entity("Q3", None),  # no English label
+        entity("Q4", "Employer", human=False),
+        entity("Q5", "Member Two", member=True, P40=["Q1"]),
+        entity("Q6", "Unrelated"),
+    ]
+    path = tmp_path / "dump.json.gz"
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        f.write("[\n" + ",\n".join(json.dumps(e) for e in entities) + "\n]\n")
+    return path
+
+
+def read_csv(path):
+    with open(path, newline="") as f:
+        return list(csv.reader(f))
+
+
+@pytest.mark.parametrize("processes", [1, 2])
+def test_convert_dump(dump_path, tmp_path, processes):
+    persons_path, relationships_path = D.convert_dump(
+        dump_path, tmp_path / "out", ["P40", "P22", "P108"], processes=processes, chunk_size=2
+    )
+
+    persons = read_csv(persons_path)
+    assert persons[0] == D.PERSONS_HEADER
+    assert sorted(row[1] for row in persons[1:]) == ["Child", "Member One", "Member Two"]
+
+    relationships = read_csv(relationships_path)
+    assert relationships[0] == D.RELATIONSHIPS_HEADER
+    edges = sorted((row[0].split("/")[-1], row[2], row[1].split("/")[-1], row[3]) for row in relationships[1:])
+    # Q1's P22 father statement and Q5's P40 child statement are the same edge
+    assert edges == [("Q1", "CHILD", "Q2", ""), ("Q5", "CHILD", "Q1", "FATHER")]
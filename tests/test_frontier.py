@@ -0,0 +1,79 @@
+from unittest.mock import MagicMock
+
+import wikigraph.frontier as F
+import wikigraph.models as M
+import wikigraph.neo4j_utils as N
+
+# Q1 -> Q2 -> Q3 -> Q4, with Q2 also stating its parent Q1
+EDGES = {"Q1": [("P40", "Q2")], "Q2": [("P22", "Q1"), ("P40", "Q3")], "Q3": [("P40", "Q4")]}
+
+
+def uri(qid):
+    return f"http://www.wikidata.org/entity/{qid}"
+
+
+def fake_get_relationships(offset, limit, persons, relationships, validate=True, **kwargs):
+    return [
+        M.Relationship(
+            person=person.uri,
+            personLabel=person.label,
+            related_person=uri(related),
+            related_personLabel=related,
+            relationship=f"http://www.wikidata.org/prop/direct/{prop}",
+        )
+        for person in persons
+        for prop, related in EDGES.get(person.label, [])
+    ]
+
+
+def written(driver, unit_of_work):
+    session = driver.session.return_value.__enter__.return_value
+    return [
+        row
+        for call in session.execute_write.call_args_list
+        if getattr(call.args[0], "func", call.args[0]) is unit_of_work
+        for row in call.args[1]
+    ]
+
+
+def test_frontier_crawl(monkeypatch):
+    monkeypatch.setattr(F.S, "get_relationships", fake_get_relationships)
+    driver = MagicMock()
+    seeds = [M.Person(person=uri("Q1"), personLabel="Q1")]
+
+    stats = F.frontier_crawl(seeds, driver, ["P40", "P22"], max_depth=2)
+
+    assert stats.depth == 2
+    assert [row["uri"] for row in written(driver, N.create_persons)] == [uri("Q1"), uri("Q2"), uri("Q3")]
+    # the P22 edge back to Q1 is written as Q1's P40 edge, adding the parent's role
+    assert stats.relationships == 3
+    edges = {(row["person_uri"], row["related_person_uri"]) for row in written(driver, N.create_relations)}
+    assert edges == {(uri("Q1"), uri("Q2")), (uri("Q2"), uri("Q3"))}
+
+
+def test_frontier_crawl_node_budget(monkeypatch):
+    monkeypatch.setattr(F.S, "get_relationships", fake_get_relationships)
+    driver = MagicMock()
+    seeds = [M.Person(person=uri("Q1"), personLabel="Q1")]
+
+    stats = F.frontier_crawl(seeds, driver, ["P40", "P22"], max_depth=5, max_nodes=2)
+
+    assert stats.persons == 2
+    assert stats.relationships == 2
+    assert {(row["person_uri"], row["related_person_uri"]) for row in written(driver, N.create_relations)} == {
+        (uri("Q1"), uri("Q2"))
+    }
+    assert all(row["related_person_uri"] != uri("Q3") for row in written(driver, N.create_relations))
+
+
+def test_frontier_crawl_attributes_only(monkeypatch):
+    get_relationships = MagicMock()
+    monkeypatch.setattr(F.S, "get_relationships", get_relationships)
+    monkeypatch.setattr(F.S, "get_attributes", lambda *args, **kwargs: [])
+    seeds = [M.Person(person=uri("Q1"), personLabel="Q1")]
+
+    stats = F.frontier_crawl(seeds, MagicMock(), ["P106"], max_depth=2)
+
+    get_relationships.assert_not_called()
+    assert stats.persons == 1
+    assert stats.depth == 1
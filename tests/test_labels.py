@@ -0,0 +1,87 @@
+import httpx
+
+import wikigraph.models as M
+import wikigraph.sparql as S
+from wikigraph.labels import LabelResolver, LabelStore, fetch_labels
+
+
+def fake_fetch(requests):
+    def fetch(ids, language):
+        requests.append(list(ids))
+        return {id_: None if id_ == "Q0" else f"Label {id_}" for id_ in ids}
+    return fetch
+
+
+def test_fetch_labels():
+    def handler(request):
+        assert request.url.params["action"] == "wbgetentities"
+        ids = request.url.params["ids"].split("|")
+        entities = {id_: {"labels": {"en": {"value": f"Label {id_}"}}} for id_ in ids if id_ != "Q0"}
+        return httpx.Response(200, json={"entities": entities})
+
+    labels = fetch_labels(["Q1", "Q0"], "en", transport=httpx.MockTransport(handler))
+    assert labels == {"Q1": "Label Q1", "Q0": None}
+
+
+def test_label_resolver_batches_and_caches(tmp_path):
+    requests = []
+    store = LabelStore(tmp_path / "labels.sqlite")
+    resolver = LabelResolver("en", fake_fetch(requests), store, memory_size=2, batch_size=2)
+
+    labels = resolver.resolve(["Q1", "Q2", "Q1", "Q3", "Q0"])
+
+    assert labels == {"Q1": "Label Q1", "Q2": "Label Q2", "Q3": "Label Q3", "Q0": None}
+    assert requests == [["Q1", "Q2"], ["Q3", "Q0"]]
+    # Q3 and Q0 are in memory, Q1 was evicted from memory but is on disk
+    assert resolver.resolve(["Q0", "Q1", "Q3"]) == {"Q0": None, "Q1": "Label Q1", "Q3": "Label Q3"}
+    assert len(requests) == 2
+    assert resolver.stats.store_hits == 1
+
+    # a new process starts from the on-disk cache
+    fresh = LabelResolver("en", fake_fetch(requests), LabelStore(tmp_path / "labels.sqlite"))
+    assert fresh.resolve(["Q2"]) == {"Q2": "Label Q2"}
+    assert len(requests) == 2
+
+
+def test_label_store_evicts_least_recently_used(tmp_path):
+    store = LabelStore(tmp_path / "labels.sqlite", max_entries=10)
+    for i in range(10):
+        store.set_many({f"Q{i}": str(i)}, "en")
+    store.get_many(["Q0"], "en")
+    # hits do not write until the next set_many
+    assert not store._connection.in_transaction
+
+    store.set_many({"Q10": "10"}, "en")
+
+    # evicted down to 9 entries, dropping the two least recently used
+    assert set(store.get_many([f"Q{i}" for i in range(11)], "en")) == {"Q0", *(f"Q{i}" for i in range(3, 11))}
+    assert LabelStore(tmp_path / "labels.sqlite", max_entries=10)._entries == 9
+
+
+def test_label_models():
+    requests = []
+    resolver = LabelResolver("en", fake_fetch(requests))
+    relationship = M.Relationship(
+        person="http://www.wikidata.org/entity/Q1",
+        related_person="http://www.wikidata.org/entity/Q2",
+        relationship="http://www.wikidata.org/prop/direct/P40",
+    )
+    person = M.Person(person="http://www.wikidata.org/entity/Q3", personLabel="Known")
+
+    resolver.label_models([relationship, person])
+
+    assert (relationship.person_label, relationship.related_person_label) == ("Label Q1", "Label Q2")
+    assert person.label == "Known"
+    assert requests == [["Q1", "Q2"]]
+
+
+def test_bare_uri_queries(monkeypatch):
+    bare = S.QueryStrategy(label_source=S.LabelSource.NONE)
+    query = S.build_relationships_query(0, None, "wd:Q1", "wdt:P40", strategy=bare)
+    assert "rdfs:label" not in query
+    assert "wikibase:label" not in query
+
+    monkeypatch.setattr(S, "execute_query", lambda query: [{"person": {"value": "http://www.wikidata.org/entity/Q1"}}])
+    monkeypatch.setattr(S, "get_label_resolver", lambda language: LabelResolver(language, fake_fetch([])))
+    persons = S.get_persons(0, 1, strategy=bare)
+    assert persons[0].label == "Label Q1"
@@ -0,0 +1,83 @@
+import logging
+import logging.handlers
+import multiprocessing
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from unittest.mock import MagicMock
+
+import pytest
+
+import wikigraph.logger as L
+import wikigraph.models as M
+import wikigraph.neo4j_utils as N
+
+
+@pytest.fixture
+def sampled_logging():
+    settings = MagicMock(correlation_id="", job_id="", log_level="DEBUG", log_row_sample_rate=1.0)
+    L.setup_logging(settings)
+    yield
+    L.setup_logging()
+
+
+@pytest.mark.parametrize("rate, expected", [(0.0, 0), (1.0, 10), (0.25, 3), (0.1, 1)])
+def test_row_sampler(rate, expected):
+    sampler = L.RowSampler(rate)
+    assert sum(sampler.sample() for _ in range(10)) == expected
+
+
+def test_setup_logging_enqueues_records():
+    L.setup_logging()
+    assert len(logging.root.handlers) == 1
+    assert isinstance(logging.root.handlers[0], logging.handlers.QueueHandler)
+    assert L._listener is not None
+    assert len(L._listener.handlers) == 2
+
+
+def test_setup_logging_replaces_listener():
+    L.setup_logging()
+    previous = L._listener
+    L.setup_logging()
+    assert L._listener is not previous
+    assert previous._thread is None
+
+
+def _log_message(message):
+    L.get_logger(__name__).warning(message)
+
+
+def test_forked_worker_logs_reach_handlers():
+    L.setup_logging()
+    log_file = L._listener.handlers[0].baseFilename
+    message = f"from a worker {uuid.uuid4()}"
+
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("fork")) as pool:
+        pool.submit(_log_message, message).result()
+
+    with open(log_file) as f:
+        assert message in f.read()
+
+
+def test_write_batches_logs_summary(caplog):
+    driver = MagicMock()
+    persons = [M.Person(person=f"wd:Q{i}", personLabel=f"Person {i}") for i in range(5)]
+
+    with caplog.at_level(logging.DEBUG):
+        N.insert_persons(driver, persons, batch_size=2)
+
+    summaries = [record.getMessage() for record in caplog.records if record.levelno == logging.INFO]
+    assert len(summaries) == 1
+    assert summaries[0].startswith("create_persons: wrote 5 rows in 3 chunks")
+    assert not any("Sample row" in record.getMessage() for record in caplog.records)
+
+
+def test_write_batches_samples_rows(caplog, sampled_logging):
+    driver = MagicMock()
+    persons = [M.Person(person=f"wd:Q{i}", personLabel=f"Person {i}") for i in range(5)]
+
+    with caplog.at_level(logging.DEBUG):
+        N.insert_persons(driver, persons, batch_size=2)
+
+    samples = [record.getMessage() for record in caplog.records if "Sample row" in record.getMessage()]
+    assert len(samples) == 3
+    assert "wd:Q0" in samples[0]
@@ -0,0 +1,58 @@
+import pytest
+import pydantic
+
+import wikigraph.models as M
+
+
+BINDINGS = [
+    {
+        "person": {"type": "uri", "value": "http://www.wikidata.org/entity/Q352"},
+        "personLabel": {"xml:lang": "en", "type": "literal", "value": "Adolf Hitler"},
+    },
+    {
+        "person": {"type": "uri", "value": "http://www.wikidata.org/entity/Q2512"},
+        "personLabel": {"xml:lang": "en", "type": "literal", "value": "Joseph Goebbels"},
+    },
+]
+
+
+@pytest.mark.parametrize("validate", [True, False])
+def test_map_to_models(validate):
+    persons = M.map_to_models(BINDINGS, M.Person, validate)
+    assert [person.uri for person in persons] == [
+        "http://www.wikidata.org/entity/Q352",
+        "http://www.wikidata.org/entity/Q2512",
+    ]
+    assert persons[1].label == "Joseph Goebbels"
+
+
+def test_map_to_models_trusted_matches_validated():
+    bindings = BINDINGS + [{**BINDINGS[0], "extra": {"type": "literal", "value": "dropped"}}]
+    trusted = M.map_to_models(bindings, M.Person, False)
+    assert trusted == M.map_to_models(bindings, M.Person, True)
+    assert trusted[2].dict() == {
+        "uri": "http://www.wikidata.org/entity/Q352", "label": "Adolf Hitler", "modified": None
+    }
+
+
+def test_map_to_models_strict_rejects_missing_fields():
+    with pytest.raises(pydantic.ValidationError):
+        M.map_to_models([{"personLabel": BINDINGS[0]["personLabel"]}], M.Person)
+
+
+def test_map_to_models_without_labels():
+    persons = M.map_to_models([{"person": BINDINGS[0]["person"]}], M.Person)
+    assert persons[0].label is None
+
+
+def test_map_to_columns():
+    columns = M.map_to_columns(BINDINGS + [{"person": BINDINGS[0]["person"]}], M.Person)
+    assert columns == {
+        "uri": [
+            "http://www.wikidata.org/entity/Q352",
+            "http://www.wikidata.org/entity/Q2512",
+            "http://www.wikidata.org/entity/Q352",
+        ],
+        "label": ["Adolf Hitler", "Joseph Goebbels", None],
+        "modified": [None, None, None],
+    }
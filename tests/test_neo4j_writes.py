@@ -0,0 +1,214 @@
+import pytest
+from unittest.mock import MagicMock
+
+import wikigraph.models as M
+import wikigraph.neo4j_utils as N
+from wikigraph.utils import chunked
+
+
+def test_chunked():
+    assert list(chunked(range(5), 2)) == [[0, 1], [2, 3], [4]]
+    assert list(chunked([], 3)) == []
+
+
+def test_insert_persons_batches():
+    driver = MagicMock()
+    session = driver.session.return_value.__enter__.return_value
+    persons = [M.Person(person=f"wd:Q{i}", personLabel=f"Person {i}") for i in range(5)]
+
+    timings = N.insert_persons(driver, persons, batch_size=2)
+
+    assert [timing.rows for timing in timings] == [2, 2, 1]
+    assert session.execute_write.call_count == 3
+    unit_of_work, rows = session.execute_write.call_args_list[0].args
+    assert unit_of_work is N.create_persons
+    assert rows == [{"uri": "wd:Q0", "label": "Person 0"}, {"uri": "wd:Q1", "label": "Person 1"}]
+
+
+def test_insert_relationships_batches():
+    driver = MagicMock()
+    session = driver.session.return_value.__enter__.return_value
+    relationship = M.Relationship(
+        person="wd:Q1",
+        personLabel="A",
+        related_person="wd:Q2",
+        related_personLabel="B",
+        relationship="wdt:P40",
+    )
+
+    timings = N.insert_relationships(driver, [relationship], batch_size=10, relationship_types={"P40": "CHILD"})
+
+    assert len(timings) == 1
+    unit_of_work, rows = session.execute_write.call_args.args
+    assert unit_of_work.func is N.create_relations
+    assert unit_of_work.keywords == {"relationship_type": "CHILD"}
+    assert rows == [{"person_uri": "wd:Q1", "related_person_uri": "wd:Q2", "properties": {}}]
+
+
+def test_insert_relationships_by_type():
+    driver = MagicMock()
+    session = driver.session.return_value.__enter__.return_value
+    relationships = [
+        M.Relationship(
+            person=f"wd:Q{i}",
+            personLabel="A",
+            related_person="wd:Q0",
+            related_personLabel="B",
+            relationship=f"http://www.wikidata.org/prop/direct/{prop}",
+        )
+        for i, prop in enumerate(["P40", "P22", "P40", "P9999"])
+    ]
+
+    N.insert_relationships(driver, relationships, batch_size=10, relationship_types={"P40": "CHILD"})
+
+    written = {
+        call.args[0].keywords["relationship_type"]: call.args[1]
+        for call in session.execute_write.call_args_list
+    }
+    assert {type_: len(rows) for type_, rows in written.items()} == {"CHILD": 3, "P9999": 1}
+    # the father statement is stored as the child edge from the father
+    assert written["CHILD"][1] == {"person_uri": "wd:Q0", "related_person_uri": "wd:Q1", "properties": {"parent": "FATHER"}}
+
+    tx = MagicMock()
+    N.create_relations(tx, [], "CHILD")
+    assert "MERGE (p)-[e:CHILD]->(r)" in tx.run.call_args.args[0]
+    with pytest.raises(ValueError):
+        N.create_relations(tx, [], "CHILD]->(r) DETACH DELETE (r")
+
+
+def test_migrate_has_relation_edges():
+    driver = MagicMock()
+    session = driver.session.return_value.__enter__.return_value
+    counts = iter([2, 2, 1, 0, 1, 0])
+    session.execute_write.side_effect = lambda *args: next(counts)
+    values = [
+        "http://www.wikidata.org/prop/direct/P40",
+        "wdt:P40",
+        "http://www.wikidata.org/prop/direct/P22",
+        "P9999",
+        "not a property",
+        None,
+    ]
+
+    def run(query, **kwargs):
+        result = MagicMock()
+        result.__iter__.return_value = iter([{"type": value} for value in values])
+        result.single.return_value = {"remaining": 0}
+        return result
+
+    session.run.side_effect = run
+
+    migrated = N.migrate_has_relation_edges(driver, batch_size=2, relationship_types={"P40": "CHILD"})
+
+    assert migrated == {"CHILD": 6, "P9999": 0}
+    calls = [call.args[1:] for call in session.execute_write.call_args_list]
+    assert all(call.args[0] is N.rewrite_relations for call in session.execute_write.call_args_list)
+    assert calls == [
+        ("http://www.wikidata.org/prop/direct/P40", "CHILD", 2, "forward", {}),
+        ("http://www.wikidata.org/prop/direct/P40", "CHILD", 2, "forward", {}),
+        ("http://www.wikidata.org/prop/direct/P40", "CHILD", 2, "forward", {}),
+        ("wdt:P40", "CHILD", 2, "forward", {}),
+        # father statements become child edges from the father
+        ("http://www.wikidata.org/prop/direct/P22", "CHILD", 2, "reverse", {"parent": "FATHER"}),
+        ("P9999", "P9999", 2, "forward", {}),
+    ]
+    queries = [call.args[0] for call in session.run.call_args_list]
+    assert queries[0] == N.HAS_RELATION_TYPE_INDEX
+    assert queries[-1] == "DROP INDEX has_relation_type IF EXISTS"
+
+    tx = MagicMock()
+    N.rewrite_relations(tx, "wdt:P40", "CHILD", 10)
+    query = tx.run.call_args.args[0]
+    assert "WHERE old.type = $value" in query
+    assert "MERGE (a)-[e:CHILD]->(b)" in query
+
+
+def test_ensure_schema():
+    driver = MagicMock()
+    session = driver.session.return_value.__enter__.return_value
+
+    N.ensure_schema(driver, attribute_labels={"P106": "Occupation", "P108": "Employer", "P1037": "Employer"})
+
+    statements = [call.args[0] for call in session.run.call_args_list]
+    assert statements[:len(N.SCHEMA_STATEMENTS)] == N.SCHEMA_STATEMENTS
+    assert statements[len(N.SCHEMA_STATEMENTS):] == [
+        "CREATE CONSTRAINT employer_uri IF NOT EXISTS FOR (n:Employer) REQUIRE n.uri IS UNIQUE",
+        "CREATE CONSTRAINT occupation_uri IF NOT EXISTS FOR (n:Occupation) REQUIRE n.uri IS UNIQUE",
+    ]
+    assert all("IF NOT EXISTS" in statement for statement in statements)
+
+
+def test_shared_driver_registry(monkeypatch):
+    import wikigraph.config as C
+
+    created = []
+
+    def fake_driver(uri, auth, **config):
+        created.append(config)
+        return MagicMock()
+
+    monkeypatch.setattr(N.GraphDatabase, "driver", fake_driver)
+    settings = C.Settings(
+        num_workers=1,
+        items_per_worker=1,
+        neo4j_uri="bolt://localhost:7687",
+        neo4j_user="neo4j",
+        neo4j_password="password",
+        neo4j_max_connection_pool_size=7,
+    )
+
+    driver = N.get_driver(settings)
+    assert N.get_driver(settings) is driver
+    assert len(created) == 1
+    assert created[0]["max_connection_pool_size"] == 7
+
+    with N.open_session(driver):
+        with N.open_session(driver):
+            metrics = N.pool_metrics()["bolt://localhost:7687"]
+            assert metrics["in_use"] == 2
+    metrics = N.pool_metrics()["bolt://localhost:7687"]
+    assert metrics == {"max_size": 7, "in_use": 0, "peak_in_use": 2, "acquired": 2}
+
+    N.close_drivers()
+    driver.close.assert_called_once()
+    assert N.pool_metrics() == {}
+
+
+def test_insert_attributes():
+    driver = MagicMock()
+    session = driver.session.return_value.__enter__.return_value
+    attributes = [
+        M.Attribute(
+            person="wd:Q1",
+            relationship=f"http://www.wikidata.org/prop/direct/{prop}",
+            target=f"wd:Q{i + 10}",
+            targetLabel=f"Target {i}",
+        )
+        for i, prop in enumerate(["P106", "P108", "P1037", "P106"])
+    ]
+
+    N.insert_attributes(
+        driver,
+        attributes,
+        batch_size=10,
+        attribute_labels={"P106": "Occupation", "P108": "Organization", "P1037": "Organization"},
+        relationship_types={"P106": "OCCUPATION", "P108": "EMPLOYER", "P1037": "DIRECTOR_MANAGER"},
+    )
+
+    written = {
+        (call.args[0].keywords["label"], call.args[0].keywords["relationship_type"]): call.args[1]
+        for call in session.execute_write.call_args_list
+    }
+    assert {key: len(rows) for key, rows in written.items()} == {
+        ("Occupation", "OCCUPATION"): 2,
+        ("Organization", "EMPLOYER"): 1,
+        ("Organization", "DIRECTOR_MANAGER"): 1,
+    }
+    assert written["Occupation", "OCCUPATION"][0] == {"person_uri": "wd:Q1", "target_uri": "wd:Q10", "target_label": "Target 0"}
+
+    tx = MagicMock()
+    N.create_attributes(tx, [], "Occupation", "OCCUPATION")
+    assert "MERGE (t:Occupation {uri: row.target_uri})" in tx.run.call_args.args[0]
+    with pytest.raises(ValueError):
+        N.create_attributes(tx, [], "Occupation {uri: 1}) DETACH DELETE (t", "OCCUPATION")
+    assert any("FOR (n:Occupation)" in statement for statement in N.schema_statements())
@@ -0,0 +1,26 @@
+import wikigraph.partitioning as P
+
+
+def test_plan_partitions():
+    uris = [f"http://www.wikidata.org/entity/Q{i}" for i in range(1, 8)]
+    partitions = P.plan_partitions(uris, 3)
+
+    assert [partition.size for partition in partitions] == [3, 3, 1]
+    assert partitions[0].after is None
+    assert partitions[0].until == uris[2]
+    assert partitions[1].after == uris[2]
+    assert partitions[1].until == uris[5]
+    assert partitions[2].after == uris[5]
+    assert partitions[2].until is None
+
+
+def test_plan_partitions_exact_and_empty():
+    uris = [f"http://www.wikidata.org/entity/Q{i}" for i in range(1, 5)]
+    partitions = P.plan_partitions(uris, 2)
+    assert [partition.size for partition in partitions] == [2, 2]
+    assert partitions[-1].until is None
+
+    partitions = P.plan_partitions([], 2, since="2023-03-14T00:00:00Z")
+    assert len(partitions) == 1
+    assert partitions[0].after is None and partitions[0].until is None
+    assert partitions[0].since == "2023-03-14T00:00:00Z"
@@ -0,0 +1,71 @@
+import httpx
+import pytest
+from neo4j.exceptions import ServiceUnavailable, TransientError
+
+import wikigraph.retry as R
+from wikigraph.exceptions import DataFetchError, QueryTimeoutError, RateLimitedError, TransientDataFetchError
+
+
+def status_error(code, headers=None):
+    request = httpx.Request("POST", "https://query.wikidata.org/sparql")
+    response = httpx.Response(code, headers=headers, request=request)
+    return httpx.HTTPStatusError("error", request=request, response=response)
+
+
+@pytest.mark.parametrize(
+    "exc, transient",
+    [
+        (RateLimitedError(), True),
+        (TransientDataFetchError(), True),
+        (DataFetchError(), False),
+        (QueryTimeoutError(), False),
+        (ServiceUnavailable(), True),
+        (TransientError(), True),
+        (status_error(429), True),
+        (status_error(503), True),
+        (status_error(400), False),
+        (ValueError(), False),
+    ],
+)
+def test_is_transient(exc, transient):
+    assert R.is_transient(exc) is transient
+
+
+def test_retry_after():
+    assert R.retry_after(RateLimitedError(retry_after=7)) == 7
+    assert R.retry_after(status_error(429, {"Retry-After": "12"})) == 12
+    assert R.parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    assert R.parse_retry_after("soon") is None
+
+
+def test_call_with_retry():
+    policy = R.RetryPolicy(max_attempts=3, base_delay=0.5, max_delay=1.0)
+    delays = []
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise RateLimitedError(retry_after=5)
+        return "ok"
+
+    assert R.call_with_retry(flaky, policy=policy, sleep=delays.append) == "ok"
+    assert delays == [5, 5]
+
+    calls.clear()
+    with pytest.raises(RateLimitedError):
+        R.call_with_retry(flaky, policy=R.RetryPolicy(max_attempts=2), sleep=delays.append)
+
+    def broken():
+        calls.append(1)
+        raise DataFetchError()
+
+    calls.clear()
+    with pytest.raises(DataFetchError):
+        R.call_with_retry(broken, policy=policy, sleep=delays.append)
+    assert len(calls) == 1
+
+
+def test_backoff_is_bounded():
+    policy = R.RetryPolicy(base_delay=1.0, max_delay=4.0)
+    assert all(0 <= policy.backoff(attempt) <= 4.0 for attempt in range(1, 10))
@@ -51,4 +51,324 @@ def test_get_relationships_offset_limit():
 
     assert len(relationships_1) == 1
     assert len(relationships_2) == 1
-    assert relationships_1 != relationships_2
\ No newline at end of file
+    assert relationships_1 != relationships_2
+
+def test_create_persons_keyset_query():
+    query = S.create_persons_keyset_query(5)
+    assert "LIMIT 5" in query
+    assert "OFFSET" not in query
+    assert "FILTER (STR(?person) >" not in query
+
+    uri = "http://www.wikidata.org/entity/Q352"
+    query = S.create_persons_keyset_query(5, after=uri)
+    assert f'FILTER (STR(?person) > "{uri}")' in query
+    assert "ORDER BY STR(?person)" in query
+
+
+def test_iter_person_pages(monkeypatch):
+    uris = [f"http://www.wikidata.org/entity/Q{i}" for i in range(1, 6)]
+
+    def fake_execute_query(query):
+        after = None
+        if 'FILTER (STR(?person) > "' in query:
+            after = query.split('FILTER (STR(?person) > "')[1].split('"')[0]
+        limit = int(query.split("LIMIT ")[1].split()[0])
+        remaining = [uri for uri in uris if after is None or uri > after]
+        return [
+            {"person": {"value": uri}, "personLabel": {"value": uri[-2:]}}
+            for uri in remaining[:limit]
+        ]
+
+    monkeypatch.setattr(S, "execute_query", fake_execute_query)
+    pages = list(S.iter_person_pages(2))
+
+    assert [len(page) for page in pages] == [2, 2, 1]
+    assert [person.uri for page in pages for person in page] == uris
+
+
+def test_iter_person_pages_duplicate_rows(monkeypatch):
+    uris = [f"http://www.wikidata.org/entity/Q{i}" for i in range(10)]
+    queries = []
+
+    def fake_execute_query(query):
+        queries.append(query)
+        after = None
+        if 'FILTER (STR(?person) > "' in query:
+            after = query.split('FILTER (STR(?person) > "')[1].split('"')[0]
+        limit = int(query.split("LIMIT ")[1].split()[0])
+        rows = [uri for uri in uris if after is None or uri > after][:limit]
+        # a person reached by two subclass paths, in the middle of the first page
+        if after is None:
+            rows = rows[:1] + rows[1:2] * 2 + rows[2:limit - 1]
+        return [{"person": {"value": uri}, "personLabel": {"value": uri[-2:]}} for uri in rows]
+
+    monkeypatch.setattr(S, "execute_query", fake_execute_query)
+    pages = list(S.iter_person_pages(3))
+
+    assert "SELECT DISTINCT ?person" in queries[0]
+    assert {person.uri for page in pages for person in page} == set(uris)
+
+
+def test_stream_persons(monkeypatch):
+    import io
+
+    bindings = [
+        {"person": {"type": "uri", "value": f"http://www.wikidata.org/entity/Q{i}"},
+         "personLabel": {"type": "literal", "value": f"Person {i}"}}
+        for i in range(3)
+    ]
+    body = io.BytesIO(json.dumps({"head": {}, "results": {"bindings": bindings}}).encode())
+    client = MagicMock()
+    client.query.return_value.response = body
+    monkeypatch.setattr(S, "create_client", lambda: client)
+
+    persons = S.stream_persons(0, 3)
+    assert not isinstance(persons, list)
+    assert [person.label for person in persons] == ["Person 0", "Person 1", "Person 2"]
+    assert body.closed
+
+
+def test_iter_person_uris_streams_and_retries(monkeypatch):
+    import io
+    from urllib.error import HTTPError
+
+    import wikigraph.retry as R
+
+    uris = [f"http://www.wikidata.org/entity/Q{i}" for i in range(1, 6)]
+    responses = []
+
+    def query():
+        # the endpoint is briefly unavailable before each page
+        if len(responses) % 2 == 0:
+            responses.append(None)
+            raise HTTPError(S.wikidata_endpoint, 503, "Service Unavailable", {}, None)
+        query = client.setQuery.call_args.args[0]
+        after = query.split('FILTER (STR(?person) > "')[1].split('"')[0] if "FILTER" in query else ""
+        limit = int(query.split("LIMIT ")[1].split()[0])
+        bindings = [{"person": {"type": "uri", "value": uri}} for uri in uris if uri > after][:limit]
+        body = io.BytesIO(json.dumps({"head": {}, "results": {"bindings": bindings}}).encode())
+        responses.append(body)
+        return MagicMock(response=body)
+
+    client = MagicMock(endpoint=S.wikidata_endpoint)
+    client.query.side_effect = query
+    monkeypatch.setattr(S, "create_client", lambda: client)
+    monkeypatch.setattr(R, "get_retry_policy", lambda: R.RetryPolicy(base_delay=0.0, max_delay=0.0))
+
+    assert list(S.iter_person_uris(2)) == uris
+    bodies = [body for body in responses if body is not None]
+    assert len(bodies) == 3
+    assert all(body.closed for body in bodies)
+
+
+def test_stream_bindings_translates_errors(monkeypatch):
+    from urllib.error import HTTPError
+
+    from wikigraph.exceptions import DataFetchError
+
+    client = MagicMock(endpoint=S.wikidata_endpoint)
+    client.query.side_effect = HTTPError(S.wikidata_endpoint, 400, "Bad Request", {}, None)
+    monkeypatch.setattr(S, "create_client", lambda: client)
+
+    with pytest.raises(DataFetchError):
+        list(S.stream_bindings("SELECT"))
+    assert client.query.call_count == 1
+
+
+def test_get_relationships_splits_on_timeout(monkeypatch):
+    from wikigraph.exceptions import QueryTimeoutError
+
+    persons = [
+        M.Person(person=f"http://www.wikidata.org/entity/Q{i}", personLabel=f"Person {i}")
+        for i in range(1, 9)
+    ]
+    queried = []
+
+    def fake_execute_query(query):
+        qids = query.split("VALUES ?person {")[1].split("}")[0].split()
+        queried.append(len(qids))
+        if len(qids) > 2:
+            raise QueryTimeoutError()
+        # every person is related to Q1, so Q1's self-edge is returned by each batch
+        return [
+            {
+                "person": {"value": "http://www.wikidata.org/entity/Q1"},
+                "personLabel": {"value": "Person 1"},
+                "related_person": {"value": f"http://www.wikidata.org/entity/{qid[3:]}"},
+                "related_personLabel": {"value": qid},
+                "relationship": {"value": "http://www.wikidata.org/prop/direct/P3373"},
+            }
+            for qid in qids + ["wd:Q1"]
+        ]
+
+    monkeypatch.setattr(S, "execute_query", fake_execute_query)
+    relationships = S.get_relationships(
+        0, None, persons, ["P3373"], batch_size=S.AdaptiveBatchSize(size=8), max_workers=2
+    )
+
+    assert queried[0] == 8
+    assert 2 in queried
+    assert len(relationships) == 8
+    assert S.get_relationships(2, 3, persons, ["P3373"]) == relationships[2:5]
+
+
+def test_persons_queries_since():
+    since = "2023-03-14T00:00:00Z"
+    for query in [S.create_persons_query(0, 5, since), S.create_persons_keyset_query(5, since=since)]:
+        assert "?person schema:dateModified ?modified" in query
+        assert f'FILTER (?modified > "{since}"^^xsd:dateTime)' in query
+
+    query = S.build_relationships_query(0, None, "wd:Q1", "wdt:P40", since=since)
+    assert f'FILTER (?modified > "{since}"^^xsd:dateTime)' in query
+    assert "schema:dateModified" not in S.build_relationships_query(0, None, "wd:Q1", "wdt:P40")
+
+
+def test_create_persons_keyset_query_until():
+    after = "http://www.wikidata.org/entity/Q1"
+    until = "http://www.wikidata.org/entity/Q5"
+    query = S.create_persons_keyset_query(5, after=after, until=until)
+    assert f'FILTER (STR(?person) > "{after}" && STR(?person) <= "{until}")' in query
+
+
+def test_iter_person_pages_halves_on_timeout(monkeypatch):
+    from wikigraph.exceptions import QueryTimeoutError
+
+    limits = []
+
+    def fake_execute_query(query):
+        limit = int(query.split("LIMIT ")[1].split()[0])
+        limits.append(limit)
+        if limit > 2:
+            raise QueryTimeoutError()
+        after = 'FILTER (STR(?person) > "' in query
+        uris = ["http://www.wikidata.org/entity/Q3"] if after else [
+            "http://www.wikidata.org/entity/Q1", "http://www.wikidata.org/entity/Q2"
+        ]
+        return [{"person": {"value": uri}, "personLabel": {"value": uri[-2:]}} for uri in uris]
+
+    monkeypatch.setattr(S, "execute_query", fake_execute_query)
+    pages = list(S.iter_person_pages(8))
+
+    assert limits[:3] == [8, 4, 2]
+    assert [len(page) for page in pages] == [2, 1]
+
+
+def test_build_persons_with_relationships_query():
+    query = S.build_persons_with_relationships_query(5, "wdt:P40 wdt:P22", after="http://www.wikidata.org/entity/Q1")
+    assert "LIMIT 5" in query
+    assert "SELECT DISTINCT ?person ?personLabel ?modified" in query
+    assert "OPTIONAL" in query
+    assert "{wdt:P40 wdt:P22}" in query
+    assert 'STR(?person) > "http://www.wikidata.org/entity/Q1"' in query
+
+
+def test_group_persons_and_relationships():
+    def binding(person, related=None):
+        row = {
+            "person": {"value": f"http://www.wikidata.org/entity/{person}"},
+            "personLabel": {"value": person},
+        }
+        if related:
+            row.update({
+                "related_person": {"value": f"http://www.wikidata.org/entity/{related}"},
+                "related_personLabel": {"value": related},
+                "relationship": {"value": "http://www.wikidata.org/prop/direct/P40"},
+            })
+        return row
+
+    bindings = [binding("Q1", "Q10"), binding("Q1", "Q11"), binding("Q2")]
+    persons, relationships = S.group_persons_and_relationships(bindings)
+
+    assert [person.label for person in persons] == ["Q1", "Q2"]
+    assert [r.related_person_label for r in relationships] == ["Q10", "Q11"]
+
+
+def test_query_strategy_class_filter():
+    query = S.create_persons_keyset_query(5)
+    assert "?person wdt:P31/wdt:P279* wd:Q5 ." in query
+
+    direct = S.QueryStrategy(class_filter=S.ClassFilter.DIRECT)
+    query = S.build_relationships_query(0, None, "wd:Q1", "wdt:P40", strategy=direct)
+    assert "wdt:P279*" not in query
+    assert "?person wdt:P31 wd:Q5 ." in query
+    assert "?related_person wdt:P31 wd:Q5 ." in query
+
+    allowed = S.QueryStrategy(class_filter=S.ClassFilter.ALLOWED_CLASSES, allowed_classes=["Q5", "Q15632617"])
+    query = S.create_person_uris_query(5, strategy=allowed)
+    assert "wdt:P279*" not in query
+    assert "VALUES ?personClass {wd:Q5 wd:Q15632617}" in query
+
+
+def test_query_strategy_label_source():
+    query = S.build_persons_with_relationships_query(5, "wdt:P40")
+    assert 'FILTER (LANG(?personLabel) = "en")' in query
+    assert "wikibase:label" not in query
+
+    service = S.QueryStrategy(label_source=S.LabelSource.LABEL_SERVICE)
+    for query in [
+        S.create_persons_query(0, 5, strategy=service),
+        S.build_relationships_query(0, None, "wd:Q1", "wdt:P40", strategy=service),
+    ]:
+        assert "rdfs:label" not in query
+        assert query.count('SERVICE wikibase:label { bd:serviceParam wikibase:language "en". }') == 1
+
+
+def test_benchmark_strategies(monkeypatch):
+    queries = []
+
+    def fake_execute_query(query, use_cache=True):
+        assert not use_cache
+        queries.append(query)
+        return [{"person": {"value": "http://www.wikidata.org/entity/Q1"}}]
+
+    monkeypatch.setattr(S, "execute_query", fake_execute_query)
+    timings = S.benchmark_strategies(
+        {"path": S.DEFAULT_STRATEGY, "direct": S.QueryStrategy(class_filter="direct")}, limit=5, repeats=2
+    )
+
+    assert set(timings) == {"path", "direct"}
+    assert timings["direct"].rows == 1
+    assert len(queries) == 4
+
+
+def test_create_client_endpoint(monkeypatch):
+    from wikigraph.config import get_settings
+
+    monkeypatch.setattr(get_settings(), "sparql_endpoint", "http://localhost:8890/sparql")
+    assert S.create_client().endpoint == "http://localhost:8890/sparql"
+    assert S.create_client(S.wikidata_endpoint).endpoint == S.wikidata_endpoint
+
+
+def test_split_relationship_types():
+    persons, attributes = S.split_relationship_types(["P40", "P106", "P22", "P551"], {"P106": "Occupation", "P551": "Place"})
+    assert persons == ["P40", "P22"]
+    assert attributes == ["P106", "P551"]
+
+
+def test_build_attributes_query():
+    query = S.build_attributes_query("wd:Q1 wd:Q2", "wdt:P106")
+    assert "{wd:Q1 wd:Q2}" in query
+    assert "{wdt:P106}" in query
+    assert "wdt:P31" not in query
+    assert 'FILTER (LANG(?targetLabel) = "en")' in query
+
+
+def test_get_attributes(monkeypatch):
+    def fake_execute_query(query):
+        return [
+            {
+                "person": {"value": "http://www.wikidata.org/entity/Q1"},
+                "relationship": {"value": "http://www.wikidata.org/prop/direct/P106"},
+                "target": {"value": f"http://www.wikidata.org/entity/Q{qid}"},
+                "targetLabel": {"value": f"Occupation {qid}"},
+            }
+            for qid in [82955, 36180, 82955]
+        ]
+
+    monkeypatch.setattr(S, "execute_query", fake_execute_query)
+    persons = [M.Person(person="http://www.wikidata.org/entity/Q1", personLabel="Person 1")]
+
+    attributes = S.get_attributes(persons, ["P106"])
+
+    assert [attribute.target_label for attribute in attributes] == ["Occupation 36180", "Occupation 82955"]
+    assert S.get_attributes(persons, []) == []
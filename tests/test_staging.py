@@ -0,0 +1,18 @@
+from pathlib import Path
+
+import wikigraph.models as M
+import wikigraph.staging as St
+
+
+def test_staging_roundtrip(tmp_path):
+    persons = [
+        M.Person(person="http://www.wikidata.org/entity/Q352", personLabel="Adolf Hitler", modified="2023-03-14T00:00:00Z"),
+        M.Person(person="http://www.wikidata.org/entity/Q2512", personLabel="Joseph Goebbels"),
+    ]
+
+    reference = St.write_batch(persons, tmp_path, "manual__2023-03-14T00:00:00+00:00_persons_0")
+    assert ":" not in Path(reference).name
+    assert St.read_batch(reference) == persons
+
+    St.delete_batch(reference)
+    assert not Path(reference).exists()
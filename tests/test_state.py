@@ -0,0 +1,70 @@
+import wikigraph.models as M
+import wikigraph.state as St
+
+
+def test_high_water_mark_roundtrip(tmp_path):
+    path = tmp_path / "state" / "wikigraph.json"
+    assert St.get_high_water_mark(path) is None
+    St.set_high_water_mark(path, "2023-03-14T00:00:00Z")
+    assert St.get_high_water_mark(path) == "2023-03-14T00:00:00Z"
+    assert not path.with_suffix(".json.tmp").exists()
+
+
+def test_latest_modified():
+    persons = [
+        M.Person(person="wd:Q1", personLabel="A", modified="2023-03-14T10:00:00Z"),
+        M.Person(person="wd:Q2", personLabel="B", modified="2023-03-15T09:00:00Z"),
+        M.Person(person="wd:Q3", personLabel="C"),
+    ]
+    assert St.latest_modified(persons) == "2023-03-15T09:00:00Z"
+    assert St.latest_modified([]) is None
+
+
+def test_start_or_resume(tmp_path):
+    from wikigraph.partitioning import Partition
+
+    planned = [Partition(index=i, size=2, after=f"wd:Q{i}0") for i in range(3)]
+    earliest = St.crawl_start_mark(60)
+
+    def plan():
+        # the mark is taken before the endpoint is queried
+        assert St.checkpoints_high_water_mark(tmp_path) is not None
+        return planned
+
+    partitions = St.start_or_resume(tmp_path, plan, lag_seconds=60)
+    assert partitions == planned
+    high_water_mark = St.checkpoints_high_water_mark(tmp_path)
+    assert earliest <= high_water_mark <= St.crawl_start_mark(60)
+    assert [c.status for c in St.load_checkpoints(tmp_path)] == [St.PENDING] * 3
+
+    St.save_checkpoint(tmp_path, St.Checkpoint(partition=planned[0], cursor="wd:Q02", status=St.DONE, latest_modified="2099-01-01T00:00:00Z"))
+    St.save_checkpoint(tmp_path, St.Checkpoint(partition=planned[1], cursor="wd:Q11"))
+
+    def fail():
+        raise AssertionError("a resumed crawl must not be planned again")
+
+    resumed = St.start_or_resume(tmp_path, fail)
+    assert [partition.index for partition in resumed] == [1, 2]
+    assert resumed[0].after == "wd:Q11"
+    assert resumed[1].after == "wd:Q20"
+    # a resumed crawl keeps the mark of its start, whatever the persons' modification times
+    assert St.checkpoints_high_water_mark(tmp_path) == high_water_mark
+
+    St.clear_checkpoints(tmp_path)
+    assert St.load_checkpoints(tmp_path) == []
+
+
+def test_resume_partition(tmp_path):
+    from wikigraph.partitioning import Partition
+
+    partition = Partition(index=0, size=3, after="wd:Q0")
+    assert St.resume_partition(tmp_path, partition) == partition
+    St.save_checkpoint(tmp_path, St.Checkpoint(partition=partition, cursor="wd:Q2"))
+    assert St.resume_partition(tmp_path, partition).after == "wd:Q2"
+    St.save_checkpoint(tmp_path, St.Checkpoint(partition=partition, cursor="wd:Q3", status=St.DONE))
+    assert St.resume_partition(tmp_path, partition) == partition
+
+    persons = [M.Person(person=f"wd:Q{i}", personLabel=str(i)) for i in range(4)]
+    assert St.after_cursor(persons, "wd:Q1") == persons[2:]
+    assert St.after_cursor(persons, None) == persons
+    assert St.after_cursor(persons, "wd:Q9") == persons
@@ -1,3 +1,101 @@
 """Main entrypoint for the wikigraph module"""
+import argparse
+from pathlib import Path
 
+from wikigraph import settings
 
+
+def import_dump(args: argparse.Namespace) -> None:
+    from wikigraph.dump import convert_dump
+
+    convert_dump(
+        args.dump,
+        args.output_dir,
+        settings.relationship_types,
+        processes=args.processes,
+        chunk_size=args.chunk_size,
+        neo4j_relationship_types=settings.neo4j_relationship_types,
+    )
+
+
+def migrate_relationships(args: argparse.Namespace) -> None:
+    from wikigraph.neo4j_utils import get_driver, migrate_has_relation_edges
+
+    migrate_has_relation_edges(get_driver(settings), batch_size=args.batch_size)
+
+
+def crawl(args: argparse.Namespace) -> None:
+    from wikigraph.crawler import run_crawl
+
+    run_crawl(
+        settings,
+        fetch_workers=args.fetch_workers,
+        page_size=args.page_size,
+        write_batch_size=args.write_batch_size,
+        queue_size=args.queue_size,
+    )
+
+
+def frontier(args: argparse.Namespace) -> None:
+    from wikigraph.frontier import run_frontier
+
+    run_frontier(
+        settings,
+        max_depth=args.max_depth,
+        max_nodes=args.max_nodes,
+        page_size=args.page_size,
+        write_batch_size=args.write_batch_size,
+    )
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="wikigraph", description=__doc__)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    crawl_parser = subparsers.add_parser(
+        "crawl",
+        help="Crawl the SPARQL endpoint into Neo4j with a local process pool",
+    )
+    crawl_parser.add_argument("--fetch-workers", type=int, default=settings.num_workers, help="Number of fetch/parse processes")
+    crawl_parser.add_argument("--page-size", type=int, default=settings.items_per_worker, help="Persons per persons query")
+    crawl_parser.add_argument("--write-batch-size", type=int, default=settings.neo4j_batch_size, help="Rows per write transaction")
+    crawl_parser.add_argument("--queue-size", type=int, default=8, help="Fetched partitions buffered ahead of the writer")
+    crawl_parser.set_defaults(func=crawl)
+
+    frontier_parser = subparsers.add_parser(
+        "frontier",
+        help="Crawl breadth-first outward from the seed persons into Neo4j",
+    )
+    frontier_parser.add_argument("--max-depth", type=int, default=settings.frontier_max_depth, help="Number of hops to expand")
+    frontier_parser.add_argument("--max-nodes", type=int, default=settings.frontier_max_nodes, help="Maximum number of persons to visit")
+    frontier_parser.add_argument("--page-size", type=int, default=settings.items_per_worker, help="Persons expanded per batch")
+    frontier_parser.add_argument("--write-batch-size", type=int, default=settings.neo4j_batch_size, help="Rows per write transaction")
+    frontier_parser.set_defaults(func=frontier)
+
+    dump_parser = subparsers.add_parser(
+        "import-dump",
+        help="Convert a Wikidata JSON dump into CSV files for neo4j-admin import",
+    )
+    dump_parser.add_argument("dump", type=Path, help="Wikidata JSON dump (.json, .json.gz or .json.bz2)")
+    dump_parser.add_argument("output_dir", type=Path, help="Directory to write the CSV files to")
+    dump_parser.add_argument("--processes", type=int, default=1, help="Number of parsing processes")
+    dump_parser.add_argument("--chunk-size", type=int, default=1000, help="Dump lines per process task")
+    dump_parser.set_defaults(func=import_dump)
+
+    migrate_parser = subparsers.add_parser(
+        "migrate-relationships",
+        help="Rewrite HAS_RELATION edges as edges of their native relationship type",
+    )
+    migrate_parser.add_argument("--batch-size", type=int, default=settings.neo4j_batch_size, help="Edges rewritten per transaction")
+    migrate_parser.set_defaults(func=migrate_relationships)
+
+    return parser
+
+
+def main(argv=None) -> None:
+    args = build_parser().parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+async_sparql.py
+
+Concurrent SPARQL client issuing many queries over a pooled keep-alive
+connection, bounded by a concurrency cap and a token-bucket rate limiter
+"""
+import asyncio
+import time
+import typing as ty
+
+import httpx
+import pydantic
+
+import wikigraph.models as M
+import wikigraph.sparql as S
+from wikigraph.cache import get_query_cache
+from wikigraph.config import get_settings
+from wikigraph.exceptions import DataFetchError
+from wikigraph.logger import get_logger
+from wikigraph.retry import call_with_retry_async
+
+logger = get_logger(__name__)
+
+DEFAULT_CONCURRENCY = 4
+DEFAULT_REQUESTS_PER_SECOND = 5.0
+DEFAULT_TIMEOUT = 60.0
+
+
+class TokenBucket:
+    """
+    Asyncio token bucket allowing `rate` acquisitions per second on average,
+    with bursts of up to `capacity` acquisitions.
+    """
+
+    def __init__(self, rate: float, capacity: ty.Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """Wait until a token is available and consume it"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+async def fetch_queries(
+    queries: ty.Iterable[str],
+    concurrency: int = DEFAULT_CONCURRENCY,
+    requests_per_second: float = DEFAULT_REQUESTS_PER_SECOND,
+    endpoint: ty.Optional[str] = None,
+    timeout: float = DEFAULT_TIMEOUT,
+    use_cache: bool = True,
+    transport: ty.Optional[httpx.AsyncBaseTransport] = None,
+) -> ty.AsyncIterator[tuple[str, list[dict]]]:
+    """
+    Run queries concurrently and yield their bindings in completion order.
+
+    Args:
+        queries (Iterable[str]): The SPARQL queries to run.
+        concurrency (int): The maximum number of requests in flight.
+        requests_per_second (float): The sustained request rate allowed.
+        endpoint (str, optional): The SPARQL endpoint URL, by default the one in the settings.
+        timeout (float): Per-request timeout in seconds.
+        use_cache (bool): Whether to consult and fill the on-disk query cache.
+        transport (AsyncBaseTransport, optional): Transport override, e.g. for tests.
+
+    Yields:
+        tuple[str, list[dict]]: Each query with its result bindings.
+    """
+    endpoint = endpoint or get_settings().sparql_endpoint
+    cache = get_query_cache() if use_cache else None
+    semaphore = asyncio.Semaphore(concurrency)
+    bucket = TokenBucket(requests_per_second)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    headers = {"Accept": "application/sparql-results+json", "User-Agent": S.USER_AGENT}
+
+    async with httpx.AsyncClient(
+        limits=limits, headers=headers, timeout=timeout, transport=transport
+    ) as client:
+
+        async def post(query: str) -> httpx.Response:
+            # each attempt waits for its own token, so retries respect the rate limit
+            await bucket.acquire()
+            response = await client.post(endpoint, data={"query": query})
+            response.raise_for_status()
+            return response
+
+        async def run(query: str) -> tuple[str, list[dict]]:
+            if cache is not None:
+                bindings = cache.get(query)
+                if bindings is not None:
+                    return query, bindings
+            async with semaphore:
+                try:
+                    response = await call_with_retry_async(post, query)
+                except httpx.HTTPError as e:
+                    raise DataFetchError(f"Query to {endpoint} failed: {e!r}") from e
+            bindings = response.json()["results"]["bindings"]
+            if cache is not None:
+                cache.set(query, bindings)
+            return query, bindings
+
+        tasks = [asyncio.ensure_future(run(query)) for query in queries]
+        logger.debug(f"Scheduled {len(tasks)} queries with concurrency {concurrency}")
+        try:
+            for completed in asyncio.as_completed(tasks):
+                yield await completed
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+async def map_and_label(
+    bindings: list[dict],
+    model: pydantic.BaseModel,
+    validate: bool,
+    strategy: S.QueryStrategy
+) -> list:
+    """Map bindings to models and label them as `sparql.resolve_labels` does, off the event loop"""
+    models = M.map_to_models(bindings, model, validate)
+    if strategy.label_source != S.LabelSource.NONE:
+        return models
+    return await asyncio.to_thread(S.resolve_labels, models, strategy)
+
+
+async def fetch_persons(
+    offsets: ty.Iterable[int],
+    limit: int,
+    validate: ty.Optional[bool] = None,
+    strategy: ty.Optional[S.QueryStrategy] = None,
+    **kwargs
+) -> ty.AsyncIterator[list[M.Person]]:
+    """
+    Fetch pages of persons at the given offsets concurrently.
+
+    Args:
+        offsets (Iterable[int]): The offset of each page.
+        limit (int): The number of persons per page.
+        validate (bool, optional): Whether to validate the bindings when building
+            models, by default `strict_validation` from the settings.
+        strategy (QueryStrategy, optional): The query patterns to use, by default
+            those configured in the settings.
+
+    Other keyword arguments are passed through to `fetch_queries`.
+
+    Yields:
+        list[Person]: Each page of persons, in completion order.
+    """
+    validate = get_settings().strict_validation if validate is None else validate
+    strategy = strategy or S.get_query_strategy()
+    queries = [S.create_persons_query(offset, limit, strategy=strategy) for offset in offsets]
+    async for _, bindings in fetch_queries(queries, **kwargs):
+        yield await map_and_label(bindings, M.Person, validate, strategy)
+
+
+async def fetch_relationships(
+    person_batches: ty.Iterable[list[M.Person]],
+    relationship_types: list[str],
+    validate: ty.Optional[bool] = None,
+    strategy: ty.Optional[S.QueryStrategy] = None,
+    **kwargs
+) -> ty.AsyncIterator[list[M.Relationship]]:
+    """
+    Fetch the relationships of several batches of persons concurrently.
+    `validate` and `strategy` are as for `fetch_persons`, other keyword arguments
+    are passed through to `fetch_queries`.
+
+    Yields:
+        list[Relationship]: The relationships of each batch, in completion order.
+    """
+    validate = get_settings().strict_validation if validate is None else validate
+    relationships_clause = S.relationships_clause(relationship_types)
+    strategy = strategy or S.get_query_strategy()
+    queries = [
+        S.build_relationships_query(
+            0, None, S.persons_clause(persons), relationships_clause, strategy=strategy
+        )
+        for persons in person_batches
+    ]
+    async for _, bindings in fetch_queries(queries, **kwargs):
+        yield await map_and_label(bindings, M.Relationship, validate, strategy)
@@ -0,0 +1,171 @@
+"""
+cache.py
+
+Persistent on-disk cache of SPARQL responses, keyed by a hash of the
+normalized query text so reruns and retries avoid redundant network trips
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import typing as ty
+import zlib
+from functools import lru_cache
+from pathlib import Path
+
+from wikigraph.config import get_settings
+from wikigraph.logger import get_logger
+
+logger = get_logger(__name__)
+
+# a full cache is evicted down to this fraction of its capacity
+LOW_WATER_MARK = 0.9
+# cache hits whose access times are buffered before they are written
+ACCESS_FLUSH_SIZE = 1_000
+
+
+def normalize_query(query: str) -> str:
+    """Collapse whitespace so formatting differences map to the same cache entry"""
+    return " ".join(query.split())
+
+
+def query_key(query: str) -> str:
+    """Content address of a query: the SHA-256 of its normalized text"""
+    return hashlib.sha256(normalize_query(query).encode("utf-8")).hexdigest()
+
+
+class QueryCache:
+    """
+    SQLite-backed store of zlib-compressed JSON query results.
+
+    Entries older than `ttl` seconds are treated as misses. When a write takes the
+    total size of stored payloads over `max_bytes`, the least recently used entries
+    are evicted down to `LOW_WATER_MARK` of it.
+
+    The access times of hits are buffered and written with the next `set`, or once
+    `ACCESS_FLUSH_SIZE` are pending, so reads do not take the database's write lock.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        ttl: ty.Optional[float] = None,
+        max_bytes: ty.Optional[int] = None
+    ):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                payload BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS responses_created_at ON responses (created_at)")
+        self._connection.commit()
+        # an upper bound on the stored bytes, recounted before evicting
+        self._bytes = self._total_bytes()
+        self._accessed: dict[str, float] = {}
+
+    def get(self, query: str) -> ty.Optional[list[dict]]:
+        """Return the cached bindings for a query, or None on a miss"""
+        key = query_key(query)
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT payload, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or (self.ttl is not None and now - row[1] > self.ttl):
+                self.misses += 1
+                return None
+            self._accessed[key] = now
+            if len(self._accessed) >= ACCESS_FLUSH_SIZE:
+                self._write_accessed()
+                self._connection.commit()
+            self.hits += 1
+        return json.loads(zlib.decompress(row[0]))
+
+    def set(self, query: str, bindings: list[dict]) -> None:
+        """Store the bindings for a query, evicting old entries if over size"""
+        payload = zlib.compress(json.dumps(bindings).encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                (query_key(query), payload, len(payload), now, now),
+            )
+            self._bytes += len(payload)
+            self._write_accessed()
+            if self.ttl is not None:
+                self._connection.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl,))
+            if self.max_bytes is not None and self._bytes > self.max_bytes:
+                self._evict()
+            self._connection.commit()
+
+    def _total_bytes(self) -> int:
+        return self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def _write_accessed(self) -> None:
+        if self._accessed:
+            self._connection.executemany(
+                "UPDATE responses SET accessed_at = ? WHERE key = ?",
+                [(accessed_at, key) for key, accessed_at in self._accessed.items()],
+            )
+            self._accessed = {}
+
+    def _evict(self) -> None:
+        """Drop the least recently used entries until under the low-water mark of `max_bytes`"""
+        self._bytes = self._total_bytes()
+        if self._bytes <= self.max_bytes:
+            return
+        target = int(self.max_bytes * LOW_WATER_MARK)
+        rows = self._connection.execute("SELECT key, size FROM responses ORDER BY accessed_at")
+        evicted = []
+        for key, size in rows:
+            if self._bytes <= target:
+                break
+            evicted.append((key,))
+            self._bytes -= size
+        self._connection.executemany("DELETE FROM responses WHERE key = ?", evicted)
+        logger.debug(f"Evicted {len(evicted)} entries from query cache {self.path}")
+
+    def clear(self) -> None:
+        """Remove every entry from the cache"""
+        with self._lock:
+            self._connection.execute("DELETE FROM responses")
+            self._connection.commit()
+            self._bytes = 0
+            self._accessed = {}
+
+    def stats(self) -> dict:
+        """Hit/miss counters and current size of the cache"""
+        with self._lock:
+            entries, size = self._connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": entries, "bytes": size}
+
+
+@lru_cache()
+def get_query_cache() -> ty.Optional[QueryCache]:
+    """The process-wide query cache, or None if caching is disabled in the settings"""
+    settings = get_settings()
+    if not settings.sparql_cache_enabled:
+        return None
+    return QueryCache(
+        settings.sparql_cache_path,
+        ttl=settings.sparql_cache_ttl,
+        max_bytes=settings.sparql_cache_max_bytes,
+    )
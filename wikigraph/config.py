@@ -37,10 +37,49 @@ RELATIONSHIP_TYPES = [
     "P451"  # Romantic partner
 ]
 
+# Neo4j relationship type of the edges stored for each Wikidata property
+# (types are interpolated into Cypher, so must be upper-case identifiers).
+# P22 father and P25 mother are stored as P40 CHILD edges from the parent, see
+# `dedup.canonical_edge`
+NEO4J_RELATIONSHIP_TYPES = {
+    "P40": "CHILD",
+    "P26": "SPOUSE",
+    "P3373": "SIBLING",
+    "P1038": "RELATIVE",
+    "P1037": "DIRECTOR_MANAGER",
+    "P106": "OCCUPATION",
+    "P108": "EMPLOYER",
+    "P1347": "PARTICIPANT_OF",
+    "P551": "RESIDENCE",
+    "P1313": "POSITION_HELD",
+    "P1026": "DIPLOMATIC_RELATION",
+    "P1441": "PRESENT_IN_WORK",
+    "P1269": "FACET_OF",
+    "P451": "PARTNER",
+}
+
+# Node label of the targets of properties linking persons to non-persons; edges of
+# the remaining relationship types link persons to persons
+ATTRIBUTE_LABELS = {
+    "P106": "Occupation",
+    "P108": "Organization",
+    "P1037": "Organization",
+    "P551": "Place",
+    "P1313": "Position",
+    "P1347": "Event",
+    "P1441": "Work",
+    "P1269": "Concept",
+    "P1026": "Concept",
+}
+
 
 class Settings(BaseSettings):
     # Configure allowed relationship types for graph construction (Wikidata relations of format "P:XXX")
     relationship_types: list = pydantic.Field(default=RELATIONSHIP_TYPES)
+    # Neo4j relationship type for each Wikidata property, properties without one are stored under their ID
+    neo4j_relationship_types: dict = pydantic.Field(default=NEO4J_RELATIONSHIP_TYPES)
+    # Node label of the targets of each attribute (person to non-person) property
+    attribute_labels: dict = pydantic.Field(default=ATTRIBUTE_LABELS)
     # configure parameters stable over application lifetime and associated with jobs/runs
     job_id: str = pydantic.Field(default="local_job")
     correlation_id: str = pydantic.Field(default="local_corr")
@@ -51,11 +90,67 @@ class Settings(BaseSettings):
     neo4j_uri: pydantic.AnyUrl
     neo4j_user: str
     neo4j_password: str
+    # Database write tuning
+    neo4j_batch_size: int = pydantic.Field(default=1000)
+    neo4j_max_transaction_retry_time: float = pydantic.Field(default=30.0)
+    # Database connection pool (lifetime and acquisition timeout in seconds)
+    neo4j_max_connection_pool_size: int = pydantic.Field(default=100)
+    neo4j_max_connection_lifetime: float = pydantic.Field(default=3600.0)
+    neo4j_connection_acquisition_timeout: float = pydantic.Field(default=60.0)
+    # Validate query results when mapping them to models (disable to trust the endpoint)
+    strict_validation: bool = pydantic.Field(default=True)
+    # Incremental crawling only fetches persons modified since the last completed run
+    incremental: bool = pydantic.Field(default=False)
+    state_path: Path = pydantic.Field(default=repo_dir / ".state" / "wikigraph.json")
+    # Edits reach the query service after a lag, so the next incremental run starts this long before a crawl did
+    query_service_lag_seconds: float = pydantic.Field(default=6 * 60 * 60)
+    # Per-partition progress of unfinished crawls, used to resume after a failure
+    checkpoint_dir: Path = pydantic.Field(default=repo_dir / ".state" / "checkpoints")
+    # Directory shared by all workers for handing batches between tasks
+    staging_dir: Path = pydantic.Field(default=repo_dir / ".staging")
+    # SPARQL endpoint queried for persons and relationships
+    sparql_endpoint: str = pydantic.Field(default="https://query.wikidata.org/sparql")
+    # SPARQL request concurrency and rate limit
+    sparql_concurrency: int = pydantic.Field(default=4)
+    sparql_requests_per_second: float = pydantic.Field(default=5.0)
+    # Fetch persons and their relationships in a single query per page
+    combined_queries: bool = pydantic.Field(default=False)
+    # Initial number of persons per relationships query and parallel queries per batch
+    relationship_batch_size: int = pydantic.Field(default=50)
+    relationship_max_workers: int = pydantic.Field(default=4)
+    # SPARQL query strategy: class filter (subclass_path, direct or allowed_classes),
+    # label source (rdfs_label, label_service or none to resolve labels separately)
+    # and classes allowed as human
+    query_class_filter: str = pydantic.Field(default="subclass_path")
+    query_label_source: str = pydantic.Field(default="rdfs_label")
+    query_allowed_classes: list = pydantic.Field(default=["Q5"])
+    # Hops and maximum number of persons of a frontier crawl outward from the seed persons
+    frontier_max_depth: int = pydantic.Field(default=2)
+    frontier_max_nodes: Optional[int] = pydantic.Field(default=None)
+    # Deduplicate writes with Bloom filters sized for this many keys instead of exact sets
+    dedup_bloom_capacity: Optional[int] = pydantic.Field(default=None)
+    # Retries of transient endpoint and database failures (delays in seconds)
+    retry_max_attempts: int = pydantic.Field(default=5)
+    retry_base_delay: float = pydantic.Field(default=1.0)
+    retry_max_delay: float = pydantic.Field(default=60.0)
+    # SPARQL response cache (ttl in seconds)
+    sparql_cache_enabled: bool = pydantic.Field(default=True)
+    sparql_cache_path: Path = pydantic.Field(default=repo_dir / ".cache" / "sparql.sqlite")
+    sparql_cache_ttl: Optional[float] = pydantic.Field(default=12 * 60 * 60)
+    sparql_cache_max_bytes: Optional[int] = pydantic.Field(default=512 * 1024 ** 2)
+    # Label resolution when queries return bare URIs: API endpoint, on-disk cache
+    # size and in-memory LRU size (in labels)
+    label_endpoint: str = pydantic.Field(default="https://www.wikidata.org/w/api.php")
+    label_cache_path: Path = pydantic.Field(default=repo_dir / ".cache" / "labels.sqlite")
+    label_cache_max_entries: Optional[int] = pydantic.Field(default=10_000_000)
+    label_memory_size: int = pydantic.Field(default=100_000)
     # GCP details
     gcp_access_key_id: str = pydantic.Field(default="")
     gcp_secret_access_key: str = pydantic.Field(default="")
     # debug/testing
     log_level: Optional[str] = pydantic.Field(default="INFO")
+    # Fraction of per-row debug records emitted at DEBUG level (0 for none, 1 for all)
+    log_row_sample_rate: float = pydantic.Field(default=0.0)
     testing: Optional[bool] = pydantic.Field(default=False)
 
     # TODO: More config validation in the pydantic base classes
@@ -78,10 +173,8 @@ class Settings(BaseSettings):
 def get_settings() -> Settings:
     try:
         settings = Settings()
-        logger = get_logger(__name__, settings=settings)
         logger.info("Settings loaded successfully.")
     except Exception as e:
-        logger = get_logger(__name__)
         logger.error("Error loading settings: %s", e)
         raise
 
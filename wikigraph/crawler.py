@@ -0,0 +1,385 @@
+"""
+crawler.py
+
+Standalone crawler running the fetch -> map -> insert pipeline on one machine:
+a process pool fetches and parses partitions of the person set, and a single
+writer thread drains a bounded queue of results into Neo4j in large batches
+"""
+import queue
+import threading
+import time
+import typing as ty
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+
+import pydantic
+from neo4j import Driver
+
+import wikigraph.config as C
+import wikigraph.models as M
+import wikigraph.sparql as S
+from wikigraph.cache import get_query_cache
+from wikigraph.dedup import Deduplicator
+from wikigraph.labels import get_label_resolver
+from wikigraph.logger import get_logger
+from wikigraph.neo4j_utils import ensure_schema, get_driver, insert_attributes, insert_persons, insert_relationships
+from wikigraph.partitioning import Partition, enumerate_partitions
+from wikigraph.utils import chunked
+from wikigraph.state import (
+    DONE,
+    PENDING,
+    Checkpoint,
+    checkpoints_high_water_mark,
+    clear_checkpoints,
+    get_high_water_mark,
+    latest_modified,
+    save_checkpoint,
+    set_high_water_mark,
+    start_or_resume,
+)
+
+logger = get_logger(__name__)
+
+DEFAULT_QUEUE_SIZE = 8
+# tells the writer thread that no more results will arrive
+_DONE = object()
+
+
+class CrawlStats(pydantic.BaseModel):
+    """Totals of a crawl run"""
+    partitions: int = 0
+    persons: int = 0
+    relationships: int = 0
+    attributes: int = 0
+    seconds: float = 0.0
+    latest_modified: ty.Optional[str] = None
+
+
+class PartitionResult(pydantic.BaseModel):
+    """Persons and relationships fetched for one partition"""
+    partition: Partition
+    persons: list[M.Person]
+    relationships: list[M.Relationship]
+    attributes: list[M.Attribute] = []
+
+
+def _init_worker() -> None:
+    """
+    Fetch process initializer: drop the process-wide caches inherited from the
+    parent, whose SQLite connections must not be used across `fork`
+    """
+    get_query_cache.cache_clear()
+    get_label_resolver.cache_clear()
+
+
+def fetch_partition(
+    partition: Partition,
+    page_size: int,
+    relationship_types: list[str],
+    validate: bool = True,
+    relationship_batch_size: int = S.DEFAULT_RELATIONSHIP_BATCH_SIZE,
+    relationship_workers: int = S.DEFAULT_RELATIONSHIP_WORKERS,
+    combined: bool = False
+) -> PartitionResult:
+    """
+    Fetch and map the persons of a partition and their relationships, either
+    with separate persons and relationships queries or, if `combined`, with a
+    single query per page. Attributes are always fetched with their own query.
+    """
+    relationship_types, attribute_types = S.split_relationship_types(relationship_types)
+    if combined:
+        persons, relationships = [], []
+        for page_persons, page_relationships in S.iter_persons_with_relationships(
+            page_size,
+            relationship_types,
+            after=partition.after,
+            validate=validate,
+            since=partition.since,
+            until=partition.until,
+        ):
+            persons.extend(page_persons)
+            relationships.extend(page_relationships)
+    else:
+        persons = [
+            person
+            for page in S.iter_person_pages(
+                page_size,
+                after=partition.after,
+                validate=validate,
+                since=partition.since,
+                until=partition.until,
+            )
+            for person in page
+        ]
+        relationships = []
+        if persons and relationship_types:
+            relationships = S.get_relationships(
+                0,
+                None,
+                persons,
+                relationship_types,
+                validate,
+                batch_size=S.AdaptiveBatchSize(relationship_batch_size),
+                max_workers=relationship_workers,
+            )
+    attributes = []
+    if persons:
+        attributes = S.get_attributes(
+            persons,
+            attribute_types,
+            validate,
+            batch_size=S.AdaptiveBatchSize(relationship_batch_size),
+            max_workers=relationship_workers,
+        )
+    return PartitionResult(
+        partition=partition, persons=persons, relationships=relationships, attributes=attributes
+    )
+
+
+class BatchWriter:
+    """
+    Accumulates partition results and writes them to Neo4j once at least
+    `batch_size` persons or relationships are buffered.
+    Persons are always written before the relationships that reference them.
+    Relationships and attributes are then committed for `batch_size` persons
+    at a time, after which each partition in that step is checkpointed with its
+    last committed person as cursor, as done once its last person is committed.
+    Persons and edges already written by this writer are dropped by `dedup`.
+    """
+
+    def __init__(
+        self,
+        driver: Driver,
+        batch_size: int,
+        checkpoint_dir: ty.Optional[Path] = None,
+        dedup: ty.Optional[Deduplicator] = None
+    ):
+        self.driver = driver
+        self.batch_size = batch_size
+        self.checkpoint_dir = checkpoint_dir
+        self.dedup = dedup if dedup is not None else Deduplicator()
+        self.stats = CrawlStats()
+        self._results: list[PartitionResult] = []
+        self._persons: list[M.Person] = []
+        self._relationships: list[M.Relationship] = []
+        self._attributes: list[M.Attribute] = []
+
+    def add(self, result: PartitionResult) -> None:
+        self._results.append(result)
+        self._persons.extend(self.dedup.persons(result.persons))
+        self._relationships.extend(self.dedup.relationships(result.relationships))
+        self._attributes.extend(self.dedup.attributes(result.attributes))
+        self.stats.partitions += 1
+        self.stats.latest_modified = max(
+            filter(None, [self.stats.latest_modified, latest_modified(result.persons)]), default=None
+        )
+        if max(len(self._persons), len(self._relationships), len(self._attributes)) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._persons:
+            insert_persons(self.driver, self._persons, self.batch_size)
+        self.stats.persons += len(self._persons)
+
+        relationships, attributes = defaultdict(list), defaultdict(list)
+        for relationship in self._relationships:
+            relationships[relationship.person_uri].append(relationship)
+        for attribute in self._attributes:
+            attributes[attribute.person_uri].append(attribute)
+        positions = [(result, position) for result in self._results for position in range(len(result.persons))]
+        steps = list(chunked(positions, self.batch_size)) or [[]]
+        for number, step in enumerate(steps, 1):
+            final = number == len(steps)
+            uris = [result.persons[position].uri for result, position in step]
+            step_relationships = [row for uri in uris for row in relationships.pop(uri, [])]
+            step_attributes = [row for uri in uris for row in attributes.pop(uri, [])]
+            if final:
+                # rows whose person is not among the fetched ones, if any
+                step_relationships += [row for rows in relationships.values() for row in rows]
+                step_attributes += [row for rows in attributes.values() for row in rows]
+            if step_relationships:
+                insert_relationships(self.driver, step_relationships, self.batch_size)
+            if step_attributes:
+                insert_attributes(self.driver, step_attributes, self.batch_size)
+            self.stats.relationships += len(step_relationships)
+            self.stats.attributes += len(step_attributes)
+            self._checkpoint(step, final)
+        logger.info(
+            f"Wrote {len(self._persons)} persons, {len(self._relationships)} relationships "
+            f"and {len(self._attributes)} attributes ({self.stats.partitions} partitions done)"
+        )
+        self._results, self._persons, self._relationships, self._attributes = [], [], [], []
+
+    def _checkpoint(self, step: list[tuple[PartitionResult, int]], final: bool) -> None:
+        """Record how far each partition of a committed step got, and partitions without persons once all is"""
+        if self.checkpoint_dir is None:
+            return
+        reached = {}
+        for result, position in step:
+            reached[result.partition.index] = (result, position)
+        if final:
+            for result in self._results:
+                if not result.persons:
+                    reached[result.partition.index] = (result, -1)
+        for result, position in reached.values():
+            committed = result.persons[:position + 1]
+            committed_uris = {person.uri for person in committed}
+            save_checkpoint(
+                self.checkpoint_dir,
+                Checkpoint(
+                    partition=result.partition,
+                    cursor=committed[-1].uri if committed else result.partition.after,
+                    persons=len(committed),
+                    relationships=sum(
+                        1 for relationship in result.relationships if relationship.person_uri in committed_uris
+                    ),
+                    latest_modified=latest_modified(committed),
+                    status=DONE if position == len(result.persons) - 1 else PENDING,
+                ),
+            )
+
+
+def _write_results(results: queue.Queue, writer: BatchWriter, errors: list) -> None:
+    """Writer thread body: drain the queue until the sentinel, then flush"""
+    try:
+        while True:
+            result = results.get()
+            if result is _DONE:
+                break
+            writer.add(result)
+        writer.flush()
+    except Exception as e:
+        errors.append(e)
+        # keep draining so the producer never blocks on a full queue
+        while results.get() is not _DONE:
+            pass
+
+
+def crawl(
+    partitions: list[Partition],
+    driver: Driver,
+    relationship_types: list[str],
+    fetch_workers: int = 4,
+    page_size: int = 500,
+    write_batch_size: int = 1000,
+    queue_size: int = DEFAULT_QUEUE_SIZE,
+    validate: bool = True,
+    relationship_batch_size: int = S.DEFAULT_RELATIONSHIP_BATCH_SIZE,
+    relationship_workers: int = S.DEFAULT_RELATIONSHIP_WORKERS,
+    checkpoint_dir: ty.Optional[Path] = None,
+    combined: bool = False,
+    dedup_bloom_capacity: ty.Optional[int] = None,
+    mp_context=None
+) -> CrawlStats:
+    """
+    Crawl partitions with a pool of fetch processes feeding a batched writer.
+
+    Args:
+        partitions (list[Partition]): The URI ranges to crawl.
+        driver (Driver): A Neo4j database driver object.
+        relationship_types (list[str]): Wikidata property IDs of the edges to fetch.
+        fetch_workers (int): The number of fetch/parse processes.
+        page_size (int): The number of persons per persons query.
+        write_batch_size (int): The number of rows per write transaction.
+        queue_size (int): The maximum number of fetched partitions waiting to be
+            written; fetching pauses while the queue is full.
+        validate (bool): Whether to validate query results when building models.
+        relationship_batch_size (int): Initial persons per relationships query.
+        relationship_workers (int): Parallel relationships queries per partition.
+        checkpoint_dir (Path, optional): Where to checkpoint each partition once
+            its data is committed.
+        combined (bool): Whether to fetch persons and relationships in one query per page.
+        dedup_bloom_capacity (int, optional): Deduplicate with Bloom filters sized for
+            this many keys rather than exact sets (see `dedup.SeenSet`).
+        mp_context: Optional multiprocessing context for the process pool.
+
+    Returns:
+        CrawlStats: Totals of the run.
+    """
+    start = time.perf_counter()
+    results = queue.Queue(maxsize=queue_size)
+    writer = BatchWriter(driver, write_batch_size, checkpoint_dir, Deduplicator(dedup_bloom_capacity))
+    errors = []
+    writer_thread = threading.Thread(
+        target=_write_results, args=(results, writer, errors), name="wikigraph-writer", daemon=True
+    )
+    writer_thread.start()
+
+    pending = list(reversed(partitions))
+    in_flight = set()
+    try:
+        with ProcessPoolExecutor(
+            max_workers=fetch_workers, mp_context=mp_context, initializer=_init_worker
+        ) as pool:
+            while (pending or in_flight) and not errors:
+                while pending and len(in_flight) < fetch_workers:
+                    in_flight.add(
+                        pool.submit(
+                            fetch_partition,
+                            pending.pop(),
+                            page_size,
+                            relationship_types,
+                            validate,
+                            relationship_batch_size,
+                            relationship_workers,
+                            combined,
+                        )
+                    )
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results.put(future.result())
+    finally:
+        for future in in_flight:
+            future.cancel()
+        results.put(_DONE)
+        writer_thread.join()
+    if errors:
+        raise errors[0]
+
+    writer.stats.seconds = time.perf_counter() - start
+    logger.info(f"Crawl finished: {writer.stats.dict()}")
+    logger.info(f"Deduplication: {writer.dedup.stats.dict()}")
+    return writer.stats
+
+
+def run_crawl(
+    settings: C.Settings,
+    fetch_workers: int,
+    page_size: int,
+    write_batch_size: int,
+    queue_size: int = DEFAULT_QUEUE_SIZE
+) -> CrawlStats:
+    """
+    Plan partitions from the endpoint, or resume an interrupted crawl from its
+    checkpoints, and crawl them into the configured database
+    """
+    since = get_high_water_mark(settings.state_path) if settings.incremental else None
+    checkpoint_dir = settings.checkpoint_dir / "crawl"
+    partitions = start_or_resume(
+        checkpoint_dir,
+        lambda: enumerate_partitions(settings.items_per_worker, since=since),
+        settings.query_service_lag_seconds,
+    )
+    driver = get_driver(settings)
+    ensure_schema(driver)
+    stats = crawl(
+        partitions,
+        driver,
+        settings.relationship_types,
+        fetch_workers=fetch_workers,
+        page_size=page_size,
+        write_batch_size=write_batch_size,
+        queue_size=queue_size,
+        validate=settings.strict_validation,
+        relationship_batch_size=settings.relationship_batch_size,
+        relationship_workers=settings.relationship_max_workers,
+        checkpoint_dir=checkpoint_dir,
+        combined=settings.combined_queries,
+        dedup_bloom_capacity=settings.dedup_bloom_capacity,
+    )
+    high_water_mark = checkpoints_high_water_mark(checkpoint_dir)
+    if settings.incremental and high_water_mark is not None:
+        set_high_water_mark(settings.state_path, high_water_mark)
+    clear_checkpoints(checkpoint_dir)
+    return stats
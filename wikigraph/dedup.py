@@ -0,0 +1,177 @@
+"""
+dedup.py
+
+Drops persons and relationships already sent to the database before they are
+written: persons recur across pages and partitions, and the same family edge
+is often returned from both of its ends (e.g. P40 child from the parent and
+P22 father from the child). Edges are stored in the canonical form given by
+`canonical_edge`, so both statements of an edge write the same edge.
+"""
+import hashlib
+import math
+import re
+import typing as ty
+
+import pydantic
+
+import wikigraph.models as M
+from wikigraph.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Properties stating the same edge from the other end: P22 father and P25 mother
+# of B being A is the same parent-child edge as P40 child of A being B. They are
+# stored as that edge, with the parent's role as its `parent` property
+PARENT = "P40"
+INVERSE_OF_PARENT = {"P22": "FATHER", "P25": "MOTHER"}
+# Properties holding in both directions: spouse, sibling, relative and unmarried partner
+SYMMETRIC = {"P26", "P3373", "P1038", "P451"}
+
+
+def property_id(uri: str) -> str:
+    """`P40` for `http://www.wikidata.org/prop/direct/P40` or `wdt:P40`, or the input if it is already an ID"""
+    return re.split(r"[/:]", uri)[-1]
+
+
+# How the endpoints of a statement are ordered in the stored edge
+FORWARD = "forward"
+REVERSE = "reverse"
+SORTED = "sorted"
+
+
+def canonical_property(property_uri: str) -> tuple[str, str, dict]:
+    """
+    The property edges of `property_uri` are stored as, the order of their
+    endpoints (`FORWARD`, `REVERSE` or `SORTED`) and their edge properties.
+
+    P22 father and P25 mother statements become the P40 child edge from the
+    parent, with the parent's role (`FATHER` or `MOTHER`) as `parent` property;
+    symmetric properties run between their endpoints in sorted order, and any
+    other property keeps its direction as stated.
+    """
+    prop = property_id(property_uri)
+    if prop in INVERSE_OF_PARENT:
+        return PARENT, REVERSE, {"parent": INVERSE_OF_PARENT[prop]}
+    if prop in SYMMETRIC:
+        return prop, SORTED, {}
+    return prop, FORWARD, {}
+
+
+def canonical_edge(property_uri: str, person: str, related: str) -> tuple[str, str, str, dict]:
+    """The property, start, end and properties of an edge as it is stored, whichever end it was read from"""
+    prop, order, properties = canonical_property(property_uri)
+    if order == REVERSE:
+        return prop, related, person, properties
+    if order == SORTED:
+        return (prop, *sorted((person, related)), properties)
+    return prop, person, related, properties
+
+
+def edge_key(relationship: M.Relationship) -> tuple[str, str, str]:
+    """Key shared by all statements of the same edge, whichever end they were read from"""
+    return canonical_edge(relationship.relationship, relationship.person_uri, relationship.related_person_uri)[:3]
+
+
+class BloomFilter:
+    """
+    Fixed-size probabilistic set: membership tests may return false positives at
+    about `error_rate` once `capacity` keys are added, but never false negatives.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self._bits = bytearray((self.num_bits + 7) // 8)
+
+    def _positions(self, key: str) -> ty.Iterator[int]:
+        # double hashing: the i-th position is h1 + i * h2
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, key: str) -> None:
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class SeenSet:
+    """
+    Set of the keys seen so far. Exact by default; with a `bloom_capacity`,
+    memory stays bounded at the cost of dropping about `error_rate` of the new
+    keys as false duplicates once that many keys have been seen.
+    """
+
+    def __init__(self, bloom_capacity: ty.Optional[int] = None, error_rate: float = 0.001):
+        self._keys: ty.Union[set, BloomFilter] = (
+            BloomFilter(bloom_capacity, error_rate) if bloom_capacity else set()
+        )
+
+    def add(self, key: ty.Hashable) -> bool:
+        """Record `key`, returning whether it was new"""
+        if isinstance(self._keys, BloomFilter):
+            key = "\x1f".join(key) if isinstance(key, tuple) else key
+        if key in self._keys:
+            return False
+        self._keys.add(key)
+        return True
+
+
+class DedupStats(pydantic.BaseModel):
+    """Counts of the rows a `Deduplicator` let through and dropped"""
+    persons: int = 0
+    duplicate_persons: int = 0
+    relationships: int = 0
+    duplicate_relationships: int = 0
+    attributes: int = 0
+    duplicate_attributes: int = 0
+
+
+class Deduplicator:
+    """
+    Filters streams of persons and relationships down to those not seen before
+    by this instance. A P22 father or P25 mother statement is kept even if its
+    edge was seen as a P40 child statement, since it adds the parent's role.
+
+    Args:
+        bloom_capacity (int, optional): Use Bloom filters sized for this many
+            keys instead of exact sets, for crawls too large to keep every key.
+        error_rate (float): The Bloom filters' false positive rate at capacity.
+    """
+
+    def __init__(self, bloom_capacity: ty.Optional[int] = None, error_rate: float = 0.001):
+        self._persons = SeenSet(bloom_capacity, error_rate)
+        self._edges = SeenSet(bloom_capacity, error_rate)
+        self.stats = DedupStats()
+
+    def persons(self, persons: ty.Iterable[M.Person]) -> ty.Iterator[M.Person]:
+        for person in persons:
+            if self._persons.add(person.uri):
+                self.stats.persons += 1
+                yield person
+            else:
+                self.stats.duplicate_persons += 1
+
+    def attributes(self, attributes: ty.Iterable[M.Attribute]) -> ty.Iterator[M.Attribute]:
+        for attribute in attributes:
+            if self._edges.add((property_id(attribute.relationship), attribute.person_uri, attribute.target_uri)):
+                self.stats.attributes += 1
+                yield attribute
+            else:
+                self.stats.duplicate_attributes += 1
+
+    def relationships(self, relationships: ty.Iterable[M.Relationship]) -> ty.Iterator[M.Relationship]:
+        for relationship in relationships:
+            key = edge_key(relationship)
+            new_edge = self._edges.add(key)
+            new_role = property_id(relationship.relationship) in INVERSE_OF_PARENT and self._edges.add((*key, "role"))
+            if new_edge or new_role:
+                self.stats.relationships += 1
+                yield relationship
+            else:
+                self.stats.duplicate_relationships += 1
@@ -0,0 +1,227 @@
+"""
+dump.py
+
+Offline bulk loader converting a Wikidata JSON dump into node and
+relationship CSV files for `neo4j-admin database import`.
+
+The dump is a JSON array with one entity per line. It is streamed twice:
+the first pass selects the persons matched by `sparql.create_persons_query`
+and collects their outgoing edges, the second resolves which edge targets
+are humans with an English label, mirroring `build_relationships_query`.
+"""
+import bz2
+import csv
+import gzip
+import json
+import typing as ty
+from multiprocessing import Pool
+from pathlib import Path
+
+from wikigraph.config import NEO4J_RELATIONSHIP_TYPES
+from wikigraph.dedup import canonical_edge
+from wikigraph.logger import get_logger
+from wikigraph.utils import chunked
+
+logger = get_logger(__name__)
+
+ENTITY_PREFIX = "http://www.wikidata.org/entity/"
+INSTANCE_OF = "P31"
+HUMAN = "Q5"
+MEMBER_OF_PARTY = "P102"
+NAZI_PARTY = "Q7320"
+LANGUAGE = "en"
+
+PERSONS_HEADER = ["uri:ID(Person)", "name", "modified", ":LABEL"]
+RELATIONSHIPS_HEADER = [":START_ID(Person)", ":END_ID(Person)", ":TYPE", "parent"]
+DEFAULT_CHUNK_SIZE = 1000
+
+# per-process configuration, set by `_init_worker`
+_relationship_types: list[str] = []
+_targets: set[str] = set()
+
+
+def open_dump(path: Path) -> ty.TextIO:
+    """Open a plain, gzip or bz2 compressed dump for reading as text"""
+    path = Path(path)
+    if path.suffix == ".bz2":
+        return bz2.open(path, "rt", encoding="utf-8")
+    if path.suffix == ".gz":
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+
+def parse_entity(line: str) -> ty.Optional[dict]:
+    """Parse one line of the dump, skipping the enclosing array brackets"""
+    line = line.strip().rstrip(",")
+    if not line or line in ("[", "]"):
+        return None
+    return json.loads(line)
+
+
+def claim_targets(entity: dict, property_id: str) -> list[str]:
+    """
+    The entity IDs that are values of a property's truthy claims, as matched by
+    `wdt:` in the SPARQL queries: its preferred claims if it has any, otherwise
+    its normal ones. Deprecated claims are never included.
+    """
+    claims = [
+        claim for claim in entity.get("claims", {}).get(property_id, [])
+        if claim.get("rank") != "deprecated"
+    ]
+    preferred = [claim for claim in claims if claim.get("rank") == "preferred"]
+    targets = []
+    for claim in preferred or claims:
+        datavalue = claim.get("mainsnak", {}).get("datavalue", {})
+        if datavalue.get("type") == "wikibase-entityid":
+            targets.append(datavalue["value"]["id"])
+    return targets
+
+
+def english_label(entity: dict) -> ty.Optional[str]:
+    label = entity.get("labels", {}).get(LANGUAGE)
+    return label["value"] if label else None
+
+
+def is_human(entity: dict) -> bool:
+    # a dump has no class hierarchy to evaluate `wdt:P31/wdt:P279*`, so only
+    # direct instances of human are matched
+    return HUMAN in claim_targets(entity, INSTANCE_OF)
+
+
+def person_row(entity: dict, label: str) -> list[str]:
+    return [ENTITY_PREFIX + entity["id"], label, entity.get("modified", ""), "Person"]
+
+
+def _init_worker(relationship_types: list[str], targets: set[str]) -> None:
+    global _relationship_types, _targets
+    _relationship_types = relationship_types
+    _targets = targets
+
+
+def _scan_members(lines: list[str]) -> tuple[list[list[str]], list[tuple[str, str, str]]]:
+    """Select party members, returning their node rows and outgoing edges"""
+    members, edges = [], []
+    for line in lines:
+        entity = parse_entity(line)
+        if entity is None or NAZI_PARTY not in claim_targets(entity, MEMBER_OF_PARTY):
+            continue
+        label = english_label(entity)
+        if label is None or not is_human(entity):
+            continue
+        members.append(person_row(entity, label))
+        for property_id in _relationship_types:
+            for target in claim_targets(entity, property_id):
+                edges.append((entity["id"], property_id, target))
+    return members, edges
+
+
+def _scan_targets(lines: list[str]) -> list[list[str]]:
+    """Select edge targets that are humans with a label, returning their node rows"""
+    rows = []
+    for line in lines:
+        entity = parse_entity(line)
+        if entity is None or entity["id"] not in _targets:
+            continue
+        label = english_label(entity)
+        if label is not None and is_human(entity):
+            rows.append(person_row(entity, label))
+    return rows
+
+
+def _map_chunks(
+    func: ty.Callable,
+    dump_path: Path,
+    processes: int,
+    chunk_size: int,
+    initargs: tuple
+) -> ty.Iterator:
+    """Apply a scan function to chunks of dump lines, in a process pool if `processes` > 1"""
+    with open_dump(dump_path) as dump:
+        chunks = chunked(dump, chunk_size)
+        if processes <= 1:
+            _init_worker(*initargs)
+            yield from map(func, chunks)
+            return
+        with Pool(processes, initializer=_init_worker, initargs=initargs) as pool:
+            yield from pool.imap(func, chunks)
+
+
+def convert_dump(
+    dump_path: Path,
+    output_dir: Path,
+    relationship_types: list[str],
+    processes: int = 1,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    neo4j_relationship_types: ty.Optional[dict[str, str]] = None
+) -> tuple[Path, Path]:
+    """
+    Convert a Wikidata JSON dump into `persons.csv` and `relationships.csv`.
+
+    Args:
+        dump_path (Path): The dump file, optionally `.gz` or `.bz2` compressed.
+        output_dir (Path): The directory to write the CSV files to.
+        relationship_types (list[str]): Wikidata property IDs of the edges to keep.
+        processes (int): The number of processes parsing the dump.
+        chunk_size (int): The number of dump lines handed to a process at a time.
+        neo4j_relationship_types (dict[str, str], optional): Relationship type by
+            property ID, by default `config.NEO4J_RELATIONSHIP_TYPES`. Properties
+            without one are typed by their ID, as in `neo4j_utils.relationship_type`.
+
+    Returns:
+        tuple[Path, Path]: The paths of the node and relationship files.
+    """
+    if neo4j_relationship_types is None:
+        neo4j_relationship_types = NEO4J_RELATIONSHIP_TYPES
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    persons_path = output_dir / "persons.csv"
+    relationships_path = output_dir / "relationships.csv"
+
+    with open(persons_path, "w", newline="", encoding="utf-8") as persons_file:
+        persons_writer = csv.writer(persons_file)
+        persons_writer.writerow(PERSONS_HEADER)
+
+        written, edges = set(), []
+        initargs = (relationship_types, set())
+        for members, member_edges in _map_chunks(
+            _scan_members, dump_path, processes, chunk_size, initargs
+        ):
+            for row in members:
+                persons_writer.writerow(row)
+                written.add(row[0])
+            edges.extend(member_edges)
+        logger.info(f"Found {len(written)} members with {len(edges)} candidate edges")
+
+        targets = {target for _, _, target in edges}
+        initargs = (relationship_types, targets)
+        resolved = set()
+        for rows in _map_chunks(_scan_targets, dump_path, processes, chunk_size, initargs):
+            for row in rows:
+                resolved.add(row[0])
+                if row[0] not in written:
+                    persons_writer.writerow(row)
+                    written.add(row[0])
+        logger.info(f"Resolved {len(resolved)} of {len(targets)} edge targets to persons")
+
+    # the import creates one edge per row, so statements of the same edge are merged first
+    canonical = {}
+    for source, property_id, target in edges:
+        if ENTITY_PREFIX + target not in resolved:
+            continue
+        prop, start, end, properties = canonical_edge(property_id, ENTITY_PREFIX + source, ENTITY_PREFIX + target)
+        canonical.setdefault((prop, start, end), {}).update(properties)
+    with open(relationships_path, "w", newline="", encoding="utf-8") as relationships_file:
+        relationships_writer = csv.writer(relationships_file)
+        relationships_writer.writerow(RELATIONSHIPS_HEADER)
+        for (prop, start, end), properties in canonical.items():
+            relationships_writer.writerow(
+                [start, end, neo4j_relationship_types.get(prop, prop), properties.get("parent", "")]
+            )
+    count = len(canonical)
+
+    logger.info(
+        f"Wrote {len(written)} persons to {persons_path} and {count} relationships to "
+        f"{relationships_path}. Load them with: neo4j-admin database import full "
+        f"--nodes={persons_path} --relationships={relationships_path}"
+    )
+    return persons_path, relationships_path
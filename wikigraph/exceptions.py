@@ -97,6 +97,26 @@ class UncaughtException(BaseResult):
     level = Severity.exception
 
 
+class TransientFailure(BaseResult):
+    """Transient failure, retrying"""
+
+    is_error = True
+    is_full_failure = False
+    is_transient = True
+    log_code = "WIKIGRAPH-R000"
+    level = Severity.warning
+
+
+class RetriesExhausted(BaseResult):
+    """Transient failure persisted after all retries"""
+
+    is_error = True
+    is_full_failure = False
+    is_transient = False
+    log_code = "WIKIGRAPH-R001"
+    level = Severity.exception
+
+
 class NoFilesFoundException(BaseResult):
     """No files found at specified location."""
 
@@ -111,11 +131,37 @@ class NoFilesFoundException(BaseResult):
 class WikigraphError(Exception):
     """Base exception class for the wikigraph package."""
 
+    # whether retrying the same operation may succeed, see `wikigraph.retry`
+    is_transient = False
+
 
 class DataFetchError(WikigraphError):
     """Raised when there's an error while fetching data from Wikipedia or Wikidata."""
 
 
+class TransientDataFetchError(DataFetchError):
+    """Raised when the endpoint is temporarily unavailable (e.g. 502/503/504 or a dropped connection)."""
+
+    is_transient = True
+
+
+class RateLimitedError(TransientDataFetchError):
+    """Raised when the endpoint rejects a request for exceeding its rate limits (HTTP 429)."""
+
+    def __init__(self, *args, retry_after: Optional[float] = None):
+        super().__init__(*args)
+        self.retry_after = retry_after
+
+
+class QueryTimeoutError(DataFetchError):
+    """
+    Raised when a SPARQL query exceeds the endpoint or client timeout.
+
+    Not transient: rerunning the same query is likely to time out again, so
+    callers split it into smaller queries instead.
+    """
+
+
 class DataProcessingError(WikigraphError):
     """Raised when there's an issue processing the fetched data."""
 
@@ -126,3 +172,9 @@ class DatabaseConnectionError(WikigraphError):
 
 class DatabaseInsertionError(WikigraphError):
     """Raised when there's an error inserting data into the Neo4j database."""
+
+
+class TransientDatabaseError(DatabaseInsertionError):
+    """Raised when a write fails for a reason that may resolve itself, e.g. a lost connection."""
+
+    is_transient = True
@@ -0,0 +1,171 @@
+"""
+frontier.py
+
+Breadth-first crawl outward from the seed persons: each hop fetches the
+relationships of the persons discovered by the previous hop, and the related
+persons not visited yet become the next hop's frontier
+"""
+import time
+import typing as ty
+
+import pydantic
+from neo4j import Driver
+
+import wikigraph.config as C
+import wikigraph.models as M
+import wikigraph.sparql as S
+from wikigraph.dedup import Deduplicator
+from wikigraph.logger import get_logger
+from wikigraph.neo4j_utils import ensure_schema, get_driver, insert_attributes, insert_persons, insert_relationships
+from wikigraph.utils import chunked
+
+logger = get_logger(__name__)
+
+
+class FrontierStats(pydantic.BaseModel):
+    """Totals of a frontier crawl"""
+    depth: int = 0
+    persons: int = 0
+    relationships: int = 0
+    attributes: int = 0
+    seconds: float = 0.0
+
+
+def related_persons(relationships: ty.Iterable[M.Relationship]) -> ty.Iterator[M.Person]:
+    """The related end of each relationship as a person"""
+    for relationship in relationships:
+        yield M.Person.construct(uri=relationship.related_person_uri, label=relationship.related_person_label)
+
+
+def frontier_crawl(
+    seeds: ty.Iterable[M.Person],
+    driver: Driver,
+    relationship_types: list[str],
+    max_depth: int = 2,
+    max_nodes: ty.Optional[int] = None,
+    expand_batch_size: int = 500,
+    write_batch_size: int = 1000,
+    validate: bool = True,
+    relationship_batch_size: int = S.DEFAULT_RELATIONSHIP_BATCH_SIZE,
+    relationship_workers: int = S.DEFAULT_RELATIONSHIP_WORKERS
+) -> FrontierStats:
+    """
+    Crawl the network around the seed persons breadth-first into Neo4j.
+
+    Persons are written as they are discovered, and each person's relationships
+    and attributes once its hop is expanded; only person-to-person properties
+    (see `sparql.split_relationship_types`) are followed. Persons discovered by
+    the last hop are written without their own relationships. Relationships to
+    persons left out by `max_nodes` are not written.
+
+    Args:
+        seeds (Iterable[Person]): The persons to start from (depth 0).
+        driver (Driver): A Neo4j database driver object.
+        relationship_types (list[str]): Wikidata property IDs of the edges to follow.
+        max_depth (int): The number of hops to expand.
+        max_nodes (int, optional): Stop discovering persons once this many were visited.
+        expand_batch_size (int): Persons whose relationships are fetched and
+            written together; their queries are split further by `get_relationships`.
+        write_batch_size (int): The number of rows per write transaction.
+        validate (bool): Whether to validate query results when building models.
+        relationship_batch_size (int): Initial persons per relationships query.
+        relationship_workers (int): Parallel relationships queries per batch.
+
+    Returns:
+        FrontierStats: Totals of the crawl.
+    """
+    start = time.perf_counter()
+    stats = FrontierStats()
+    visited = set()
+    dedup = Deduplicator()
+    relationship_types, attribute_types = S.split_relationship_types(relationship_types)
+    batch_size = S.AdaptiveBatchSize(relationship_batch_size)
+    attribute_batch_size = S.AdaptiveBatchSize(relationship_batch_size)
+
+    def visit(persons: ty.Iterable[M.Person]) -> list[M.Person]:
+        new = []
+        for person in persons:
+            if max_nodes is not None and len(visited) >= max_nodes:
+                break
+            if person.uri not in visited:
+                visited.add(person.uri)
+                new.append(person)
+        if new:
+            insert_persons(driver, new, write_batch_size)
+            stats.persons += len(new)
+        return new
+
+    frontier = visit(seeds)
+    while frontier and stats.depth < max_depth:
+        stats.depth += 1
+        next_frontier = []
+        for batch in chunked(frontier, expand_batch_size):
+            relationships = []
+            if relationship_types:
+                relationships = S.get_relationships(
+                    0,
+                    None,
+                    batch,
+                    relationship_types,
+                    validate,
+                    batch_size=batch_size,
+                    max_workers=relationship_workers,
+                )
+            next_frontier.extend(visit(related_persons(relationships)))
+            relationships = [
+                relationship
+                for relationship in dedup.relationships(relationships)
+                if relationship.related_person_uri in visited
+            ]
+            if relationships:
+                insert_relationships(driver, relationships, write_batch_size)
+                stats.relationships += len(relationships)
+            attributes = S.get_attributes(
+                batch,
+                attribute_types,
+                validate,
+                batch_size=attribute_batch_size,
+                max_workers=relationship_workers,
+            )
+            attributes = list(dedup.attributes(attributes))
+            if attributes:
+                insert_attributes(driver, attributes, write_batch_size)
+                stats.attributes += len(attributes)
+        logger.info(
+            f"Hop {stats.depth}: expanded {len(frontier)} persons, discovered {len(next_frontier)} "
+            f"({stats.persons} persons and {stats.relationships} relationships so far)"
+        )
+        frontier = next_frontier
+
+    stats.seconds = time.perf_counter() - start
+    logger.info(f"Frontier crawl finished: {stats.dict()}")
+    return stats
+
+
+def run_frontier(
+    settings: C.Settings,
+    max_depth: int,
+    max_nodes: ty.Optional[int] = None,
+    page_size: int = 500,
+    write_batch_size: int = 1000
+) -> FrontierStats:
+    """Crawl outward from the persons matched by the seed query into the configured database"""
+    driver = get_driver(settings)
+    ensure_schema(driver)
+    seeds = (
+        person
+        for page in S.iter_person_pages(page_size, validate=settings.strict_validation)
+        for person in page
+    )
+    return frontier_crawl(
+        seeds,
+        driver,
+        settings.relationship_types,
+        max_depth=max_depth,
+        max_nodes=max_nodes,
+        expand_batch_size=page_size,
+        write_batch_size=write_batch_size,
+        validate=settings.strict_validation,
+        relationship_batch_size=settings.relationship_batch_size,
+        relationship_workers=settings.relationship_max_workers,
+    )
@@ -0,0 +1,287 @@
+"""
+labels.py
+
+Resolves entity labels separately from the structural queries: the IDs of
+unlabelled models are collected, looked up in an in-process LRU and an on-disk
+SQLite cache, and only the remaining ones are fetched from the Wikidata API,
+up to `MAX_IDS_PER_REQUEST` per `wbgetentities` call
+"""
+import sqlite3
+import threading
+import time
+import typing as ty
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+
+import httpx
+import pydantic
+
+import wikigraph.models as M
+from wikigraph.config import get_settings
+from wikigraph.logger import get_logger
+from wikigraph.retry import call_with_retry
+
+logger = get_logger(__name__)
+
+WIKIDATA_API = "https://www.wikidata.org/w/api.php"
+# wbgetentities rejects requests for more IDs than this
+MAX_IDS_PER_REQUEST = 50
+# a full label store is evicted down to this fraction of its capacity
+LOW_WATER_MARK = 0.9
+# cache hits whose access times are buffered before they are written
+ACCESS_FLUSH_SIZE = 10_000
+
+# (URI field, label field) pairs of each model whose labels can be resolved
+LABEL_FIELDS = {
+    M.Person: [("uri", "label")],
+    M.Relationship: [("person_uri", "person_label"), ("related_person_uri", "related_person_label")],
+    M.Attribute: [("target_uri", "target_label")],
+}
+
+Fetch = ty.Callable[[list[str], str], dict[str, ty.Optional[str]]]
+
+
+def entity_id(uri: str) -> str:
+    """`Q42` for `http://www.wikidata.org/entity/Q42`"""
+    return uri.rsplit("/", 1)[-1]
+
+
+def fetch_labels(
+    ids: list[str],
+    language: str,
+    endpoint: str = WIKIDATA_API,
+    transport: ty.Optional[httpx.BaseTransport] = None
+) -> dict[str, ty.Optional[str]]:
+    """
+    Fetch the labels of up to `MAX_IDS_PER_REQUEST` entities with a single
+    `wbgetentities` request, retrying transient failures.
+
+    Returns:
+        dict[str, str | None]: The label of each ID, None if it has none in `language`.
+    """
+    if len(ids) > MAX_IDS_PER_REQUEST:
+        raise ValueError(f"At most {MAX_IDS_PER_REQUEST} IDs per request, got {len(ids)}")
+    params = {
+        "action": "wbgetentities",
+        "ids": "|".join(ids),
+        "props": "labels",
+        "languages": language,
+        "format": "json",
+    }
+
+    def get() -> dict:
+        with httpx.Client(transport=transport, timeout=60.0) as client:
+            response = client.get(endpoint, params=params)
+            response.raise_for_status()
+            return response.json()
+
+    entities = call_with_retry(get).get("entities", {})
+    return {
+        id_: entities.get(id_, {}).get("labels", {}).get(language, {}).get("value")
+        for id_ in ids
+    }
+
+
+class LabelStore:
+    """
+    SQLite-backed label cache holding about `max_entries` labels: once a write
+    takes it over capacity, the least recently used ones are evicted down to
+    `LOW_WATER_MARK` of it. IDs without a label are stored too, so they are not
+    fetched again.
+
+    The access times of cache hits are buffered and written with the next
+    `set_many`, or once `ACCESS_FLUSH_SIZE` are pending, so reads do not take the
+    database's write lock.
+    """
+
+    def __init__(self, path: Path, max_entries: ty.Optional[int] = None):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS labels (
+                id TEXT NOT NULL,
+                language TEXT NOT NULL,
+                label TEXT,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (id, language)
+            )
+            """
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS labels_accessed_at ON labels (accessed_at)")
+        self._connection.commit()
+        # an upper bound on the number of rows, recounted before evicting
+        self._entries = self._connection.execute("SELECT COUNT(*) FROM labels").fetchone()[0]
+        self._accessed: dict[tuple[str, str], float] = {}
+
+    def get_many(self, ids: list[str], language: str) -> dict[str, ty.Optional[str]]:
+        """The stored labels of those `ids` that are in the store"""
+        found = {}
+        with self._lock:
+            # stay well below SQLite's limit on the number of query parameters
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._connection.execute(
+                    f"SELECT id, label FROM labels WHERE language = ? AND id IN ({placeholders})",
+                    (language, *chunk),
+                ).fetchall()
+                found.update(rows)
+            now = time.time()
+            self._accessed.update({(id_, language): now for id_ in found})
+            if len(self._accessed) >= ACCESS_FLUSH_SIZE:
+                self._write_accessed()
+                self._connection.commit()
+        return found
+
+    def set_many(self, labels: dict[str, ty.Optional[str]], language: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO labels VALUES (?, ?, ?, ?)",
+                [(id_, language, label, now) for id_, label in labels.items()],
+            )
+            self._entries += len(labels)
+            self._write_accessed()
+            if self.max_entries is not None and self._entries > self.max_entries:
+                self._evict()
+            self._connection.commit()
+
+    def _write_accessed(self) -> None:
+        if self._accessed:
+            self._connection.executemany(
+                "UPDATE labels SET accessed_at = ? WHERE id = ? AND language = ?",
+                [(accessed_at, id_, language) for (id_, language), accessed_at in self._accessed.items()],
+            )
+            self._accessed = {}
+
+    def _evict(self) -> None:
+        self._entries = self._connection.execute("SELECT COUNT(*) FROM labels").fetchone()[0]
+        if self._entries <= self.max_entries:
+            return
+        excess = self._entries - int(self.max_entries * LOW_WATER_MARK)
+        self._connection.execute(
+            "DELETE FROM labels WHERE rowid IN (SELECT rowid FROM labels ORDER BY accessed_at LIMIT ?)",
+            (excess,),
+        )
+        self._entries -= excess
+        logger.debug(f"Evicted {excess} labels from {self.path}")
+
+
+class LabelStats(pydantic.BaseModel):
+    """Where resolved labels came from"""
+    memory_hits: int = 0
+    store_hits: int = 0
+    fetched: int = 0
+    requests: int = 0
+
+
+class LabelResolver:
+    """
+    Resolves entity IDs to labels through an in-process LRU of `memory_size`
+    entries, an optional on-disk `store`, and batched calls to `fetch`.
+
+    Args:
+        language (str): The language of the labels.
+        fetch (Callable[[list[str], str], dict]): Fetches the labels of a batch of
+            IDs in a language, by default `fetch_labels` against the Wikidata API.
+        store (LabelStore, optional): On-disk cache shared between runs.
+        memory_size (int): The number of labels kept in memory.
+        batch_size (int): The number of IDs per `fetch` call.
+    """
+
+    def __init__(
+        self,
+        language: str,
+        fetch: Fetch = fetch_labels,
+        store: ty.Optional[LabelStore] = None,
+        memory_size: int = 100_000,
+        batch_size: int = MAX_IDS_PER_REQUEST
+    ):
+        self.fetch = fetch
+        self.store = store
+        self.language = language
+        self.memory_size = memory_size
+        self.batch_size = batch_size
+        self.stats = LabelStats()
+        self._memory: OrderedDict[str, ty.Optional[str]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _remember(self, labels: dict[str, ty.Optional[str]]) -> None:
+        with self._lock:
+            for id_, label in labels.items():
+                self._memory[id_] = label
+                self._memory.move_to_end(id_)
+            while len(self._memory) > self.memory_size:
+                self._memory.popitem(last=False)
+
+    def resolve(self, ids: ty.Iterable[str]) -> dict[str, ty.Optional[str]]:
+        """
+        Resolve entity IDs to their labels.
+
+        Returns:
+            dict[str, str | None]: The label of each distinct ID, None if it has none.
+        """
+        labels = {}
+        missing = []
+        with self._lock:
+            for id_ in dict.fromkeys(ids):
+                if id_ in self._memory:
+                    self._memory.move_to_end(id_)
+                    labels[id_] = self._memory[id_]
+                else:
+                    missing.append(id_)
+        self.stats.memory_hits += len(labels)
+
+        if missing and self.store is not None:
+            stored = self.store.get_many(missing, self.language)
+            self.stats.store_hits += len(stored)
+            self._remember(stored)
+            labels.update(stored)
+            missing = [id_ for id_ in missing if id_ not in stored]
+
+        for start in range(0, len(missing), self.batch_size):
+            fetched = self.fetch(missing[start:start + self.batch_size], self.language)
+            self.stats.fetched += len(fetched)
+            self.stats.requests += 1
+            if self.store is not None:
+                self.store.set_many(fetched, self.language)
+            self._remember(fetched)
+            labels.update(fetched)
+        if missing:
+            logger.debug(f"Fetched {len(missing)} labels ({self.stats.dict()})")
+        return labels
+
+    def label_models(self, models: list[pydantic.BaseModel]) -> list[pydantic.BaseModel]:
+        """Fill in the missing labels of Person, Relationship or Attribute models in place"""
+        fields = [(model, LABEL_FIELDS[type(model)]) for model in models]
+        ids = [
+            entity_id(getattr(model, uri_field))
+            for model, pairs in fields
+            for uri_field, label_field in pairs
+            if getattr(model, label_field, None) is None
+        ]
+        if not ids:
+            return models
+        labels = self.resolve(ids)
+        for model, pairs in fields:
+            for uri_field, label_field in pairs:
+                if getattr(model, label_field, None) is None:
+                    setattr(model, label_field, labels.get(entity_id(getattr(model, uri_field))))
+        return models
+
+
+@lru_cache()
+def get_label_resolver(language: str) -> LabelResolver:
+    """The process-wide label resolver for `language` configured in the settings"""
+    settings = get_settings()
+    return LabelResolver(
+        language,
+        fetch=lambda ids, language: fetch_labels(ids, language, settings.label_endpoint),
+        store=LabelStore(settings.label_cache_path, settings.label_cache_max_entries),
+        memory_size=settings.label_memory_size,
+    )
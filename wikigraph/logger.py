@@ -2,9 +2,19 @@
 logging.py
 
 Module to configure logging handlers, filters and levels
-in the application entrypoint
+in the application entrypoint.
+
+Records are put on a queue by the only root handler and written by a
+background listener thread, so logging never blocks on I/O in the caller.
+Forked processes do not inherit the thread, so they write to the handlers
+directly instead.
 """
+import atexit
+import itertools
 import logging
+import logging.handlers
+import os
+import queue
 import pydantic
 import typing as ty
 from pathlib import Path
@@ -89,26 +99,78 @@ def get_log_handlers(log_fields) -> list[logging.Handler]:
     return [handler for handler in [file_handler, stream_handler] if handler]
 
 
+class RowSampler:
+    """
+    Decides which per-row debug records to emit: about one in every `1 / rate`
+    calls to `sample`, none if `rate` is 0 and all if it is 1.
+    """
+
+    def __init__(self, rate: float = 0.0):
+        self.rate = rate
+        self.interval = round(1 / rate) if rate > 0 else 0
+        self._calls = itertools.count()
+
+    def sample(self) -> bool:
+        if not self.interval:
+            return False
+        return next(self._calls) % self.interval == 0
+
+
+_listener: ty.Optional[logging.handlers.QueueListener] = None
+_handlers: list[logging.Handler] = []
+_row_sampler = RowSampler()
+
+
+def stop_logging() -> None:
+    """Stop the listener thread once it has written all queued records"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def setup_worker_logging() -> None:
+    """
+    Replaces the queue handler inherited by a forked process with the handlers
+    themselves, as nothing would read the queue without the listener thread.
+    """
+    global _listener
+    if _listener is not None:
+        _listener = None
+        logging.root.handlers = list(_handlers)
+
+
+def sample_row() -> bool:
+    """Whether to emit the current per-row debug record, see `log_row_sample_rate`"""
+    return _row_sampler.sample()
+
+
 def setup_logging(
     settings: ty.Optional[Settings] = None
 ) -> None:
     """
     Configures logging with a chosen formatter.
     """
-    global root_logger
+    global root_logger, _listener, _handlers, _row_sampler
     if settings is None:
         log_fields = LogFields(correlation_id="", job_id="")
         log_level = logging.getLevelName(logging.INFO)        
+        _row_sampler = RowSampler()
     else:
         log_fields = LogFields(
             correlation_id=settings.correlation_id,
             job_id=settings.job_id
         )
         log_level = logging.getLevelName(settings.log_level)
-    handlers = get_log_handlers(log_fields=log_fields)
-
-    # Pass handlers and level back to the root logger
-    logging.root.handlers = handlers
+        _row_sampler = RowSampler(settings.log_row_sample_rate)
+    handlers = _handlers = get_log_handlers(log_fields=log_fields)
+
+    # The root logger only enqueues records, the listener thread formats and writes them
+    stop_logging()
+    log_queue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    logging.root.handlers = [logging.handlers.QueueHandler(log_queue)]
     logging.root.setLevel(log_level)
 
     # pylint: disable=no-member
@@ -119,11 +181,11 @@ def setup_logging(
 
     # Overrides for module specific loggers
     modules = {
-        "tensorflow": ERROR,
-        "absl": ERROR,
-        "botocore": WARNING,
-        "s3transfer": WARNING,
-        "urllib3": WARNING,
+        "tensorflow": logging.ERROR,
+        "absl": logging.ERROR,
+        "botocore": logging.WARNING,
+        "s3transfer": logging.WARNING,
+        "urllib3": logging.WARNING,
     }
     for name, level in modules.items():
         logger = logging.getLogger(name)
@@ -134,6 +196,8 @@ def setup_logging(
 # Set up default logging configuration
 root_logger = logging.getLogger()
 setup_logging()
+atexit.register(stop_logging)
+os.register_at_fork(after_in_child=setup_worker_logging)
 
 def get_logger(name: str) -> logging.Logger:
     return root_logger.getChild(name)
@@ -1,4 +1,5 @@
 import logging
+import typing as ty
 
 import pydantic
 
@@ -9,26 +10,76 @@ logger = get_logger(__name__)
 
 class Person(pydantic.BaseModel):
     uri: str = pydantic.Field(alias="person")
-    label: str = pydantic.Field(alias="personLabel")
+    # labels are None until resolved when queries return bare URIs (see `labels.LabelResolver`)
+    label: ty.Optional[str] = pydantic.Field(default=None, alias="personLabel")
+    # schema:dateModified of the entity, used as the incremental crawl high-water mark
+    modified: ty.Optional[str] = pydantic.Field(default=None, alias="modified")
 
 
 class Relationship(pydantic.BaseModel):
     person_uri: str = pydantic.Field(alias="person")
-    person_label: str = pydantic.Field(alias="personLabel")
+    person_label: ty.Optional[str] = pydantic.Field(default=None, alias="personLabel")
     related_person_uri: str = pydantic.Field(alias="related_person")
-    related_person_label: str = pydantic.Field(alias="related_personLabel")
+    related_person_label: ty.Optional[str] = pydantic.Field(default=None, alias="related_personLabel")
     relationship: str
 
 
+class Attribute(pydantic.BaseModel):
+    """Edge from a person to a non-person entity, e.g. an occupation or a place"""
+    person_uri: str = pydantic.Field(alias="person")
+    relationship: str
+    target_uri: str = pydantic.Field(alias="target")
+    target_label: ty.Optional[str] = pydantic.Field(default=None, alias="targetLabel")
+
+
+def iter_models(
+    query_results: ty.Iterable[dict],
+    model: pydantic.BaseModel,
+    validate: bool = True
+) -> ty.Iterator[pydantic.BaseModel]:
+    """
+    Lazily map SPARQL result bindings to model instances.
+
+    With `validate=False` the bindings are trusted and loaded with `model.construct`,
+    skipping pydantic validation and coercion. As with validation, bindings that
+    are not model fields are dropped.
+    """
+    if validate:
+        for result in query_results:
+            yield model(**{key: value["value"] for key, value in result.items()})
+        return
+    aliases = {field.alias: name for name, field in model.__fields__.items()}
+    for result in query_results:
+        yield model.construct(**{
+            aliases[key]: value["value"] for key, value in result.items() if key in aliases
+        })
+
+
 def map_to_models(
-    query_results: list[dict],
-    model: pydantic.BaseModel
+    query_results: ty.Iterable[dict],
+    model: pydantic.BaseModel,
+    validate: bool = True
 ) -> list[pydantic.BaseModel]:
-    mapped_data = []
+    mapped_data = list(iter_models(query_results, model, validate))
+    logger.debug(f"Mapped {len(mapped_data)} results to {model}")
+    return mapped_data
+
 
+def map_to_columns(
+    query_results: ty.Iterable[dict],
+    model: pydantic.BaseModel
+) -> dict[str, list[ty.Optional[str]]]:
+    """
+    Map SPARQL result bindings to parallel lists of values, one per model field,
+    without building an object per row. Missing bindings are filled with None.
+
+    e.g. `{"uri": [...], "label": [...]}` for `Person`.
+    """
+    aliases = {field.alias: name for name, field in model.__fields__.items()}
+    columns = {name: [] for name in aliases.values()}
     for result in query_results:
-        data = {key: value["value"] for key, value in result.items()}
-        instance = model(**data)
-        mapped_data.append(instance)
-    logger.debug(f"Mapped {len(mapped_data)} results to {model}")
-    return mapped_data
\ No newline at end of file
+        for alias, name in aliases.items():
+            value = result.get(alias)
+            columns[name].append(value["value"] if value is not None else None)
+    logger.debug(f"Mapped results to {len(columns)} columns of {model}")
+    return columns
\ No newline at end of file
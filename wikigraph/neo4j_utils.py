@@ -1,56 +1,504 @@
+import atexit
 import os
-from typing import Dict, List
+import re
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import partial
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
 
-from neo4j import GraphDatabase, Driver
+import pydantic
+from neo4j import GraphDatabase, Driver, Session
 
 import wikigraph.models as M
 import wikigraph.config as C
-from wikigraph.logger import get_logger
+from wikigraph.dedup import FORWARD, REVERSE, SORTED, canonical_edge, canonical_property, property_id
+from wikigraph.logger import get_logger, sample_row
+from wikigraph.retry import call_with_retry
+from wikigraph.utils import chunked
 
 logger = get_logger(__name__)
 
+DEFAULT_BATCH_SIZE = 1000
 
-def create_connection(settings: C.Settings) -> Driver:
+# Idempotent schema statements; the uniqueness constraints also back indexes on
+# the uri of each label, so the MERGE/MATCH lookups below are index seeks, not label scans.
+# Each attribute label gets the same constraint, see `schema_statements`
+SCHEMA_STATEMENTS = [
+    "CREATE CONSTRAINT person_uri IF NOT EXISTS FOR (p:Person) REQUIRE p.uri IS UNIQUE",
+    "CREATE INDEX person_name IF NOT EXISTS FOR (p:Person) ON (p.name)",
+]
+
+# Only needed while `migrate_has_relation_edges` finds legacy edges by their type
+HAS_RELATION_TYPE_INDEX = "CREATE INDEX has_relation_type IF NOT EXISTS FOR ()-[r:HAS_RELATION]-() ON (r.type)"
+
+# Relationship types and labels are interpolated into Cypher, so only plain identifiers are allowed
+RELATIONSHIP_TYPE_PATTERN = re.compile(r"[A-Z][A-Z0-9_]*")
+LABEL_PATTERN = re.compile(r"[A-Z][A-Za-z0-9_]*")
+
+
+class BatchTiming(pydantic.BaseModel):
+    """Size and wall-clock duration of a single committed write transaction"""
+    rows: int
+    seconds: float
+
+
+class PoolStats(pydantic.BaseModel):
+    """
+    Utilisation of a driver's connection pool, measured as open sessions
+    (a session holds at most one pooled connection at a time)
+    """
+    max_size: Optional[int] = None
+    in_use: int = 0
+    peak_in_use: int = 0
+    acquired: int = 0
+
+
+# process-wide registry of shared drivers, keyed by (uri, user)
+_drivers: Dict[tuple, Driver] = {}
+_pool_stats: Dict[int, PoolStats] = {}
+_registry_lock = threading.Lock()
+
+
+def _driver_config(settings: C.Settings) -> dict:
+    return dict(
+        max_transaction_retry_time=settings.neo4j_max_transaction_retry_time,
+        max_connection_pool_size=settings.neo4j_max_connection_pool_size,
+        max_connection_lifetime=settings.neo4j_max_connection_lifetime,
+        connection_acquisition_timeout=settings.neo4j_connection_acquisition_timeout,
+    )
+
+
+def get_driver(settings: C.Settings) -> Driver:
     """
-    Create a connection to the Neo4j database.
+    Get the driver shared by every caller in this process for the configured
+    database, creating it on first use. Shared drivers are closed by
+    `close_drivers`, which also runs at interpreter exit.
+
+    Returns:
+        Driver: A Neo4j database driver object. Callers must not close it.
+    """
+    key = (str(settings.neo4j_uri), settings.neo4j_user)
+    with _registry_lock:
+        driver = _drivers.get(key)
+        if driver is None:
+            driver = create_connection(settings)
+            _drivers[key] = driver
+            _pool_stats[id(driver)] = PoolStats(max_size=settings.neo4j_max_connection_pool_size)
+            logger.info(f"Registered shared Neo4j driver for {key[0]}")
+    return driver
+
+
+@atexit.register
+def close_drivers():
+    """Close every shared driver and empty the registry"""
+    with _registry_lock:
+        for driver in _drivers.values():
+            driver.close()
+            _pool_stats.pop(id(driver), None)
+        if _drivers:
+            logger.info(f"Closed {len(_drivers)} shared Neo4j drivers")
+        _drivers.clear()
+
+
+def pool_metrics() -> Dict[str, dict]:
+    """Pool utilisation of each shared driver, keyed by database URI"""
+    with _registry_lock:
+        return {
+            uri: _pool_stats[id(driver)].dict()
+            for (uri, _), driver in _drivers.items()
+            if id(driver) in _pool_stats
+        }
+
+
+@contextmanager
+def open_session(driver: Driver, **kwargs) -> Iterator[Session]:
+    """Open a session on a driver, tracking pool utilisation for shared drivers"""
+    stats = _pool_stats.get(id(driver))
+    if stats is not None:
+        with _registry_lock:
+            stats.in_use += 1
+            stats.acquired += 1
+            stats.peak_in_use = max(stats.peak_in_use, stats.in_use)
+    try:
+        with driver.session(**kwargs) as session:
+            yield session
+    finally:
+        if stats is not None:
+            with _registry_lock:
+                stats.in_use -= 1
+
+
+def create_connection(settings: C.Settings, setup_schema: bool = False) -> Driver:
+    """
+    Create a connection to the Neo4j database. Prefer `get_driver`, which reuses
+    one driver and its connection pool across callers.
+
+    Args:
+        settings (Settings): The application settings.
+        setup_schema (bool): Whether to create the constraints and indexes
+            (see `ensure_schema`) before returning.
 
     Returns:
         Driver: A Neo4j database driver object.
     """
-    driver = GraphDatabase.driver(settings.neo4j_uri, auth=(settings.neo4j_user, settings.neo4j_password))
+    driver = GraphDatabase.driver(
+        settings.neo4j_uri,
+        auth=(settings.neo4j_user, settings.neo4j_password),
+        **_driver_config(settings),
+    )
     logger.debug(f"Created Neo4j database driver {driver}")
+    if setup_schema:
+        ensure_schema(driver)
     return driver
 
-def insert_persons(driver: Driver, persons: List[M.Person]):
+def schema_statements(attribute_labels: Optional[Dict[str, str]] = None) -> List[str]:
+    """
+    `SCHEMA_STATEMENTS` and a uri uniqueness constraint for the label of each
+    attribute property, by default from `attribute_labels` in the settings.
+    """
+    if attribute_labels is None:
+        attribute_labels = C.get_settings().attribute_labels
+    return SCHEMA_STATEMENTS + [
+        f"CREATE CONSTRAINT {label.lower()}_uri IF NOT EXISTS FOR (n:{check_label(label)}) REQUIRE n.uri IS UNIQUE"
+        for label in sorted(set(attribute_labels.values()))
+    ]
+
+def ensure_schema(driver: Driver, attribute_labels: Optional[Dict[str, str]] = None):
+    """
+    Create the constraints and indexes the writes rely on, if they do not exist yet.
+
+    Creating the uniqueness constraint fails if the graph already holds several
+    Person nodes with the same URI; those must be merged first.
+
+    Args:
+        driver (Driver): A Neo4j database driver object.
+        attribute_labels (Dict[str, str], optional): Target node label by property ID,
+            by default `attribute_labels` from the settings.
+    """
+    statements = schema_statements(attribute_labels)
+    with open_session(driver) as session:
+        for statement in statements:
+            session.run(statement).consume()
+    logger.info(f"Ensured {len(statements)} schema constraints and indexes")
+
+def write_batches(
+    driver: Driver,
+    unit_of_work: Callable,
+    rows: Iterable[dict],
+    batch_size: int = DEFAULT_BATCH_SIZE
+) -> List[BatchTiming]:
     """
-    Insert a list of Member objects into the Neo4j database.
+    Write rows to the database in chunks, one managed transaction per chunk.
+
+    Each chunk is retried by the driver on transient errors for up to
+    `max_transaction_retry_time` seconds (see `create_connection`), and then
+    with backoff under the configured retry policy (see `wikigraph.retry`).
 
     Args:
         driver (Driver): A Neo4j database driver object.
-        persons (List[Person]): A list of Person objects.
+        unit_of_work (Callable): Transaction function taking `(tx, rows)`.
+        rows (Iterable[dict]): Parameter maps, one per row. May be a lazy iterator,
+            in which case chunks are written as soon as they are complete.
+        batch_size (int): The maximum number of rows per transaction.
+
+    Returns:
+        List[BatchTiming]: The size and duration of each committed chunk.
     """
-    with driver.session() as session:
-        logger.debug(f"Writing {len(persons)} to database")
-        for person in persons:
-            session.write_transaction(create_person, person.uri, person.label)
+    name = getattr(unit_of_work, "func", unit_of_work).__name__
+    timings = []
+    with open_session(driver) as session:
+        for chunk in chunked(rows, batch_size):
+            start = time.perf_counter()
+            call_with_retry(session.execute_write, unit_of_work, chunk)
+            timing = BatchTiming(rows=len(chunk), seconds=time.perf_counter() - start)
+            logger.debug(f"Committed chunk of {timing.rows} rows in {timing.seconds:.3f}s")
+            if sample_row():
+                logger.debug(f"Sample row of {name}: {chunk[0]}")
+            timings.append(timing)
+    rows_written = sum(timing.rows for timing in timings)
+    seconds = sum(timing.seconds for timing in timings)
+    rate = f", {rows_written / seconds:.0f} rows/s" if seconds else ""
+    logger.info(f"{name}: wrote {rows_written} rows in {len(timings)} chunks ({seconds:.3f}s{rate})")
+    return timings
 
-def insert_relationships(driver: Driver, relationships: List[M.Relationship]):
+def insert_persons(
+    driver: Driver,
+    persons: Iterable[M.Person],
+    batch_size: int = DEFAULT_BATCH_SIZE
+) -> List[BatchTiming]:
     """
-    Insert a list of Relationship objects into the Neo4j database.
+    Insert Person objects into the Neo4j database.
 
     Args:
         driver (Driver): A Neo4j database driver object.
-        relationships (List[Relationship]): A list of Relationship objects.
-    """
-    with driver.session() as session:
-        logger.debug(f"Writing {len(relationships)} relationships to database")
-        for relationship in relationships:
-            session.write_transaction(
-                create_relation,
-                relationship.person,
-                relationship.related_person,
-                relationship.relationship
-            )
+        persons (Iterable[Person]): Person objects, e.g. a list or a stream.
+        batch_size (int): The maximum number of persons per transaction.
+
+    Returns:
+        List[BatchTiming]: The size and duration of each committed chunk.
+    """
+    rows = ({"uri": person.uri, "label": person.label} for person in persons)
+    return write_batches(driver, create_persons, rows, batch_size)
+
+def relationship_type(property_uri: str, relationship_types: Optional[Dict[str, str]] = None) -> str:
+    """
+    The Neo4j relationship type of edges for a Wikidata property, e.g. `CHILD` for
+    `http://www.wikidata.org/prop/direct/P40`, or the property ID if it has none.
+
+    Args:
+        property_uri (str): The property URI or ID.
+        relationship_types (Dict[str, str], optional): Relationship type by property ID,
+            by default `neo4j_relationship_types` from the settings.
+    """
+    if relationship_types is None:
+        relationship_types = C.get_settings().neo4j_relationship_types
+    prop = property_id(property_uri)
+    return relationship_types.get(prop, prop)
+
+def insert_relationships(
+    driver: Driver,
+    relationships: Iterable[M.Relationship],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    relationship_types: Optional[Dict[str, str]] = None
+) -> List[BatchTiming]:
+    """
+    Insert Relationship objects into the Neo4j database as edges of the
+    relationship type of their property (see `relationship_type`), in the
+    canonical form of `dedup.canonical_edge`, so e.g. a P22 father statement
+    and the P40 child statement of the same edge merge into one `CHILD` edge.
+
+    The relationships are grouped by type in memory and each type is written
+    in its own chunks, since a statement can only create a single type.
+
+    Args:
+        driver (Driver): A Neo4j database driver object.
+        relationships (Iterable[Relationship]): Relationship objects, e.g. a list or a stream.
+        batch_size (int): The maximum number of relationships per transaction.
+        relationship_types (Dict[str, str], optional): Relationship type by property ID,
+            by default `neo4j_relationship_types` from the settings.
+
+    Returns:
+        List[BatchTiming]: The size and duration of each committed chunk.
+    """
+    groups = defaultdict(list)
+    for relationship in relationships:
+        prop, start, end, properties = canonical_edge(
+            relationship.relationship, relationship.person_uri, relationship.related_person_uri
+        )
+        groups[relationship_type(prop, relationship_types)].append(
+            {"person_uri": start, "related_person_uri": end, "properties": properties}
+        )
+    timings = []
+    for type_, rows in groups.items():
+        timings.extend(write_batches(driver, partial(create_relations, relationship_type=type_), rows, batch_size))
+    return timings
+
+def insert_attributes(
+    driver: Driver,
+    attributes: Iterable[M.Attribute],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    attribute_labels: Optional[Dict[str, str]] = None,
+    relationship_types: Optional[Dict[str, str]] = None
+) -> List[BatchTiming]:
+    """
+    Insert Attribute objects into the Neo4j database as edges from their Person
+    to a node of the attribute's label, e.g. `(:Person)-[:OCCUPATION]->(:Occupation)`.
+    Target nodes are merged on their URI within their label.
+
+    The attributes are grouped by label and relationship type in memory, and each
+    group is written in its own chunks.
+
+    Args:
+        driver (Driver): A Neo4j database driver object.
+        attributes (Iterable[Attribute]): Attribute objects, e.g. a list or a stream.
+        batch_size (int): The maximum number of attributes per transaction.
+        attribute_labels (Dict[str, str], optional): Target node label by property ID,
+            by default `attribute_labels` from the settings.
+        relationship_types (Dict[str, str], optional): Relationship type by property ID,
+            by default `neo4j_relationship_types` from the settings.
+
+    Returns:
+        List[BatchTiming]: The size and duration of each committed chunk.
+    """
+    if attribute_labels is None:
+        attribute_labels = C.get_settings().attribute_labels
+    groups = defaultdict(list)
+    for attribute in attributes:
+        label = attribute_labels[property_id(attribute.relationship)]
+        groups[label, relationship_type(attribute.relationship, relationship_types)].append(
+            {
+                "person_uri": attribute.person_uri,
+                "target_uri": attribute.target_uri,
+                "target_label": attribute.target_label,
+            }
+        )
+    timings = []
+    for (label, type_), rows in groups.items():
+        unit_of_work = partial(create_attributes, label=label, relationship_type=type_)
+        timings.extend(write_batches(driver, unit_of_work, rows, batch_size))
+    return timings
+
+def migrate_has_relation_edges(
+    driver: Driver,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    relationship_types: Optional[Dict[str, str]] = None
+) -> Dict[str, int]:
+    """
+    Rewrite `HAS_RELATION {type: ...}` edges written by earlier versions as edges
+    of their native relationship type, in the canonical form of
+    `dedup.canonical_property`, `batch_size` edges per transaction.
+
+    Each distinct `type` value is mapped through `relationship_type`, so
+    properties without a configured type become `P<id>` edges as in
+    `insert_relationships`. The edges of each value are found through an index
+    on `HAS_RELATION.type`, which is dropped once no such edges remain.
+    The migration can be interrupted and rerun.
+
+    Args:
+        driver (Driver): A Neo4j database driver object.
+        batch_size (int): The maximum number of edges rewritten per transaction.
+        relationship_types (Dict[str, str], optional): Relationship type by property ID,
+            by default `neo4j_relationship_types` from the settings.
+
+    Returns:
+        Dict[str, int]: The number of edges rewritten per relationship type.
+    """
+    if relationship_types is None:
+        relationship_types = C.get_settings().neo4j_relationship_types
+    migrated = defaultdict(int)
+    with open_session(driver) as session:
+        session.run(HAS_RELATION_TYPE_INDEX).consume()
+        session.run("CALL db.awaitIndexes()").consume()
+        # the type property holds the property URI, or the prefixed form in CSV imports
+        values = [
+            record["type"]
+            for record in session.run("MATCH ()-[old:HAS_RELATION]->() RETURN DISTINCT old.type AS type")
+        ]
+        for value in values:
+            if value is None:
+                continue
+            prop, order, properties = canonical_property(value)
+            type_ = relationship_type(prop, relationship_types)
+            if not RELATIONSHIP_TYPE_PATTERN.fullmatch(type_):
+                logger.warning(f"Skipping HAS_RELATION edges of type {value!r}: not a Wikidata property")
+                continue
+            count = batch_size
+            while count == batch_size:
+                count = call_with_retry(
+                    session.execute_write, rewrite_relations, value, type_, batch_size, order, properties
+                )
+                migrated[type_] += count
+            logger.info(f"Migrated HAS_RELATION edges of {value} to {type_} ({migrated[type_]} {type_} so far)")
+        remaining = session.run("MATCH ()-[r:HAS_RELATION]->() RETURN count(r) AS remaining").single()
+        if remaining and remaining["remaining"]:
+            logger.warning(f"{remaining['remaining']} HAS_RELATION edges have no relationship type")
+        else:
+            session.run("DROP INDEX has_relation_type IF EXISTS").consume()
+    return dict(migrated)
+
+def create_persons(tx, rows: List[dict]):
+    """
+    Create Person nodes for a chunk of rows in a single statement.
+
+    Args:
+        tx: A transaction object.
+        rows (List[dict]): Maps with `uri` and `label` keys.
+    """
+    query = """
+    UNWIND $rows AS row
+    MERGE (p:Person {uri: row.uri})
+    SET p.name = row.label
+    """
+    return tx.run(query, rows=rows).consume()
+
+def check_relationship_type(relationship_type: str) -> str:
+    """Raise a ValueError unless `relationship_type` is safe to interpolate into Cypher"""
+    if not RELATIONSHIP_TYPE_PATTERN.fullmatch(relationship_type):
+        raise ValueError(f"Invalid relationship type: {relationship_type!r}")
+    return relationship_type
+
+def create_relations(tx, rows: List[dict], relationship_type: str):
+    """
+    Create relationships of one type between Person nodes for a chunk of rows in a single statement.
+
+    Args:
+        tx: A transaction object.
+        rows (List[dict]): Maps with `person_uri`, `related_person_uri` and
+            `properties` (edge properties to set, possibly empty) keys.
+        relationship_type (str): The Neo4j relationship type, e.g. `CHILD`.
+    """
+    query = f"""
+    UNWIND $rows AS row
+    MATCH (p:Person {{uri: row.person_uri}})
+    MATCH (r:Person {{uri: row.related_person_uri}})
+    MERGE (p)-[e:{check_relationship_type(relationship_type)}]->(r)
+    SET e += row.properties
+    """
+    return tx.run(query, rows=rows).consume()
+
+def check_label(label: str) -> str:
+    """Raise a ValueError unless the node `label` is safe to interpolate into Cypher"""
+    if not LABEL_PATTERN.fullmatch(label):
+        raise ValueError(f"Invalid node label: {label!r}")
+    return label
+
+def create_attributes(tx, rows: List[dict], label: str, relationship_type: str):
+    """
+    Create attribute nodes of one label and edges of one type to them from
+    Person nodes for a chunk of rows in a single statement.
+
+    Args:
+        tx: A transaction object.
+        rows (List[dict]): Maps with `person_uri`, `target_uri` and `target_label` keys.
+        label (str): The label of the target nodes, e.g. `Occupation`.
+        relationship_type (str): The Neo4j relationship type, e.g. `OCCUPATION`.
+    """
+    query = f"""
+    UNWIND $rows AS row
+    MATCH (p:Person {{uri: row.person_uri}})
+    MERGE (t:{check_label(label)} {{uri: row.target_uri}})
+    SET t.name = row.target_label
+    MERGE (p)-[:{check_relationship_type(relationship_type)}]->(t)
+    """
+    return tx.run(query, rows=rows).consume()
+
+def rewrite_relations(
+    tx,
+    value: str,
+    relationship_type: str,
+    limit: int,
+    order: str = FORWARD,
+    properties: Optional[dict] = None
+) -> int:
+    """
+    Replace up to `limit` `HAS_RELATION` edges whose `type` is `value` with
+    edges of `relationship_type`, returning the number replaced.
+
+    Args:
+        tx: A transaction object.
+        value (str): The `type` of the edges to replace.
+        relationship_type (str): The Neo4j relationship type, e.g. `CHILD`.
+        limit (int): The maximum number of edges to replace.
+        order (str): How the endpoints are ordered in the new edge (see `dedup.canonical_property`).
+        properties (dict, optional): Properties to set on the new edges.
+    """
+    query = f"""
+    MATCH (p)-[old:HAS_RELATION]->(r)
+    WHERE old.type = $value
+    WITH p, old, r LIMIT $limit
+    WITH old, CASE
+        WHEN $order = '{REVERSE}' OR ($order = '{SORTED}' AND r.uri < p.uri) THEN [r, p]
+        ELSE [p, r]
+    END AS ends
+    WITH old, ends[0] AS a, ends[1] AS b
+    MERGE (a)-[e:{check_relationship_type(relationship_type)}]->(b)
+    SET e += $properties
+    DELETE old
+    RETURN count(*) AS rewritten
+    """
+    return tx.run(query, value=value, limit=limit, order=order, properties=properties or {}).single()["rewritten"]
 
 def create_person(tx, uri: str, label: str):
     """
@@ -61,8 +509,9 @@ def create_person(tx, uri: str, label: str):
         uri (str): The URI of the person.
         label (str): The name of the person.
     """
-    query = "MERGE (p:Person {uri: $uri, name: $label}) RETURN p"
-    logger.debug(query)
+    query = "MERGE (p:Person {uri: $uri}) SET p.name = $label RETURN p"
+    if sample_row():
+        logger.debug(f"{query} with uri={uri}")
     return tx.run(query, uri=uri, label=label)
 
 def create_relation(tx, person_uri: str, related_person_uri: str, relation_type: str):
@@ -73,15 +522,18 @@ def create_relation(tx, person_uri: str, related_person_uri: str, relation_type:
         tx: A transaction object.
         person_uri (str): The URI of the person.
         related_person_uri (str): The URI of the related person.
-        relation_type (str): The type of relationship between the two nodes.
+        relation_type (str): The Wikidata property of the relationship (see `relationship_type`).
     """
-    query = """
-    MATCH (p:Person {uri: $person_uri})
-    MATCH (r:Person {uri: $related_person_uri})
-    MERGE (p)-[:HAS_RELATION {type: $relation_type}]->(r)
+    prop, person_uri, related_person_uri, properties = canonical_edge(relation_type, person_uri, related_person_uri)
+    query = f"""
+    MATCH (p:Person {{uri: $person_uri}})
+    MATCH (r:Person {{uri: $related_person_uri}})
+    MERGE (p)-[e:{check_relationship_type(relationship_type(prop))}]->(r)
+    SET e += $properties
     """
-    logger.debug(query)
-    return tx.run(query, person_uri=person_uri, related_person_uri=related_person_uri, relation_type=relation_type)
+    if sample_row():
+        logger.debug(f"{query} with person_uri={person_uri}, related_person_uri={related_person_uri}")
+    return tx.run(query, person_uri=person_uri, related_person_uri=related_person_uri, properties=properties)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,62 @@
+"""
+partitioning.py
+
+Splits the person set into contiguous URI ranges that can be crawled
+independently, e.g. by dynamically mapped Airflow tasks
+"""
+import typing as ty
+
+import pydantic
+
+import wikigraph.sparql as S
+from wikigraph.logger import get_logger
+
+logger = get_logger(__name__)
+
+DEFAULT_ENUMERATION_PAGE_SIZE = 10000
+
+
+class Partition(pydantic.BaseModel):
+    """A range of persons ordered by URI: greater than `after`, up to and including `until`"""
+    index: int
+    after: ty.Optional[str] = None
+    until: ty.Optional[str] = None
+    size: int
+    # restricts the partition to persons modified after this timestamp (incremental mode)
+    since: ty.Optional[str] = None
+
+
+def plan_partitions(
+    uris: ty.Iterable[str],
+    partition_size: int,
+    since: ty.Optional[str] = None
+) -> list[Partition]:
+    """
+    Cut URIs, sorted as the endpoint sorts them, into consecutive ranges of at
+    most `partition_size` persons.
+
+    The first range is open below and the last open above, so persons created
+    between planning and crawling are still picked up.
+    """
+    partitions = []
+    after, size = None, 0
+    for uri in uris:
+        size += 1
+        if size == partition_size:
+            partitions.append(Partition(index=len(partitions), after=after, until=uri, size=size, since=since))
+            after, size = uri, 0
+    if size or not partitions:
+        partitions.append(Partition(index=len(partitions), after=after, size=size, since=since))
+    else:
+        partitions[-1].until = None
+    logger.info(f"Planned {len(partitions)} partitions of up to {partition_size} persons")
+    return partitions
+
+
+def enumerate_partitions(
+    partition_size: int,
+    since: ty.Optional[str] = None,
+    page_size: int = DEFAULT_ENUMERATION_PAGE_SIZE
+) -> list[Partition]:
+    """Enumerate the person URIs from the endpoint and plan partitions over them"""
+    return plan_partitions(S.iter_person_uris(page_size, since), partition_size, since)
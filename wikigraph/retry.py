@@ -0,0 +1,143 @@
+"""
+retry.py
+
+Retry policy for transient failures of the SPARQL endpoint and the database:
+errors are classified with `is_transient`, and retried after a jittered
+exponential backoff that honours any `Retry-After` the server sent
+"""
+import asyncio
+import email.utils
+import random
+import time
+import typing as ty
+from functools import lru_cache
+from urllib.error import HTTPError
+
+import httpx
+import pydantic
+from neo4j.exceptions import DriverError, Neo4jError
+
+from wikigraph.config import get_settings
+from wikigraph.exceptions import RetriesExhausted, TransientFailure
+from wikigraph.logger import get_logger
+
+logger = get_logger(__name__)
+
+T = ty.TypeVar("T")
+
+TRANSIENT_STATUS_CODES = {429, 502, 503, 504}
+
+
+class RetryPolicy(pydantic.BaseModel):
+    """How often and how long to wait before retrying a transient failure"""
+    max_attempts: int = 5
+    base_delay: float = 1.0
+    max_delay: float = 60.0
+
+    def backoff(self, attempt: int, retry_after: ty.Optional[float] = None) -> float:
+        """
+        Seconds to wait after the given (1-based) failed attempt: a uniformly
+        jittered exponential backoff, but never less than the server's `Retry-After`.
+        """
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+
+def is_transient(exc: BaseException) -> bool:
+    """Whether retrying the operation that raised `exc` may succeed"""
+    if isinstance(exc, (Neo4jError, DriverError)):
+        return exc.is_retryable()
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code in TRANSIENT_STATUS_CODES
+    if isinstance(exc, httpx.TransportError):
+        return not isinstance(exc, httpx.TimeoutException)
+    if isinstance(exc, HTTPError):
+        return exc.code in TRANSIENT_STATUS_CODES
+    return bool(getattr(exc, "is_transient", False))
+
+
+def parse_retry_after(value: ty.Optional[str]) -> ty.Optional[float]:
+    """Parse a `Retry-After` header given either in seconds or as an HTTP date"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_after(exc: BaseException) -> ty.Optional[float]:
+    """The delay the server asked for before retrying, if any"""
+    if getattr(exc, "retry_after", None) is not None:
+        return exc.retry_after
+    if isinstance(exc, httpx.HTTPStatusError):
+        return parse_retry_after(exc.response.headers.get("Retry-After"))
+    if isinstance(exc, HTTPError) and exc.headers is not None:
+        return parse_retry_after(exc.headers.get("Retry-After"))
+    return None
+
+
+def _next_delay(func: ty.Callable, exc: Exception, attempt: int, policy: RetryPolicy) -> float:
+    """Log a failed attempt and return how long to wait, re-raising if it should not be retried"""
+    name = getattr(func, "__name__", repr(func))
+    if not is_transient(exc):
+        raise exc
+    if attempt == policy.max_attempts:
+        RetriesExhausted(f"{name} failed {attempt} times: {exc!r}").log()
+        raise exc
+    delay = policy.backoff(attempt, retry_after(exc))
+    TransientFailure(
+        f"{name} attempt {attempt}/{policy.max_attempts} failed with {exc!r}, retrying in {delay:.1f}s"
+    ).log()
+    return delay
+
+
+def call_with_retry(
+    func: ty.Callable[..., T],
+    *args,
+    policy: ty.Optional[RetryPolicy] = None,
+    sleep: ty.Callable[[float], None] = time.sleep,
+    **kwargs
+) -> T:
+    """
+    Call `func(*args, **kwargs)`, retrying transient failures under `policy`.
+    Non-transient errors, and the last transient one, are raised unchanged.
+    """
+    policy = policy if policy is not None else get_retry_policy()
+    for attempt in range(1, policy.max_attempts + 1):
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            sleep(_next_delay(func, e, attempt, policy))
+
+
+async def call_with_retry_async(
+    func: ty.Callable[..., ty.Awaitable[T]],
+    *args,
+    policy: ty.Optional[RetryPolicy] = None,
+    **kwargs
+) -> T:
+    """Asyncio counterpart of `call_with_retry` for coroutine functions"""
+    policy = policy if policy is not None else get_retry_policy()
+    for attempt in range(1, policy.max_attempts + 1):
+        try:
+            return await func(*args, **kwargs)
+        except Exception as e:
+            await asyncio.sleep(_next_delay(func, e, attempt, policy))
+
+
+@lru_cache()
+def get_retry_policy() -> RetryPolicy:
+    """The retry policy configured in the settings"""
+    settings = get_settings()
+    return RetryPolicy(
+        max_attempts=settings.retry_max_attempts,
+        base_delay=settings.retry_base_delay,
+        max_delay=settings.retry_max_delay,
+    )
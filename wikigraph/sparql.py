@@ -1,36 +1,178 @@
 import json
 import logging
+import socket
 import sys
 import time
 import typing as ty
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from enum import Enum
+from functools import lru_cache
+from urllib.error import HTTPError, URLError
+
+import ijson
+import pydantic
 from SPARQLWrapper import SPARQLWrapper, JSON
+from SPARQLWrapper.SPARQLExceptions import EndPointInternalError
 
 import wikigraph.models as M
+from wikigraph.cache import get_query_cache
+from wikigraph.config import get_settings
+from wikigraph.exceptions import DataFetchError, QueryTimeoutError, RateLimitedError, TransientDataFetchError
+from wikigraph.labels import MAX_IDS_PER_REQUEST, get_label_resolver
 from wikigraph.logger import get_logger
+from wikigraph.retry import TRANSIENT_STATUS_CODES, call_with_retry, retry_after
+from wikigraph.utils import chunked
 
 logger = get_logger(__name__)
 
 wikidata_endpoint = "https://query.wikidata.org/sparql"
-sparql = SPARQLWrapper(wikidata_endpoint)
-sparql.setReturnFormat(JSON)
+USER_AGENT = "wikigraph/0.1.0 (https://github.com/SlapDrone/wikigraph)"
 
+# Number of persons per relationships query, adapted between these bounds
+DEFAULT_RELATIONSHIP_BATCH_SIZE = 50
+MIN_RELATIONSHIP_BATCH_SIZE = 1
+MAX_RELATIONSHIP_BATCH_SIZE = 500
+# Responses faster than this many seconds let the batch size grow
+FAST_RESPONSE_SECONDS = 5.0
+DEFAULT_RELATIONSHIP_WORKERS = 4
 
-# Query to get the Nazi Party members
-def create_persons_query(offset: int, limit: int) -> str:
+
+def create_client(endpoint: ty.Optional[str] = None) -> SPARQLWrapper:
     """
-    Builds a SPARQL query string to get the `offset`-th to the (`offset` + `limit`)-th person
+    Create a SPARQL client returning JSON results, for the endpoint configured
+    in the settings unless `endpoint` is given.
+
+    `SPARQLWrapper.setQuery` mutates the client, so each query gets its own
+    client to keep `execute_query` safe to call from several threads.
+    """
+    client = SPARQLWrapper(endpoint or get_settings().sparql_endpoint, agent=USER_AGENT)
+    client.setReturnFormat(JSON)
+    return client
+
+
+def modified_clause(since: ty.Optional[str] = None) -> str:
     """
-    query = f"""
+    Graph pattern binding the last modification time of `?person` to `?modified`,
+    restricted to entities modified after the `since` timestamp if given
+    (an xsd:dateTime string, e.g. `2023-03-14T00:00:00Z`).
+    """
+    clause = "?person schema:dateModified ?modified ."
+    if since is not None:
+        clause += f' FILTER (?modified > "{since}"^^xsd:dateTime).'
+    return clause
+
+
+class ClassFilter(str, Enum):
+    """How persons are recognised as humans"""
+    # ?x wdt:P31/wdt:P279* wd:Q5, i.e. any instance of human or of a subclass of it
+    SUBCLASS_PATH = "subclass_path"
+    # ?x wdt:P31 wd:Q5, a direct lookup without walking the class hierarchy
+    DIRECT = "direct"
+    # ?x wdt:P31 of one of a precomputed set of classes (human and chosen subclasses)
+    ALLOWED_CLASSES = "allowed_classes"
+
+
+class LabelSource(str, Enum):
+    """How the English labels of persons are bound"""
+    # ?x rdfs:label ?xLabel filtered on language, persons without a label are dropped
+    RDFS_LABEL = "rdfs_label"
+    # the Wikidata label service, which falls back to the entity ID if there is no label
+    LABEL_SERVICE = "label_service"
+    # bare URIs, labelled afterwards by `labels.LabelResolver`; persons without a label are kept
+    NONE = "none"
+
+
+class QueryStrategy(pydantic.BaseModel):
+    """The graph patterns used for class membership and labels in the query templates"""
+    class_filter: ClassFilter = ClassFilter.SUBCLASS_PATH
+    label_source: LabelSource = LabelSource.RDFS_LABEL
+    # Wikidata class IDs accepted with `ClassFilter.ALLOWED_CLASSES`
+    allowed_classes: list[str] = ["Q5"]
+    language: str = "en"
+
+
+DEFAULT_STRATEGY = QueryStrategy()
+
+
+@lru_cache()
+def get_query_strategy() -> QueryStrategy:
+    """The query strategy configured in the settings"""
+    settings = get_settings()
+    return QueryStrategy(
+        class_filter=settings.query_class_filter,
+        label_source=settings.query_label_source,
+        allowed_classes=settings.query_allowed_classes,
+    )
+
+
+def human_clause(variable: str, strategy: QueryStrategy = DEFAULT_STRATEGY) -> str:
+    """Graph pattern restricting `?variable` to humans under the given strategy"""
+    if strategy.class_filter == ClassFilter.DIRECT:
+        return f"?{variable} wdt:P31 wd:Q5 .  # Instance of human"
+    if strategy.class_filter == ClassFilter.ALLOWED_CLASSES:
+        classes = " ".join(f"wd:{class_id}" for class_id in strategy.allowed_classes)
+        if len(strategy.allowed_classes) == 1:
+            return f"?{variable} wdt:P31 {classes} .  # Instance of an allowed class"
+        # FILTER EXISTS so that instances of several allowed classes are returned once
+        return (
+            f"FILTER EXISTS {{ VALUES ?{variable}Class {{{classes}}} ?{variable} wdt:P31 ?{variable}Class . }}"
+            "  # Instance of an allowed class"
+        )
+    return f"?{variable} wdt:P31/wdt:P279* wd:Q5 .  # Instance of human or subclass of human"
+
+
+def label_clause(variable: str, strategy: QueryStrategy = DEFAULT_STRATEGY) -> str:
+    """
+    Graph pattern binding the label of `?variable` to `?variableLabel`, empty when
+    the label service binds it (see `label_service_clause`).
+    """
+    if strategy.label_source != LabelSource.RDFS_LABEL:
+        return ""
+    return (
+        f"?{variable} rdfs:label ?{variable}Label .\n"
+        f'      FILTER (LANG(?{variable}Label) = "{strategy.language}").'
+    )
+
+
+def label_service_clause(strategy: QueryStrategy = DEFAULT_STRATEGY) -> str:
+    """The label service call binding `?xLabel` for every selected `?x`, if the strategy uses it"""
+    if strategy.label_source != LabelSource.LABEL_SERVICE:
+        return ""
+    return f'SERVICE wikibase:label {{ bd:serviceParam wikibase:language "{strategy.language}". }}'
+
+
+PREFIXES = """
     PREFIX wd: <http://www.wikidata.org/entity/>
     PREFIX wdt: <http://www.wikidata.org/prop/direct/>
     PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+    PREFIX schema: <http://schema.org/>
+    PREFIX xsd: <http://www.w3.org/2001/XMLSchema#>
+    PREFIX wikibase: <http://wikiba.se/ontology#>
+    PREFIX bd: <http://www.bigdata.com/rdf#>
+"""
 
-    SELECT ?person ?personLabel
+
+# Query to get the Nazi Party members
+def create_persons_query(
+    offset: int,
+    limit: int,
+    since: ty.Optional[str] = None,
+    strategy: QueryStrategy = DEFAULT_STRATEGY
+) -> str:
+    """
+    Builds a SPARQL query string to get the `offset`-th to the (`offset` + `limit`)-th person,
+    optionally only among persons modified after `since`
+    """
+    query = f"""{PREFIXES}
+    SELECT ?person ?personLabel ?modified
     WHERE {{
-      ?person wdt:P31/wdt:P279* wd:Q5 .  # Instance of human or subclass of human
       ?person wdt:P102 wd:Q7320 .  # Member of: Nazi Party
-      ?person rdfs:label ?personLabel .
-      FILTER (LANG(?personLabel) = "en").
+      {human_clause("person", strategy)}
+      {modified_clause(since)}
+      {label_clause("person", strategy)}
+      {label_service_clause(strategy)}
     }}
     OFFSET {offset}
     LIMIT {limit}
@@ -38,60 +180,695 @@ def create_persons_query(offset: int, limit: int) -> str:
     return query
 
 
+def uri_range_filter(after: ty.Optional[str] = None, until: ty.Optional[str] = None) -> str:
+    """FILTER restricting `?person` to URIs greater than `after` and up to `until`"""
+    conditions = []
+    if after is not None:
+        conditions.append(f'STR(?person) > "{after}"')
+    if until is not None:
+        conditions.append(f'STR(?person) <= "{until}"')
+    return f"FILTER ({' && '.join(conditions)})." if conditions else ""
+
+
+def create_persons_keyset_query(
+    limit: int,
+    after: ty.Optional[str] = None,
+    since: ty.Optional[str] = None,
+    until: ty.Optional[str] = None,
+    strategy: QueryStrategy = DEFAULT_STRATEGY
+) -> str:
+    """
+    Builds a SPARQL query string to get the next `limit` persons ordered by URI,
+    optionally only among persons modified after `since` and with a URI up to `until`.
+
+    Unlike `create_persons_query`, the page is selected by filtering on the last
+    URI of the previous page (`after`) rather than with OFFSET, so the endpoint
+    never has to skip over preceding rows.
+    """
+    after_filter = uri_range_filter(after, until)
+    query = f"""{PREFIXES}
+    SELECT DISTINCT ?person ?personLabel ?modified
+    WHERE {{
+      ?person wdt:P102 wd:Q7320 .  # Member of: Nazi Party
+      {human_clause("person", strategy)}
+      {modified_clause(since)}
+      {after_filter}
+      {label_clause("person", strategy)}
+      {label_service_clause(strategy)}
+    }}
+    ORDER BY STR(?person)
+    LIMIT {limit}
+    """
+    return query
+
+
+def create_person_uris_query(
+    limit: int,
+    after: ty.Optional[str] = None,
+    since: ty.Optional[str] = None,
+    strategy: QueryStrategy = DEFAULT_STRATEGY
+) -> str:
+    """
+    Builds a SPARQL query string to get the next `limit` person URIs ordered by URI,
+    without labels, to cheaply enumerate the person set.
+    """
+    query = f"""{PREFIXES}
+    SELECT DISTINCT ?person
+    WHERE {{
+      ?person wdt:P102 wd:Q7320 .  # Member of: Nazi Party
+      {human_clause("person", strategy)}
+      {modified_clause(since)}
+      {uri_range_filter(after)}
+    }}
+    ORDER BY STR(?person)
+    LIMIT {limit}
+    """
+    return query
+
+
+def build_persons_with_relationships_query(
+    limit: int,
+    relationships_clause: str,
+    after: ty.Optional[str] = None,
+    since: ty.Optional[str] = None,
+    until: ty.Optional[str] = None,
+    strategy: QueryStrategy = DEFAULT_STRATEGY
+) -> str:
+    """
+    Builds a SPARQL query string to get the next `limit` persons ordered by URI
+    together with their relationships to other persons, in a single request.
+
+    Persons without any matching relationship are returned once with the
+    relationship variables unbound.
+    """
+    return f"""{PREFIXES}
+    SELECT ?person ?personLabel ?modified ?related_person ?related_personLabel ?relationship
+    WHERE {{
+      {{
+        SELECT DISTINCT ?person ?personLabel ?modified
+        WHERE {{
+          ?person wdt:P102 wd:Q7320 .  # Member of: Nazi Party
+          {human_clause("person", strategy)}
+          {modified_clause(since)}
+          {uri_range_filter(after, until)}
+          {label_clause("person", strategy)}
+          {label_service_clause(strategy)}
+        }}
+        ORDER BY STR(?person)
+        LIMIT {limit}
+      }}
+      OPTIONAL {{
+        VALUES ?relationship {{{relationships_clause}}}
+        ?person ?relationship ?related_person .
+        {human_clause("related_person", strategy)}
+        {label_clause("related_person", strategy)}
+      }}
+      {label_service_clause(strategy)}
+    }}
+    ORDER BY STR(?person)
+    """
+
+
 # {{wdt:P40 wdt:P22 wdt:P25 wdt:P3373 wdt:P1038}}
 def build_relationships_query(
     offset: int,
-    limit: int,
+    limit: ty.Optional[int],
     persons_clause: str,
-    relationships_clause: str
+    relationships_clause: str,
+    since: ty.Optional[str] = None,
+    strategy: QueryStrategy = DEFAULT_STRATEGY
 ) -> str:
-    return f"""
-    PREFIX wd: <http://www.wikidata.org/entity/>
-    PREFIX wdt: <http://www.wikidata.org/prop/direct/>
-    PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
-
+    """
+    Builds a SPARQL query string to get the relationships between the persons in
+    `persons_clause` and other persons, for the properties in `relationships_clause`.
+    No LIMIT is applied if `limit` is None. If `since` is given, only persons
+    modified after that timestamp are considered.
+    """
+    limit_clause = f"LIMIT {limit}" if limit is not None else ""
+    since_clause = modified_clause(since) if since is not None else ""
+    return f"""{PREFIXES}
     SELECT ?person ?personLabel ?related_person ?related_personLabel ?relationship
     WHERE {{
-      VALUES ?person {{{persons}}}
-      ?person wdt:P31/wdt:P279* wd:Q5 .  # Instance of human or subclass of human
-      ?person rdfs:label ?personLabel .
-      FILTER (LANG(?personLabel) = "en").
-
-      VALUES ?relationship {{{relationships}}}  # Family relationship properties
-      ?person ?relationship ?related_person . 
-      ?related_person wdt:P31/wdt:P279* wd:Q5 .  # Instance of human or subclass of human
-      ?related_person rdfs:label ?related_personLabel .
-      FILTER (LANG(?related_personLabel) = "en").
+      VALUES ?person {{{persons_clause}}}
+      {since_clause}
+      {human_clause("person", strategy)}
+      {label_clause("person", strategy)}
+
+      VALUES ?relationship {{{relationships_clause}}}  # Family relationship properties
+      ?person ?relationship ?related_person .
+      {human_clause("related_person", strategy)}
+      {label_clause("related_person", strategy)}
+      {label_service_clause(strategy)}
     }}
     OFFSET {offset}
-    LIMIT {limit}
+    {limit_clause}
+    """
+
+
+def build_attributes_query(
+    persons_clause: str,
+    relationships_clause: str,
+    strategy: QueryStrategy = DEFAULT_STRATEGY
+) -> str:
+    """
+    Builds a SPARQL query string to get the non-person entities that the persons in
+    `persons_clause` are linked to by the properties in `relationships_clause`.
+
+    The persons are already known to be human and the targets are not expected to
+    be, so neither is checked against a class and the query avoids the cost of
+    class membership filters altogether.
+    """
+    return f"""{PREFIXES}
+    SELECT ?person ?relationship ?target ?targetLabel
+    WHERE {{
+      VALUES ?person {{{persons_clause}}}
+      VALUES ?relationship {{{relationships_clause}}}
+      ?person ?relationship ?target .
+      {label_clause("target", strategy)}
+      {label_service_clause(strategy)}
+    }}
     """
 
 
-def execute_query(query: str) -> list[dict]:
-    sparql.setQuery(query)
-    results = sparql.query().convert()
-    bindings = results["results"]["bindings"]
+def persons_clause(persons: list[M.Person]) -> str:
+    """Format persons as the entity list of a VALUES clause, e.g. `wd:Q1 wd:Q2`"""
+    return " ".join(f"wd:{person.uri.split('/')[-1]}" for person in persons)
+
+
+def relationships_clause(relationship_types: list[str]) -> str:
+    """Format property IDs as the list of a VALUES clause, e.g. `wdt:P40 wdt:P22`"""
+    return " ".join(f"wdt:{r}" for r in relationship_types)
+
+
+@contextmanager
+def _translate_errors(endpoint: str) -> ty.Iterator[None]:
+    """Translate client errors raised while querying `endpoint` into wikigraph exceptions"""
+    try:
+        yield
+    except EndPointInternalError as e:
+        # Wikidata reports server-side timeouts as a 500 carrying a Java TimeoutException
+        if "TimeoutException" in str(e):
+            raise QueryTimeoutError(f"Query timed out on {endpoint}") from e
+        raise DataFetchError(f"Query to {endpoint} failed: {e}") from e
+    except HTTPError as e:
+        if e.code == 429:
+            raise RateLimitedError(f"Rate limited by {endpoint}", retry_after=retry_after(e)) from e
+        if e.code in TRANSIENT_STATUS_CODES:
+            raise TransientDataFetchError(f"Query to {endpoint} failed: {e}") from e
+        raise DataFetchError(f"Query to {endpoint} failed: {e}") from e
+    except (socket.timeout, TimeoutError) as e:
+        raise QueryTimeoutError(f"Query to {endpoint} timed out") from e
+    except URLError as e:
+        if isinstance(e.reason, (socket.timeout, TimeoutError)):
+            raise QueryTimeoutError(f"Query to {endpoint} timed out") from e
+        raise TransientDataFetchError(f"Could not reach {endpoint}: {e}") from e
+
+
+def _run_query(query: str) -> list[dict]:
+    """Run a query once, translating client errors into wikigraph exceptions"""
+    client = create_client()
+    client.setQuery(query)
+    with _translate_errors(client.endpoint):
+        results = client.query().convert()
+    return results["results"]["bindings"]
+
+
+def _open_query(query: str) -> tuple[ty.Any, str]:
+    """Send a query once and return its unread HTTP response and the endpoint"""
+    client = create_client()
+    client.setQuery(query)
+    with _translate_errors(client.endpoint):
+        return client.query().response, client.endpoint
+
+
+def execute_query(query: str, use_cache: bool = True) -> list[dict]:
+    """
+    Run a query against the Wikidata endpoint and return its result bindings.
+
+    Responses are served from and stored in the on-disk query cache unless
+    `use_cache` is False or caching is disabled in the settings. Transient
+    failures such as rate limiting are retried with backoff (see `wikigraph.retry`);
+    timeouts are raised as `QueryTimeoutError` for the caller to split the query.
+    """
+    cache = get_query_cache() if use_cache else None
+    if cache is not None:
+        bindings = cache.get(query)
+        if bindings is not None:
+            logger.debug(f"Query cache hit ({cache.hits} hits, {cache.misses} misses)")
+            return bindings
+    bindings = call_with_retry(_run_query, query)
+    if cache is not None:
+        cache.set(query, bindings)
     return bindings
 
 
-def get_persons(offset: int, limit: int) -> list[M.Person]:
-    query = create_persons_query(offset, limit)
+def stream_bindings(query: str) -> ty.Iterator[dict]:
+    """
+    Run a query and yield its result bindings one at a time as they are parsed
+    from the HTTP response body, without materialising the whole document.
+
+    Streamed responses bypass the query cache. Sending the query is retried like
+    `execute_query`; errors while reading the body are translated but not
+    retried, since some bindings have already been yielded.
+    """
+    response, endpoint = call_with_retry(_open_query, query)
+    try:
+        with _translate_errors(endpoint):
+            yield from ijson.items(response, "results.bindings.item")
+    finally:
+        response.close()
+
+
+def resolve_labels(models: list, strategy: QueryStrategy) -> list:
+    """Label the models with the label resolver if the strategy leaves labels out of the queries"""
+    if strategy.label_source == LabelSource.NONE:
+        get_label_resolver(strategy.language).label_models(models)
+    return models
+
+
+def get_persons(
+    offset: int,
+    limit: int,
+    validate: bool = True,
+    since: ty.Optional[str] = None,
+    strategy: ty.Optional[QueryStrategy] = None
+) -> list[M.Person]:
+    strategy = strategy or get_query_strategy()
+    query = create_persons_query(offset, limit, since, strategy)
     bindings = execute_query(query)
-    return M.map_to_models(bindings, M.Person)
+    return resolve_labels(M.map_to_models(bindings, M.Person, validate), strategy)
 
 
-def get_relationships(
+def stream_persons(
     offset: int,
     limit: int,
+    validate: bool = True,
+    strategy: ty.Optional[QueryStrategy] = None
+) -> ty.Iterator[M.Person]:
+    """
+    Lazily yield the `offset`-th to the (`offset` + `limit`)-th person while the
+    response is still downloading, e.g. to feed `neo4j_utils.insert_persons`.
+    """
+    strategy = strategy or get_query_strategy()
+    query = create_persons_query(offset, limit, strategy=strategy)
+    persons = M.iter_models(stream_bindings(query), M.Person, validate)
+    if strategy.label_source != LabelSource.NONE:
+        return persons
+    # label in chunks of one label request each, to keep streaming
+    return (
+        person
+        for chunk in chunked(persons, MAX_IDS_PER_REQUEST)
+        for person in resolve_labels(chunk, strategy)
+    )
+
+
+def iter_keyset_bindings(
+    build_query: ty.Callable[[int, ty.Optional[str]], str],
+    page_size: int,
+    after: ty.Optional[str] = None
+) -> ty.Iterator[list[dict]]:
+    """
+    Page through a keyset-paginated query until its result set is exhausted.
+
+    `build_query(size, after)` must return a query for the next `size` distinct
+    persons after the URI `after`, whose bindings are ordered by `?person`. Pages are
+    halved while queries time out and grow back to `page_size` afterwards.
+
+    Yields:
+        list[dict]: The bindings of each non-empty page.
+    """
+    size = page_size
+    while True:
+        try:
+            bindings = execute_query(build_query(size, after))
+        except QueryTimeoutError:
+            if size == 1:
+                raise
+            size = max(1, size // 2)
+            logger.warning(f"Page query timed out, retrying with pages of {size}")
+            continue
+        if bindings:
+            yield bindings
+        # a combined query returns at least one row per person, so a short page is the last one
+        if len(bindings) < size:
+            logger.debug(f"Pages exhausted after {after}")
+            return
+        after = bindings[-1]["person"]["value"]
+        size = min(page_size, size * 2)
+
+
+def iter_person_pages(
+    page_size: int,
+    after: ty.Optional[str] = None,
+    validate: bool = True,
+    since: ty.Optional[str] = None,
+    until: ty.Optional[str] = None,
+    strategy: ty.Optional[QueryStrategy] = None
+) -> ty.Iterator[list[M.Person]]:
+    """
+    Stream pages of persons ordered by URI until the result set is exhausted.
+
+    Args:
+        page_size (int): The number of persons requested per page.
+        after (str, optional): Continuation token, i.e. the URI of the last person
+            already processed. Crawling starts from the beginning if omitted.
+        validate (bool): Whether to validate the bindings when building models.
+        since (str, optional): Only include persons modified after this timestamp.
+        until (str, optional): Stop after the person with this URI.
+        strategy (QueryStrategy, optional): The query patterns to use, by default
+            those configured in the settings.
+
+    Yields:
+        list[Person]: The next non-empty page of persons. The URI of its last
+            element is the continuation token for resuming after this page.
+            Pages are halved while queries time out and grow back afterwards.
+    """
+    strategy = strategy or get_query_strategy()
+    for bindings in iter_keyset_bindings(
+        lambda size, after: create_persons_keyset_query(size, after, since, until, strategy),
+        page_size,
+        after,
+    ):
+        yield resolve_labels(M.map_to_models(bindings, M.Person, validate), strategy)
+
+
+def group_persons_and_relationships(
+    bindings: list[dict],
+    validate: bool = True
+) -> tuple[list[M.Person], list[M.Relationship]]:
+    """
+    Split the rows of a combined persons and relationships query into distinct
+    persons (in order of appearance) and their relationships.
+    """
+    persons = {}
+    relationship_rows = []
+    for binding in bindings:
+        uri = binding["person"]["value"]
+        if uri not in persons:
+            persons[uri] = binding
+        if "related_person" in binding:
+            relationship_rows.append(binding)
+    person_fields = {field.alias for field in M.Person.__fields__.values()}
+    person_rows = [
+        {key: value for key, value in binding.items() if key in person_fields}
+        for binding in persons.values()
+    ]
+    return (
+        M.map_to_models(person_rows, M.Person, validate),
+        M.map_to_models(relationship_rows, M.Relationship, validate),
+    )
+
+
+def iter_persons_with_relationships(
+    page_size: int,
+    relationships: list[str],
+    after: ty.Optional[str] = None,
+    validate: bool = True,
+    since: ty.Optional[str] = None,
+    until: ty.Optional[str] = None,
+    strategy: ty.Optional[QueryStrategy] = None
+) -> ty.Iterator[tuple[list[M.Person], list[M.Relationship]]]:
+    """
+    Stream pages of persons with their relationships, one request per page,
+    instead of a persons query followed by a relationships query.
+    Arguments are as for `iter_person_pages`.
+
+    Yields:
+        tuple[list[Person], list[Relationship]]: The persons of each non-empty
+            page and their relationships.
+    """
+    clause = relationships_clause(relationships)
+    strategy = strategy or get_query_strategy()
+    for bindings in iter_keyset_bindings(
+        lambda size, after: build_persons_with_relationships_query(
+            size, clause, after, since, until, strategy
+        ),
+        page_size,
+        after,
+    ):
+        persons, relationships = group_persons_and_relationships(bindings, validate)
+        yield resolve_labels(persons, strategy), resolve_labels(relationships, strategy)
+
+
+def iter_person_uris(
+    page_size: int,
+    since: ty.Optional[str] = None,
+    strategy: ty.Optional[QueryStrategy] = None
+) -> ty.Iterator[str]:
+    """
+    Stream the URIs of all persons in URI order, fetching `page_size` at a time.
+    Each page is parsed while it downloads (see `stream_bindings`), so memory
+    use does not grow with the page size.
+    """
+    strategy = strategy or get_query_strategy()
+    after = None
+    while True:
+        rows = 0
+        for binding in stream_bindings(create_person_uris_query(page_size, after, since, strategy)):
+            rows += 1
+            after = binding["person"]["value"]
+            yield after
+        if rows < page_size:
+            return
+
+
+class AdaptiveBatchSize:
+    """
+    Batch size that halves when a query times out and doubles when a query
+    completes in under `fast_seconds`, within `[min_size, max_size]`.
+    """
+
+    def __init__(
+        self,
+        size: int = DEFAULT_RELATIONSHIP_BATCH_SIZE,
+        min_size: int = MIN_RELATIONSHIP_BATCH_SIZE,
+        max_size: int = MAX_RELATIONSHIP_BATCH_SIZE,
+        fast_seconds: float = FAST_RESPONSE_SECONDS
+    ):
+        self.size = size
+        self.min_size = min_size
+        self.max_size = max_size
+        self.fast_seconds = fast_seconds
+
+    def record_success(self, seconds: float) -> None:
+        if seconds < self.fast_seconds:
+            self.size = min(self.max_size, self.size * 2)
+
+    def record_timeout(self, timed_out_size: int) -> None:
+        # parallel timeouts of same-sized batches should only halve the size once
+        self.size = max(self.min_size, min(self.size, timed_out_size // 2))
+
+
+def split_relationship_types(
+    relationship_types: list[str],
+    attribute_labels: ty.Optional[dict[str, str]] = None
+) -> tuple[list[str], list[str]]:
+    """
+    Split property IDs into those linking persons to persons and those linking
+    persons to other entities (attributes), in their original order.
+
+    Args:
+        relationship_types (list[str]): Wikidata property IDs, e.g. `P40`.
+        attribute_labels (dict[str, str], optional): Target node label by attribute
+            property ID, by default `attribute_labels` from the settings.
+    """
+    if attribute_labels is None:
+        attribute_labels = get_settings().attribute_labels
+    persons = [r for r in relationship_types if r not in attribute_labels]
+    attributes = [r for r in relationship_types if r in attribute_labels]
+    return persons, attributes
+
+
+def _timed_query(query: str) -> tuple[list[dict], float]:
+    start = time.perf_counter()
+    bindings = execute_query(query)
+    return bindings, time.perf_counter() - start
+
+
+def fetch_batched_bindings(
+    persons: list[M.Person],
+    build_query: ty.Callable[[list[M.Person]], str],
+    batch_size: ty.Optional[AdaptiveBatchSize] = None,
+    max_workers: int = DEFAULT_RELATIONSHIP_WORKERS
+) -> list[dict]:
+    """
+    Run a per-person query for many persons, splitting them into sub-batches
+    queried in parallel.
+
+    Sub-batches that time out are put back and re-split at the reduced batch size;
+    the error is only raised if a single person still times out.
+
+    Args:
+        persons (list[Person]): The persons to query for.
+        build_query (Callable[[list[Person]], str]): Builds the query of a sub-batch.
+        batch_size (AdaptiveBatchSize, optional): Sub-batch sizing, which is updated
+            in place so it can carry over between calls.
+        max_workers (int): The maximum number of sub-batch queries in flight.
+
+    Returns:
+        list[dict]: The bindings of all sub-batches, in completion order.
+    """
+    batch_size = batch_size if batch_size is not None else AdaptiveBatchSize()
+    pending = deque(persons)
+    in_flight = {}
+    bindings = []
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while pending or in_flight:
+            while pending and len(in_flight) < max_workers:
+                batch = [pending.popleft() for _ in range(min(batch_size.size, len(pending)))]
+                future = pool.submit(_timed_query, build_query(batch))
+                in_flight[future] = batch
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                batch = in_flight.pop(future)
+                try:
+                    batch_bindings, seconds = future.result()
+                except QueryTimeoutError:
+                    if len(batch) <= batch_size.min_size:
+                        raise
+                    batch_size.record_timeout(len(batch))
+                    pending.extendleft(reversed(batch))
+                    logger.warning(
+                        f"Query for {len(batch)} persons timed out, "
+                        f"retrying with batches of {batch_size.size}"
+                    )
+                    continue
+                batch_size.record_success(seconds)
+                bindings.extend(batch_bindings)
+                logger.debug(
+                    f"Fetched {len(batch_bindings)} rows for {len(batch)} "
+                    f"persons in {seconds:.2f}s"
+                )
+    return bindings
+
+
+def fetch_relationship_bindings(
+    persons: list[M.Person],
+    relationships: list[str],
+    batch_size: ty.Optional[AdaptiveBatchSize] = None,
+    max_workers: int = DEFAULT_RELATIONSHIP_WORKERS,
+    strategy: ty.Optional[QueryStrategy] = None
+) -> list[dict]:
+    """
+    Fetch the relationship bindings of many persons in parallel sub-batches
+    (see `fetch_batched_bindings`).
+
+    Args:
+        persons (list[Person]): The persons whose relationships to fetch.
+        relationships (list[str]): Wikidata property IDs, e.g. `P40`.
+        batch_size (AdaptiveBatchSize, optional): Sub-batch sizing, which is updated
+            in place so it can carry over between calls.
+        max_workers (int): The maximum number of sub-batch queries in flight.
+        strategy (QueryStrategy, optional): The query patterns to use, by default
+            those configured in the settings.
+
+    Returns:
+        list[dict]: The bindings of all sub-batches, in completion order.
+    """
+    strategy = strategy or get_query_strategy()
+    clause = relationships_clause(relationships)
+    return fetch_batched_bindings(
+        persons,
+        lambda batch: build_relationships_query(0, None, persons_clause(batch), clause, strategy=strategy),
+        batch_size,
+        max_workers,
+    )
+
+
+def get_relationships(
+    offset: int,
+    limit: ty.Optional[int],
     persons: list[M.Person],
-    relationships: list[str]
+    relationships: list[str],
+    validate: bool = True,
+    batch_size: ty.Optional[AdaptiveBatchSize] = None,
+    max_workers: int = DEFAULT_RELATIONSHIP_WORKERS,
+    strategy: ty.Optional[QueryStrategy] = None
 ) -> list[M.Relationship]:
-    persons_clause = " ".join(f"wd:{member.uri.split('/')[-1]}" for member in members)
-    relationships_clause = " ".join([f"wdt:{r}" for r in relationship_types])
-    query = build_relationships_query(offset, limit, persons_clause, relationships_clause)
-    bindings = execute_query(query)
-    return M.map_to_models(bindings, M.Relationship)
+    """
+    Get the `offset`-th to the (`offset` + `limit`)-th distinct relationship of the
+    given persons, ordered by person, property and related person.
+
+    The persons are queried in adaptively sized parallel sub-batches (see
+    `fetch_relationship_bindings`) and the results merged and de-duplicated.
+    No limit is applied if `limit` is None.
+    """
+    strategy = strategy or get_query_strategy()
+    bindings = fetch_relationship_bindings(persons, relationships, batch_size, max_workers, strategy)
+    unique = {}
+    for relationship in M.iter_models(bindings, M.Relationship, validate):
+        key = (relationship.person_uri, relationship.relationship, relationship.related_person_uri)
+        unique.setdefault(key, relationship)
+    merged = [unique[key] for key in sorted(unique)]
+    end = offset + limit if limit is not None else None
+    return resolve_labels(merged[offset:end], strategy)
+
+
+def get_attributes(
+    persons: list[M.Person],
+    attribute_types: list[str],
+    validate: bool = True,
+    batch_size: ty.Optional[AdaptiveBatchSize] = None,
+    max_workers: int = DEFAULT_RELATIONSHIP_WORKERS,
+    strategy: ty.Optional[QueryStrategy] = None
+) -> list[M.Attribute]:
+    """
+    Get the distinct attribute edges of the given persons for the properties in
+    `attribute_types`, ordered by person, property and target, fetched in parallel
+    sub-batches like `get_relationships`.
+    """
+    if not attribute_types:
+        return []
+    strategy = strategy or get_query_strategy()
+    clause = relationships_clause(attribute_types)
+    bindings = fetch_batched_bindings(
+        persons,
+        lambda batch: build_attributes_query(persons_clause(batch), clause, strategy),
+        batch_size,
+        max_workers,
+    )
+    unique = {}
+    for attribute in M.iter_models(bindings, M.Attribute, validate):
+        unique.setdefault((attribute.person_uri, attribute.relationship, attribute.target_uri), attribute)
+    return resolve_labels([unique[key] for key in sorted(unique)], strategy)
+
+
+class StrategyTiming(pydantic.BaseModel):
+    """Best time of a persons query under one strategy and the number of rows it returned"""
+    rows: int
+    seconds: float
+
+
+def benchmark_strategies(
+    strategies: dict[str, QueryStrategy],
+    limit: int = 1000,
+    repeats: int = 3
+) -> dict[str, StrategyTiming]:
+    """
+    Time the first page of the keyset persons query under each strategy, e.g. to
+    compare `ClassFilter.SUBCLASS_PATH` against `ClassFilter.DIRECT`. The response
+    cache is bypassed so every repeat reaches the endpoint.
+
+    Args:
+        strategies (dict[str, QueryStrategy]): The strategies to compare, by name.
+        limit (int): The number of persons requested.
+        repeats (int): The number of times each query is run, keeping the fastest.
+
+    Returns:
+        dict[str, StrategyTiming]: The timing of each strategy, by name.
+    """
+    timings = {}
+    for name, strategy in strategies.items():
+        query = create_persons_keyset_query(limit, strategy=strategy)
+        best = None
+        for _ in range(repeats):
+            start = time.perf_counter()
+            bindings = execute_query(query, use_cache=False)
+            seconds = time.perf_counter() - start
+            best = seconds if best is None else min(best, seconds)
+        timings[name] = StrategyTiming(rows=len(bindings), seconds=best)
+        logger.info(f"Strategy {name}: {len(bindings)} rows in {best:.2f}s")
+    return timings
 
 
 
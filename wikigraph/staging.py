@@ -0,0 +1,61 @@
+"""
+staging.py
+
+Staging store for handing batches of persons between tasks through a shared
+directory, so only a short reference has to pass through XCom
+"""
+import gzip
+import json
+import re
+from pathlib import Path
+
+import wikigraph.models as M
+from wikigraph.logger import get_logger
+
+logger = get_logger(__name__)
+
+SUFFIX = ".json.gz"
+
+
+def batch_path(staging_dir: Path, name: str) -> Path:
+    """The file a batch is staged in, with the name made safe for any filesystem"""
+    return Path(staging_dir) / (re.sub(r"[^A-Za-z0-9_.-]", "_", name) + SUFFIX)
+
+
+def write_batch(persons: list[M.Person], staging_dir: Path, name: str) -> str:
+    """
+    Stage a batch of persons as gzip-compressed columnar JSON, i.e. one list of
+    values per model field rather than one object per person.
+
+    Args:
+        persons (list[Person]): The persons to stage.
+        staging_dir (Path): A directory readable by every task that needs the batch.
+        name (str): A name unique to the batch, e.g. built from the run and task IDs.
+
+    Returns:
+        str: The reference to pass to `read_batch` and `delete_batch`.
+    """
+    path = batch_path(staging_dir, name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    columns = {field: [getattr(person, field) for person in persons] for field in M.Person.__fields__}
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        json.dump(columns, f, separators=(",", ":"))
+    logger.debug(f"Staged {len(persons)} persons in {path}")
+    return str(path)
+
+
+def read_batch(reference: str) -> list[M.Person]:
+    """Load a staged batch of persons. The data was validated before staging, so it is trusted."""
+    with gzip.open(reference, "rt", encoding="utf-8") as f:
+        columns = json.load(f)
+    fields = list(columns)
+    return [
+        M.Person.construct(**dict(zip(fields, values)))
+        for values in zip(*(columns[field] for field in fields))
+    ]
+
+
+def delete_batch(reference: str) -> None:
+    """Remove a staged batch once it is no longer needed"""
+    Path(reference).unlink(missing_ok=True)
+    logger.debug(f"Deleted staged batch {reference}")
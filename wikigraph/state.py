@@ -0,0 +1,174 @@
+"""
+state.py
+
+Durable crawl state persisted between runs as a small JSON document
+"""
+import json
+import os
+import shutil
+import typing as ty
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pydantic
+
+import wikigraph.models as M
+from wikigraph.logger import get_logger
+from wikigraph.partitioning import Partition
+
+logger = get_logger(__name__)
+
+HIGH_WATER_MARK = "high_water_mark"
+PENDING = "pending"
+DONE = "done"
+# format of the xsd:dateTime values returned by the endpoint
+DATETIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+
+class Checkpoint(pydantic.BaseModel):
+    """Progress of one partition of a crawl, persisted after each committed batch"""
+    partition: Partition
+    # URI of the last person whose data is committed
+    cursor: ty.Optional[str] = None
+    persons: int = 0
+    relationships: int = 0
+    latest_modified: ty.Optional[str] = None
+    status: str = PENDING
+
+
+def load_state(path: Path) -> dict:
+    """Read the crawl state, or an empty state if none has been saved yet"""
+    path = Path(path)
+    if not path.exists():
+        return {}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def save_state(path: Path, state: dict) -> None:
+    """Atomically replace the crawl state so a crash never leaves it half-written"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def get_high_water_mark(path: Path) -> ty.Optional[str]:
+    """The latest entity modification time seen by a completed run, if any"""
+    return load_state(path).get(HIGH_WATER_MARK)
+
+
+def set_high_water_mark(path: Path, high_water_mark: str) -> None:
+    """Record the latest entity modification time seen by a completed run"""
+    state = load_state(path)
+    state[HIGH_WATER_MARK] = high_water_mark
+    save_state(path, state)
+    logger.info(f"Recorded high-water mark {high_water_mark} in {path}")
+
+
+def crawl_start_mark(lag_seconds: float = 0.0) -> str:
+    """
+    The high-water mark of a crawl starting now: the current time less
+    `lag_seconds`, since edits made shortly before may not be queryable yet
+    """
+    started = datetime.now(timezone.utc) - timedelta(seconds=lag_seconds)
+    return started.strftime(DATETIME_FORMAT)
+
+
+def latest_modified(persons: ty.Iterable[M.Person]) -> ty.Optional[str]:
+    """The most recent `modified` timestamp among persons, if any have one"""
+    # xsd:dateTime values from the endpoint share a format, so they sort as strings
+    return max((person.modified for person in persons if person.modified), default=None)
+
+
+def crawl_state_path(checkpoint_dir: Path) -> Path:
+    """State shared by all partitions of a crawl"""
+    return Path(checkpoint_dir) / "crawl.json"
+
+
+def checkpoint_path(checkpoint_dir: Path, index: int) -> Path:
+    """One file per partition, so concurrent workers never write the same file"""
+    return Path(checkpoint_dir) / f"partition_{index:06d}.json"
+
+
+def save_checkpoint(checkpoint_dir: Path, checkpoint: Checkpoint) -> None:
+    save_state(checkpoint_path(checkpoint_dir, checkpoint.partition.index), checkpoint.dict())
+
+
+def load_checkpoint(checkpoint_dir: Path, index: int) -> ty.Optional[Checkpoint]:
+    """The checkpoint of one partition, if it has been saved"""
+    path = checkpoint_path(checkpoint_dir, index)
+    return Checkpoint(**load_state(path)) if path.exists() else None
+
+
+def resume_partition(checkpoint_dir: Path, partition: Partition) -> Partition:
+    """The part of `partition` after the cursor of its pending checkpoint, or all of it"""
+    checkpoint = load_checkpoint(checkpoint_dir, partition.index)
+    if checkpoint is None or checkpoint.status == DONE or not checkpoint.cursor:
+        return partition
+    logger.info(f"Resuming partition {partition.index} after {checkpoint.cursor}")
+    return partition.copy(update={"after": checkpoint.cursor})
+
+
+def after_cursor(persons: list[M.Person], cursor: ty.Optional[str]) -> list[M.Person]:
+    """The persons following `cursor` in `persons`, or all of them if it is not among them"""
+    uris = [person.uri for person in persons]
+    return persons[uris.index(cursor) + 1:] if cursor in uris else persons
+
+
+def load_checkpoints(checkpoint_dir: Path) -> list[Checkpoint]:
+    """The checkpoints of an unfinished crawl ordered by partition, or [] if there is none"""
+    paths = sorted(Path(checkpoint_dir).glob("partition_*.json"))
+    return [Checkpoint(**load_state(path)) for path in paths]
+
+
+def checkpoints_high_water_mark(checkpoint_dir: Path) -> ty.Optional[str]:
+    """The high-water mark recorded when the crawl was planned, see `start_or_resume`"""
+    return load_state(crawl_state_path(checkpoint_dir)).get(HIGH_WATER_MARK)
+
+
+def clear_checkpoints(checkpoint_dir: Path) -> None:
+    """Forget the checkpoints of a completed crawl"""
+    shutil.rmtree(checkpoint_dir, ignore_errors=True)
+    logger.info(f"Cleared checkpoints in {checkpoint_dir}")
+
+
+def start_or_resume(
+    checkpoint_dir: Path,
+    plan: ty.Callable[[], list[Partition]],
+    lag_seconds: float = 0.0
+) -> list[Partition]:
+    """
+    Get the partitions still to crawl.
+
+    If checkpoints exist, the interrupted crawl is resumed: finished partitions
+    are skipped and the others restart after their last committed person.
+    Otherwise the partitions are planned afresh and a pending checkpoint is
+    recorded for each.
+
+    A fresh crawl first records its high-water mark, `lag_seconds` before it
+    started. Partitions are queried at different times, so the mark must not
+    depend on the modification times they return: an entity of a finished
+    partition edited while others are still crawling would be skipped for good.
+    """
+    checkpoints = load_checkpoints(checkpoint_dir)
+    if not checkpoints:
+        save_state(crawl_state_path(checkpoint_dir), {HIGH_WATER_MARK: crawl_start_mark(lag_seconds)})
+        partitions = plan()
+        for partition in partitions:
+            save_checkpoint(checkpoint_dir, Checkpoint(partition=partition))
+        return partitions
+    remaining = [
+        checkpoint.partition.copy(update={"after": checkpoint.cursor or checkpoint.partition.after})
+        for checkpoint in checkpoints
+        if checkpoint.status != DONE
+    ]
+    logger.info(
+        f"Resuming crawl from {checkpoint_dir}: {len(checkpoints) - len(remaining)} of "
+        f"{len(checkpoints)} partitions already done"
+    )
+    return remaining
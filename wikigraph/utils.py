@@ -0,0 +1,31 @@
+"""
+utils.py
+
+Small helpers shared between the fetch and storage layers
+"""
+import typing as ty
+
+T = ty.TypeVar("T")
+
+
+def chunked(items: ty.Iterable[T], size: int) -> ty.Iterator[list[T]]:
+    """
+    Split an iterable into consecutive lists of at most `size` items.
+
+    Args:
+        items (Iterable): The items to split.
+        size (int): The maximum number of items per chunk.
+
+    Yields:
+        list: The next chunk of items.
+    """
+    if size < 1:
+        raise ValueError(f"Chunk size must be positive, got {size}")
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk